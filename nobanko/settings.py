@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import hashlib
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,11 +43,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'nobanko_app.middleware.PaginasPrerenderizadasMiddleware',
+    'nobanko_app.middleware.EstaticosMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'nobanko_app.middleware.SessaoClienteMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -117,8 +122,109 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# Fora do DEBUG o collectstatic gera nomes com hash e variantes .gz/.br, servidos pelo
+# EstaticosMiddleware com cache imutável.
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {
+        'BACKEND': (
+            'django.contrib.staticfiles.storage.StaticFilesStorage'
+            if DEBUG
+            else 'nobanko_app.estaticos.ArmazenamentoEstaticoComprimido'
+        ),
+    },
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Retentativas automáticas em deadlock, falha de serialização e banco ocupado
+NOBANKO_RETENTATIVAS = {
+    'TENTATIVAS': 5,
+    'ESPERA_BASE': 0.02,
+    'ESPERA_MAXIMA': 0.5,
+}
+
+# Controle de concorrência dos saldos por alias ou backend ('pessimista' ou 'otimista').
+# Ex.: {'sqlite': 'otimista'} para nós de agência que rodam em SQLite.
+NOBANKO_CONCORRENCIA = {}
+
+# Tempo durante o qual depósitos e transferências repetidos com a mesma chave são deduplicados
+NOBANKO_IDEMPOTENCIA_TTL_HORAS = 24
+
+
+
+def _versao_do_conteudo():
+    """Hash de templates, estáticos e código do app: o mesmo em todos os processos de um deploy."""
+    resumo = hashlib.sha256()
+    arquivos = [
+        *(BASE_DIR / 'templates').rglob('*'),
+        *(BASE_DIR / 'static').rglob('*'),
+        *(BASE_DIR / 'nobanko_app').rglob('*.py'),
+    ]
+    for arquivo in sorted(arquivo for arquivo in arquivos if arquivo.is_file()):
+        resumo.update(arquivo.relative_to(BASE_DIR).as_posix().encode())
+        resumo.update(arquivo.read_bytes())
+    return resumo.hexdigest()[:12]
+
+
+# Versão embutida nas chaves do cache de páginas, para descartar páginas e fragmentos da versão
+# anterior. O deploy pode defini-la (ex.: hash do commit); sem ela, vale o hash do conteúdo publicado.
+NOBANKO_VERSAO_DEPLOY = os.environ.get('NOBANKO_VERSAO_DEPLOY') or _versao_do_conteudo()
+
+# Tempo de vida das páginas institucionais e dos fragmentos de navegação em cache
+NOBANKO_CACHE_PAGINAS_SEGUNDOS = 600
+
+# Páginas institucionais geradas por `manage.py prerenderizar_paginas`
+NOBANKO_PRERENDER_DIR = BASE_DIR / 'prerender'
+
+# Serve as páginas pré-renderizadas antes do restante da pilha de middlewares e views.
+# Com NOBANKO_PRERENDER_X_ACCEL (ex.: '/_prerender/') a entrega do arquivo fica com o proxy.
+NOBANKO_PRERENDER_SERVIR = False
+NOBANKO_PRERENDER_X_ACCEL = ''
+
+# Cache compartilhado por todos os processos: sessões, páginas institucionais e limites de login
+# dependem disso. Com NOBANKO_REDIS_URL usa o Redis (requer o pacote redis); sem ele, o cache em
+# arquivo vale para os processos de um mesmo host.
+if os.environ.get('NOBANKO_REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['NOBANKO_REDIS_URL'],
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': BASE_DIR / '.cache',
+        },
+    }
+
+# Sessões no cache compartilhado com camada LRU por processo para as anônimas; as autenticadas são
+# sempre lidas do cache compartilhado, então logout e troca de permissão valem em todos os processos.
+# Sessões novas e chaves renovadas vão ao banco na hora; as demais alterações, numa fila. Fora do
+# DEBUG o engine recusa LocMemCache.
+SESSION_ENGINE = 'nobanko_app.sessoes'
+NOBANKO_SESSOES = {
+    'LRU_TAMANHO': 2048,
+    'LRU_SEGUNDOS': 5,
+    'ESCRITA_ASSINCRONA': True,
+}
+
+# Limites de tentativas (por IP e por conta, contados com incr no cache) e executor de hash de senha do
+# login/cadastro. O cache em arquivo não tem incr atômico entre processos; em produção use NOBANKO_REDIS_URL.
+# Atrás de proxy, defina CABECALHO_IP (ex.: 'HTTP_X_FORWARDED_FOR') para limitar pelo IP real.
+NOBANKO_LOGIN = {
+    'IP_CAPACIDADE': 20,
+    'IP_POR_MINUTO': 10,
+    'CONTA_CAPACIDADE': 5,
+    'CONTA_POR_MINUTO': 2,
+    'HASH_TRABALHADORES': 4,
+    'HASH_FILA': 32,
+    'CABECALHO_IP': '',
+}
@@ -0,0 +1,59 @@
+import threading
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class AlocadorBlocos:
+    """Entrega números de uma sequência por chave sem consultar a tabela de destino.
+
+    ``sequencia`` é o modelo com ``reservar(chave, quantidade)``, que devolve
+    a faixa ``[inicio, fim)`` reservada; ``formatar(chave, sequencia)`` monta
+    o número com o dígito verificador. ``chave`` converte (e valida) o que o
+    chamador informa na chave da sequência.
+
+    Cada processo reserva um bloco da sequência e o consome em memória.
+    Dentro de uma transação de quem chamou, a reserva é só do que foi pedido
+    e não fica guardada: se essa transação for desfeita, o bloco volta à
+    sequência e ninguém mais o terá em memória.
+    """
+
+    def __init__(self, sequencia, formatar, chave=None, bloco=50, using=DEFAULT_DB_ALIAS):
+        self.sequencia = sequencia
+        self.formatar = formatar
+        self.chave = chave or (lambda valor: valor)
+        self.bloco = bloco
+        self.using = using
+        self._faixas = {}
+        self._lock = threading.Lock()
+
+    def alocar(self, valor):
+        chave = self.chave(valor)
+        with self._lock:
+            faixa = self._faixas.get(chave)
+            if faixa and faixa[0] < faixa[1]:
+                numero = faixa[0]
+                faixa[0] += 1
+                return self.formatar(chave, numero)
+
+            if self._em_transacao():
+                inicio, _fim = self.sequencia.reservar(chave, 1)
+                return self.formatar(chave, inicio)
+
+            inicio, fim = self.sequencia.reservar(chave, self.bloco)
+            self._faixas[chave] = [inicio + 1, fim]
+            return self.formatar(chave, inicio)
+
+    def _em_transacao(self):
+        return connections[self.using].in_atomic_block
+
+    def alocar_lote(self, valor, quantidade):
+        """Números para uma leva de cadastros ou emissões, com uma única reserva."""
+        if quantidade <= 0:
+            return []
+        chave = self.chave(valor)
+        inicio, fim = self.sequencia.reservar(chave, quantidade)
+        return [self.formatar(chave, numero) for numero in range(inicio, fim)]
+
+    def descartar_reservas(self):
+        with self._lock:
+            self._faixas.clear()
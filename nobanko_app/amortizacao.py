@@ -0,0 +1,98 @@
+import calendar
+from collections import namedtuple
+from datetime import date
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from functools import lru_cache
+
+from django.core.exceptions import ValidationError
+
+PRICE = "price"
+SAC = "sac"
+SISTEMAS = (PRICE, SAC)
+
+CENTAVO = Decimal("0.01")
+VALOR_MINIMO = Decimal("100.00")
+VALOR_MAXIMO = Decimal("1000000.00")
+PARCELAS_MAXIMO = 420
+TAXA_MAXIMA = Decimal("20")
+
+Parcela = namedtuple("Parcela", "numero valor juros amortizacao saldo")
+Simulacao = namedtuple("Simulacao", "sistema valor taxa parcelas cronograma total_pago total_juros")
+
+
+def _centavos(valor):
+    return valor.quantize(CENTAVO, rounding=ROUND_HALF_UP)
+
+
+def prestacao_price(valor, taxa, parcelas):
+    """Prestação fixa da Price, em centavos; ``taxa`` é a fração mensal (0.015 = 1,5%)."""
+    if taxa == 0:
+        return _centavos(valor / parcelas)
+    return _centavos(valor * taxa / (1 - (1 + taxa) ** -parcelas))
+
+
+def cronograma(valor, taxa_mensal, parcelas, sistema=PRICE):
+    """Parcelas de um financiamento de ``valor`` a ``taxa_mensal`` % ao mês.
+
+    Cada parcela parte do saldo devedor corrente, em Decimal: os juros são o
+    saldo vezes a taxa, arredondados para centavos; na Price a amortização é
+    o que a prestação fixa deixa depois dos juros, no SAC é a parcela fixa do
+    principal. A última parcela quita o saldo e absorve a diferença de
+    arredondamento, então nenhum componente fica negativo.
+    """
+    taxa = taxa_mensal / 100
+    fixo = prestacao_price(valor, taxa, parcelas) if sistema == PRICE else _centavos(valor / parcelas)
+    saldo = valor
+    linhas = []
+    for numero in range(1, parcelas + 1):
+        juros = _centavos(saldo * taxa)
+        if numero == parcelas:
+            amortizacao = saldo
+        elif sistema == PRICE:
+            amortizacao = min(fixo - juros, saldo)
+        else:
+            amortizacao = min(fixo, saldo)
+        saldo -= amortizacao
+        linhas.append(Parcela(numero, amortizacao + juros, juros, amortizacao, saldo))
+    return tuple(linhas)
+
+
+def normalizar(valor, taxa_mensal, parcelas, sistema=PRICE):
+    """Valida e converte os parâmetros de uma simulação, com mensagens para o cliente."""
+    try:
+        valor = Decimal(str(valor)).quantize(CENTAVO, rounding=ROUND_HALF_UP)
+        taxa_mensal = Decimal(str(taxa_mensal)).quantize(Decimal("0.0001"), rounding=ROUND_HALF_UP)
+        parcelas = int(parcelas)
+    except (InvalidOperation, TypeError, ValueError):
+        raise ValidationError("Informe valor, taxa e parcelas numéricos.") from None
+
+    if sistema not in SISTEMAS:
+        raise ValidationError("Sistema de amortização inválido.")
+    if not VALOR_MINIMO <= valor <= VALOR_MAXIMO:
+        raise ValidationError(f"O valor deve ficar entre {VALOR_MINIMO} e {VALOR_MAXIMO}.")
+    if not 1 <= parcelas <= PARCELAS_MAXIMO:
+        raise ValidationError(f"O número de parcelas deve ficar entre 1 e {PARCELAS_MAXIMO}.")
+    if not 0 <= taxa_mensal <= TAXA_MAXIMA:
+        raise ValidationError(f"A taxa mensal deve ficar entre 0 e {TAXA_MAXIMA}%.")
+    return valor, taxa_mensal, parcelas, sistema
+
+
+@lru_cache(maxsize=1024)
+def _simular(valor, taxa_mensal, parcelas, sistema):
+    linhas = cronograma(valor, taxa_mensal, parcelas, sistema)
+    total_pago = sum((linha.valor for linha in linhas), Decimal("0"))
+    return Simulacao(sistema, valor, taxa_mensal, parcelas, linhas, total_pago, total_pago - valor)
+
+
+def simular(valor, taxa_mensal, parcelas, sistema=PRICE):
+    """Simulação memorizada por (valor, taxa, parcelas, sistema) já normalizados.
+
+    O resultado é imutável e compartilhado entre chamadas.
+    """
+    return _simular(*normalizar(valor, taxa_mensal, parcelas, sistema))
+
+
+def somar_meses(data, meses):
+    mes = data.month - 1 + meses
+    ano, mes = data.year + mes // 12, mes % 12 + 1
+    return date(ano, mes, min(data.day, calendar.monthrange(ano, mes)[1]))
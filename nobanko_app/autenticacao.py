@@ -0,0 +1,157 @@
+import asyncio
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.cache import cache
+
+from . import metricas
+
+LOGIN_PADRAO = {
+    # Tentativas de login por IP: rajada e reposição por minuto.
+    "IP_CAPACIDADE": 20,
+    "IP_POR_MINUTO": 10,
+    # Tentativas por conta (e-mail ou número informado), de qualquer IP.
+    "CONTA_CAPACIDADE": 5,
+    "CONTA_POR_MINUTO": 2,
+    # Threads de hash e quantos pedidos podem esperar além delas.
+    "HASH_TRABALHADORES": 4,
+    "HASH_FILA": 32,
+    # Cabeçalho META com o IP real quando há proxy na frente (ex.: "HTTP_X_FORWARDED_FOR").
+    "CABECALHO_IP": "",
+}
+
+
+class HashIndisponivel(Exception):
+    """A fila de hash de senha está cheia; o pedido é recusado em vez de esperar."""
+
+
+def _configuracao():
+    config = dict(LOGIN_PADRAO)
+    config.update(getattr(settings, "NOBANKO_LOGIN", {}))
+    return config
+
+
+def ip_cliente(request):
+    cabecalho = _configuracao()["CABECALHO_IP"]
+    if cabecalho and request.META.get(cabecalho):
+        # O último endereço é o que o nosso proxy acrescentou; os anteriores vêm do cliente.
+        return request.META[cabecalho].split(",")[-1].strip()
+    return request.META.get("REMOTE_ADDR", "")
+
+
+class ExecutorHash:
+    """Executor de tamanho fixo para PBKDF2, com fila limitada.
+
+    Quando trabalhadores e fila estão ocupados o pedido falha na hora com
+    ``HashIndisponivel``: numa rajada de credential stuffing é melhor
+    recusar do que acumular requisições presas esperando CPU.
+    """
+
+    def __init__(self, trabalhadores, fila):
+        self._executor = ThreadPoolExecutor(max_workers=trabalhadores, thread_name_prefix="nobanko-hash")
+        self._vagas = threading.BoundedSemaphore(trabalhadores + fila)
+
+    async def executar(self, nome, funcao, *args):
+        if not self._vagas.acquire(blocking=False):
+            metricas.incrementar("hash.recusados")
+            raise HashIndisponivel
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, _medir, nome, funcao, *args)
+        finally:
+            self._vagas.release()
+
+
+def _medir(nome, funcao, *args):
+    inicio = time.perf_counter()
+    try:
+        return funcao(*args)
+    finally:
+        metricas.registrar_duracao(nome, time.perf_counter() - inicio)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def executor_hash():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            config = _configuracao()
+            _executor = ExecutorHash(config["HASH_TRABALHADORES"], config["HASH_FILA"])
+        return _executor
+
+
+async def verificar_senha(senha, codificada):
+    return await executor_hash().executar("hash.verificacao", check_password, senha, codificada)
+
+
+async def gerar_hash(senha):
+    return await executor_hash().executar("hash.geracao", make_password, senha)
+
+
+class BaldeTokens:
+    """Limite de tentativas por identificador no cache compartilhado.
+
+    Aproxima o token bucket com uma janela deslizante de dois contadores: a
+    janela dura o tempo de encher o balde, e a anterior pesa pela fração que
+    ainda cobre. Cada tentativa é um ``incr`` atômico no cache, então duas
+    tentativas simultâneas nunca recebem a mesma vaga.
+    """
+
+    def __init__(self, nome, capacidade, por_minuto):
+        self.nome = nome
+        self.capacidade = capacidade
+        self.janela = 60 * capacidade / por_minuto
+
+    def _chave(self, identificador, janela):
+        resumo = hashlib.sha256(str(identificador).encode()).hexdigest()[:32]
+        return f"nobanko:balde:{self.nome}:{resumo}:{janela}"
+
+    def _contar(self, chave):
+        # A chave vive duas janelas: na seguinte ela ainda entra como anterior.
+        validade = int(2 * self.janela) + 1
+        cache.add(chave, 0, validade)
+        try:
+            return cache.incr(chave)
+        except ValueError:
+            # Expirou entre o add e o incr.
+            if cache.add(chave, 1, validade):
+                return 1
+            return cache.incr(chave)
+
+    def _consumir(self, identificador):
+        posicao = time.time() / self.janela
+        atual = int(posicao)
+        tentativas = self._contar(self._chave(identificador, atual))
+        anteriores = cache.get(self._chave(identificador, atual - 1), 0)
+        estimadas = tentativas - 1 + anteriores * (1 - (posicao - atual))
+        return estimadas < self.capacidade
+
+    async def consumir(self, identificador):
+        # O incr síncrono é o atômico nos backends (Redis, memória); o aincr
+        # padrão do Django é um get seguido de set.
+        return await sync_to_async(self._consumir)(identificador)
+
+
+async def permitir_tentativa(acao, ip, conta=None):
+    """Consome um token do IP e, se informada, da conta. Falso quando algum está vazio."""
+    config = _configuracao()
+    baldes = [(BaldeTokens(f"{acao}:ip", config["IP_CAPACIDADE"], config["IP_POR_MINUTO"]), ip)]
+    if conta:
+        baldes.append(
+            (BaldeTokens(f"{acao}:conta", config["CONTA_CAPACIDADE"], config["CONTA_POR_MINUTO"]), conta.lower())
+        )
+
+    for balde, identificador in baldes:
+        if not await balde.consumir(identificador):
+            metricas.incrementar(f"{balde.nome}.bloqueios")
+            return False
+    return True
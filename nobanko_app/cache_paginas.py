@@ -0,0 +1,55 @@
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from . import metricas
+from .middleware import sessao_cliente
+
+TEMPO_CACHE_PADRAO = 600
+
+
+def versao_cache():
+    return str(getattr(settings, "NOBANKO_VERSAO_DEPLOY", ""))
+
+
+def tempo_cache():
+    return getattr(settings, "NOBANKO_CACHE_PAGINAS_SEGUNDOS", TEMPO_CACHE_PADRAO)
+
+
+def chave_cache(*partes):
+    return ":".join(["nobanko", versao_cache(), *map(str, partes)])
+
+
+def cache_pagina_anonima(view):
+    """Serve do cache a página renderizada para visitantes sem sessão.
+
+    Usuários logados, métodos que não sejam GET/HEAD e requisições com query
+    string sempre passam pela view: a chave é só o caminho, e aceitar
+    parâmetros arbitrários deixaria qualquer um encher o cache de variantes.
+    A chave leva a versão do deploy, então publicar uma versão nova descarta
+    as páginas antigas sem limpar o cache.
+    """
+
+    @wraps(view)
+    def _view(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD") or request.GET or sessao_cliente(request).usuario_id:
+            return view(request, *args, **kwargs)
+
+        chave = chave_cache("pagina", request.path)
+        guardada = cache.get(chave)
+        if guardada is not None:
+            metricas.incrementar("cache_paginas.acertos")
+            conteudo, content_type = guardada
+            return HttpResponse(conteudo, content_type=content_type)
+
+        metricas.incrementar("cache_paginas.faltas")
+        resposta = view(request, *args, **kwargs)
+        if resposta.status_code == 200 and not resposta.streaming and not resposta.cookies:
+            cache.set(chave, (resposta.content, resposta["Content-Type"]), tempo_cache())
+        return resposta
+
+    # Marca a view para `prerenderizar_paginas`.
+    _view.pagina_anonima = True
+    return _view
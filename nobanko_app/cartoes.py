@@ -0,0 +1,97 @@
+import secrets
+from datetime import timedelta
+
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from . import metricas
+from .alocacao import AlocadorBlocos
+from .models import Cartao, SequenciaCartao
+from .utils import TAMANHO_LOTE
+
+BLOCO_PADRAO = 100
+VALIDADE_DIAS = 365 * 4
+
+
+def digito_luhn(corpo):
+    """Dígito que torna ``corpo + dígito`` válido no algoritmo de Luhn."""
+    soma = 0
+    for posicao, digito in enumerate(reversed(corpo)):
+        valor = int(digito)
+        # Com o dígito verificador à direita, dobram-se as posições pares a partir dele.
+        if posicao % 2 == 0:
+            valor *= 2
+            if valor > 9:
+                valor -= 9
+        soma += valor
+    return str(-soma % 10)
+
+
+def formatar_cartao(bin_, sequencia):
+    """``<BIN, 6 dígitos><identificação, 9 dígitos><DV Luhn>``."""
+    corpo = f"{bin_}{sequencia:09d}"
+    return corpo + digito_luhn(corpo)
+
+
+def cartao_valido(numero):
+    return len(numero) == 16 and numero.isdigit() and digito_luhn(numero[:-1]) == numero[-1]
+
+
+def _bin_do_modelo(modelo):
+    if not modelo.bin:
+        modelo.save(update_fields=["bin"])
+    return modelo.bin
+
+
+class AlocadorCartoes(AlocadorBlocos):
+    """Números de cartão por BIN do modelo, em blocos da ``SequenciaCartao``."""
+
+    def __init__(self, bloco=BLOCO_PADRAO, using=DEFAULT_DB_ALIAS):
+        super().__init__(SequenciaCartao, formatar_cartao, _bin_do_modelo, bloco, using)
+
+
+alocador_cartoes = AlocadorCartoes()
+
+
+def emitir_cartoes(itens):
+    """Cria os cartões de ``itens`` (``(cliente, modelo, limite)``) em lote.
+
+    Uma reserva de números por modelo e ``bulk_create`` em lotes; a ordem do
+    resultado acompanha a de ``itens``.
+    """
+    itens = list(itens)
+    if not itens:
+        return []
+
+    por_modelo = {}
+    for posicao, (_cliente, modelo, _limite) in enumerate(itens):
+        por_modelo.setdefault(modelo.pk, (modelo, []))[1].append(posicao)
+
+    # Fora de transação o alocador serve números dos blocos em memória; se o
+    # INSERT falhar, os números reservados ficam só como lacuna na sequência.
+    numeros = [None] * len(itens)
+    for modelo, posicoes in por_modelo.values():
+        if len(posicoes) == 1:
+            numeros[posicoes[0]] = alocador_cartoes.alocar(modelo)
+        else:
+            for posicao, numero in zip(posicoes, alocador_cartoes.alocar_lote(modelo, len(posicoes))):
+                numeros[posicao] = numero
+
+    validade = (timezone.now() + timedelta(days=VALIDADE_DIAS)).date()
+    cartoes = Cartao.objects.bulk_create(
+        [
+            Cartao(
+                cliente=cliente,
+                modelo=modelo,
+                numero=numero,
+                validade=validade,
+                codigo_seguranca=f"{secrets.randbelow(1000):03d}",
+                limite=limite,
+            )
+            for (cliente, modelo, limite), numero in zip(itens, numeros)
+        ],
+        batch_size=TAMANHO_LOTE,
+    )
+
+    metricas.incrementar("cartoes.emitidos", len(cartoes))
+    return cartoes
@@ -0,0 +1,112 @@
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+from . import metricas
+
+logger = logging.getLogger(__name__)
+
+MODO_PESSIMISTA = "pessimista"
+MODO_OTIMISTA = "otimista"
+
+RETENTATIVAS_PADRAO = {
+    "TENTATIVAS": 5,
+    "ESPERA_BASE": 0.02,
+    "ESPERA_MAXIMA": 0.5,
+}
+
+# SQLSTATE de falha de serialização e deadlock (PostgreSQL) e códigos do MySQL
+# para deadlock e lock wait timeout.
+_CODIGOS_TRANSITORIOS = {"40001", "40P01", 1205, 1213}
+_MENSAGENS_TRANSITORIAS = (
+    "database is locked",
+    "database table is locked",
+    "deadlock",
+    "could not serialize access",
+    "lock wait timeout",
+)
+
+
+class ConflitoConcorrencia(Exception):
+    """Outra transação alterou a linha entre a leitura e o compare-and-swap."""
+
+
+def modo_concorrencia(using=DEFAULT_DB_ALIAS):
+    """Modo de atualização de saldo configurado para o alias ou o backend do banco.
+
+    ``NOBANKO_CONCORRENCIA`` aceita chaves por alias (``"default"``) ou por
+    vendor (``"sqlite"``, ``"postgresql"``); o alias tem precedência.
+    """
+    config = getattr(settings, "NOBANKO_CONCORRENCIA", {})
+    modo = config.get(using) or config.get(connections[using].vendor) or MODO_PESSIMISTA
+    if modo not in (MODO_PESSIMISTA, MODO_OTIMISTA):
+        raise ValueError(f"Modo de concorrência desconhecido: {modo!r}.")
+    return modo
+
+
+def _configuracao():
+    config = dict(RETENTATIVAS_PADRAO)
+    config.update(getattr(settings, "NOBANKO_RETENTATIVAS", {}))
+    return config
+
+
+def erro_transitorio(exc):
+    if isinstance(exc, ConflitoConcorrencia):
+        return True
+
+    if not isinstance(exc, DatabaseError):
+        return False
+
+    causa = exc.__cause__ or exc
+    codigo = (
+        getattr(causa, "sqlstate", None)
+        or getattr(causa, "pgcode", None)
+        or (causa.args[0] if causa.args and isinstance(causa.args[0], int) else None)
+    )
+    if codigo in _CODIGOS_TRANSITORIOS:
+        return True
+
+    mensagem = str(exc).lower()
+    return any(trecho in mensagem for trecho in _MENSAGENS_TRANSITORIAS)
+
+
+def calcular_espera(tentativa, config=None):
+    config = config or _configuracao()
+    teto = min(config["ESPERA_MAXIMA"], config["ESPERA_BASE"] * (2 ** tentativa))
+    return random.uniform(0, teto)
+
+
+def executar_com_retentativa(funcao, *args, nome="operacao", using=DEFAULT_DB_ALIAS, **kwargs):
+    """Executa ``funcao`` repetindo-a em deadlocks, falhas de serialização e banco ocupado.
+
+    Erros do banco só são repetidos quando não há transação externa aberta:
+    dentro de um ``atomic`` de quem chamou a transação inteira já foi perdida e
+    o erro sobe. Conflitos otimistas não afetam a transação e sempre são
+    repetidos.
+    """
+    config = _configuracao()
+    tentativa = 0
+
+    while True:
+        try:
+            return funcao(*args, **kwargs)
+        except (DatabaseError, ConflitoConcorrencia) as exc:
+            if not erro_transitorio(exc):
+                raise
+            if isinstance(exc, DatabaseError) and connections[using].in_atomic_block:
+                raise
+
+            tentativa += 1
+            if tentativa >= config["TENTATIVAS"]:
+                metricas.incrementar(f"{nome}.retentativas_esgotadas")
+                raise
+
+            metricas.incrementar(f"{nome}.retentativas")
+            espera = calcular_espera(tentativa, config)
+            logger.info(
+                "%s: erro transitório (%s), tentativa %s em %.3fs.", nome, exc, tentativa + 1, espera
+            )
+            time.sleep(espera)
@@ -0,0 +1,54 @@
+from django.db import DEFAULT_DB_ALIAS
+
+from .alocacao import AlocadorBlocos
+from .models import SequenciaConta
+from .utils import somente_digitos
+
+BLOCO_PADRAO = 50
+PESOS_DIGITO = (2, 3, 4, 5, 6, 7, 8, 9)
+
+
+def digito_verificador(numero):
+    """Módulo 11 com pesos 2 a 9 da direita para a esquerda; restos 10 e 11 viram 0."""
+    soma = sum(
+        int(digito) * PESOS_DIGITO[posicao % len(PESOS_DIGITO)]
+        for posicao, digito in enumerate(reversed(numero))
+    )
+    resto = 11 - soma % 11
+    return "0" if resto >= 10 else str(resto)
+
+
+def formatar_conta(agencia, sequencia):
+    """``<agência, 4 dígitos><sequência, 7 dígitos><DV>``.
+
+    O prefixo da agência separa as sequências entre agências, e os 12
+    dígitos nunca coincidem com as contas antigas de 8 dígitos nem com um CPF.
+    """
+    corpo = f"{_agencia_numerica(agencia)}{sequencia:07d}"
+    return corpo + digito_verificador(corpo)
+
+
+def conta_valida(conta):
+    return len(conta) == 12 and conta.isdigit() and digito_verificador(conta[:-1]) == conta[-1]
+
+
+def _agencia_numerica(agencia):
+    digitos = somente_digitos(agencia)
+    if not digitos or len(digitos) > 4:
+        raise ValueError(f"Agência inválida para numeração de contas: {agencia!r}.")
+    return digitos.zfill(4)
+
+
+def _agencia_validada(agencia):
+    _agencia_numerica(agencia)
+    return agencia
+
+
+class AlocadorContas(AlocadorBlocos):
+    """Números de conta por agência, em blocos da ``SequenciaConta``."""
+
+    def __init__(self, bloco=BLOCO_PADRAO, using=DEFAULT_DB_ALIAS):
+        super().__init__(SequenciaConta, formatar_conta, _agencia_validada, bloco, using)
+
+
+alocador_contas = AlocadorContas()
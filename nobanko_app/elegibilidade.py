@@ -0,0 +1,91 @@
+import threading
+import time
+from bisect import bisect_right
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Q
+
+from .models import Cliente, ModeloCartao
+
+CENTAVO = Decimal("0.01")
+
+
+class CatalogoModelos:
+    """Modelos de cartão ativos indexados pelo limite de crédito que aceitam.
+
+    Os extremos dos intervalos ``[limite_minimo, limite_maximo]`` dividem o
+    eixo de limites em segmentos; cada segmento guarda, já na ordem do
+    catálogo, os modelos que o cobrem. Responder a um limite é uma busca
+    binária pelo segmento.
+    """
+
+    def __init__(self, modelos):
+        # Intervalos semiabertos: o máximo é inclusivo e os limites têm centavos.
+        intervalos = [
+            (
+                modelo.limite_minimo,
+                None if modelo.limite_maximo is None else modelo.limite_maximo + CENTAVO,
+                modelo,
+            )
+            for modelo in modelos
+        ]
+        self.pontos = sorted(
+            {inicio for inicio, _fim, _modelo in intervalos}
+            | {fim for _inicio, fim, _modelo in intervalos if fim is not None}
+        )
+        self.segmentos = [
+            tuple(
+                modelo
+                for inicio, fim, modelo in intervalos
+                if inicio <= ponto and (fim is None or ponto < fim)
+            )
+            for ponto in self.pontos
+        ]
+
+    def elegiveis(self, limite):
+        limite = (limite or Decimal("0")).quantize(CENTAVO)
+        posicao = bisect_right(self.pontos, limite) - 1
+        return self.segmentos[posicao] if posicao >= 0 else ()
+
+
+_catalogo = None
+_carregado_em = 0.0
+_lock = threading.Lock()
+
+
+def _validade():
+    return getattr(settings, "NOBANKO_CATALOGO_CARTOES_SEGUNDOS", 60)
+
+
+def catalogo():
+    """Catálogo do processo, recarregado depois de ``NOBANKO_CATALOGO_CARTOES_SEGUNDOS``."""
+    global _catalogo, _carregado_em
+    with _lock:
+        if _catalogo is None or time.monotonic() - _carregado_em > _validade():
+            _catalogo = CatalogoModelos(list(ModeloCartao.objects.filter(ativo=True)))
+            _carregado_em = time.monotonic()
+        return _catalogo
+
+
+def invalidar_catalogo():
+    global _catalogo
+    with _lock:
+        _catalogo = None
+
+
+def modelos_elegiveis(limite):
+    """Modelos ativos cujo intervalo de limite contém ``limite``.
+
+    As instâncias são compartilhadas pelo processo e devem ser tratadas como
+    somente leitura.
+    """
+    return catalogo().elegiveis(limite)
+
+
+def clientes_elegiveis(modelo):
+    """Clientes cujo limite cabe no modelo: uma faixa no índice de ``limite_credito``."""
+    faixa = Q(limite_credito__gte=modelo.limite_minimo)
+    if modelo.limite_maximo is not None:
+        faixa &= Q(limite_credito__lte=modelo.limite_maximo)
+    return Cliente.objects.filter(faixa)
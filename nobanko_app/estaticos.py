@@ -0,0 +1,95 @@
+import gzip
+import json
+import os
+from pathlib import Path
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli é opcional
+    brotli = None
+
+EXTENSOES_COMPRIMIVEIS = {".css", ".js", ".map", ".svg", ".html", ".txt", ".json", ".xml", ".ico"}
+TAMANHO_MINIMO_COMPRESSAO = 256
+
+# Extensão do arquivo pré-comprimido -> valor de Content-Encoding, em ordem de preferência.
+CODIFICACOES = (("br", ".br"), ("gzip", ".gz"))
+
+
+def _comprimir(caminho):
+    conteudo = caminho.read_bytes()
+    variantes = {".gz": gzip.compress(conteudo, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variantes[".br"] = brotli.compress(conteudo, quality=11)
+
+    gravadas = []
+    for extensao, comprimido in variantes.items():
+        destino = caminho.with_name(caminho.name + extensao)
+        # Variante que não economiza nada só faria o servidor ler mais um arquivo.
+        if len(comprimido) < len(conteudo):
+            destino.write_bytes(comprimido)
+            gravadas.append(destino)
+        elif destino.exists():
+            destino.unlink()
+    return gravadas
+
+
+class ArmazenamentoEstaticoComprimido(ManifestStaticFilesStorage):
+    """Nomes com hash do conteúdo e variantes .gz/.br geradas no ``collectstatic``."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+
+        for nome in self.hashed_files.values():
+            caminho = Path(self.path(nome))
+            if (
+                caminho.suffix in EXTENSOES_COMPRIMIVEIS
+                and caminho.exists()
+                and caminho.stat().st_size >= TAMANHO_MINIMO_COMPRESSAO
+            ):
+                for variante in _comprimir(caminho):
+                    yield os.path.relpath(variante, self.location), str(variante), True
+
+
+def indexar(raiz):
+    """Mapeia cada arquivo de ``raiz`` às codificações pré-comprimidas disponíveis."""
+    raiz = Path(raiz)
+    extensoes = {extensao for _codificacao, extensao in CODIFICACOES}
+    arquivos = {}
+    for caminho in raiz.rglob("*"):
+        if not caminho.is_file() or caminho.suffix in extensoes:
+            continue
+        nome = caminho.relative_to(raiz).as_posix()
+        arquivos[nome] = tuple(
+            codificacao
+            for codificacao, extensao in CODIFICACOES
+            if caminho.with_name(caminho.name + extensao).is_file()
+        )
+    return arquivos
+
+
+def nomes_com_hash(raiz, manifesto=ManifestStaticFilesStorage.manifest_name):
+    try:
+        dados = json.loads((Path(raiz) / manifesto).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return set()
+    return set(dados.get("paths", {}).values())
+
+
+def codificacoes_aceitas(cabecalho):
+    aceitas = set()
+    for item in (cabecalho or "").split(","):
+        nome, _separador, parametros = item.strip().partition(";")
+        qualidade = parametros.strip()
+        if qualidade.startswith("q="):
+            try:
+                if float(qualidade[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        if nome:
+            aceitas.add(nome.strip().lower())
+    return aceitas
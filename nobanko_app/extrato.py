@@ -0,0 +1,167 @@
+import csv
+from decimal import Decimal
+
+from django.utils import timezone
+
+from .models import Transacao
+
+TAMANHO_BLOCO_EXTRATO = 2000
+
+COLUNAS_CSV = [
+    "data",
+    "tipo",
+    "valor",
+    "descricao",
+    "contraparte",
+    "agencia_contraparte",
+    "conta_contraparte",
+    "saldo_resultante",
+    "id",
+]
+
+_CAMPOS = (
+    "pk",
+    "data",
+    "tipo",
+    "valor",
+    "descricao",
+    "saldo_resultante",
+    "contraparte__usuario__nome",
+    "contraparte__usuario__agencia",
+    "contraparte__usuario__conta",
+)
+
+
+def iterar_movimentos(transacoes, tamanho_bloco=TAMANHO_BLOCO_EXTRATO):
+    """Percorre o extrato em ordem cronológica sem materializar o queryset.
+
+    Lê só as colunas exportadas (a contraparte vem no mesmo JOIN) em blocos
+    de ``tamanho_bloco``; em backends com cursor no servidor a memória fica
+    constante qualquer que seja o tamanho do histórico.
+    """
+    linhas = transacoes.order_by("data", "id").values_list(*_CAMPOS)
+    for linha in linhas.iterator(chunk_size=tamanho_bloco):
+        yield dict(zip(_CAMPOS, linha))
+
+
+def _valor_assinado(movimento):
+    if movimento["tipo"] == Transacao.Tipo.SAIDA:
+        return -movimento["valor"]
+    return movimento["valor"]
+
+
+# Caracteres que fazem Excel e LibreOffice lerem a célula como fórmula.
+_INICIO_FORMULA = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _texto_csv(valor):
+    """Texto livre com apóstrofo na frente quando começaria uma fórmula."""
+    valor = valor or ""
+    if valor.startswith(_INICIO_FORMULA):
+        return "'" + valor
+    return valor
+
+
+class _Eco:
+    """Buffer de escrita que devolve a linha em vez de guardá-la."""
+
+    def write(self, valor):
+        return valor
+
+
+def gerar_csv(movimentos):
+    escritor = csv.writer(_Eco(), lineterminator="\n")
+    # BOM para o Excel reconhecer UTF-8 e exibir os acentos.
+    yield "\ufeff" + escritor.writerow(COLUNAS_CSV)
+    for movimento in movimentos:
+        yield escritor.writerow(
+            [
+                timezone.localtime(movimento["data"]).isoformat(),
+                movimento["tipo"],
+                f"{_valor_assinado(movimento):.2f}",
+                _texto_csv(movimento["descricao"]),
+                _texto_csv(movimento["contraparte__usuario__nome"]),
+                movimento["contraparte__usuario__agencia"] or "",
+                movimento["contraparte__usuario__conta"] or "",
+                f"{movimento['saldo_resultante']:.2f}",
+                movimento["pk"],
+            ]
+        )
+
+
+def _data_ofx(momento):
+    momento = timezone.localtime(momento)
+    deslocamento = momento.utcoffset().total_seconds() / 3600
+    return f"{momento:%Y%m%d%H%M%S}[{deslocamento:g}:{momento.tzname()}]"
+
+
+def _texto_ofx(valor, limite=255):
+    valor = (valor or "").replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    return " ".join(valor.split())[:limite]
+
+
+def gerar_ofx(cliente, movimentos, inicio, fim, saldo_atual):
+    """Extrato OFX 1.02 (SGML), o formato aceito pelos softwares contábeis nacionais.
+
+    ``saldo_atual`` só é usado quando o período não tem movimentos; caso
+    contrário o saldo informado é o resultante do último movimento exportado.
+    """
+    agora = timezone.now()
+    yield (
+        "OFXHEADER:100\n"
+        "DATA:OFXSGML\n"
+        "VERSION:102\n"
+        "SECURITY:NONE\n"
+        "ENCODING:UTF-8\n"
+        "CHARSET:NONE\n"
+        "COMPRESSION:NONE\n"
+        "OLDFILEUID:NONE\n"
+        "NEWFILEUID:NONE\n"
+        "\n"
+        "<OFX>\n"
+        "<SIGNONMSGSRSV1><SONRS>\n"
+        "<STATUS><CODE>0<SEVERITY>INFO</STATUS>\n"
+        f"<DTSERVER>{_data_ofx(agora)}\n"
+        "<LANGUAGE>POR\n"
+        "</SONRS></SIGNONMSGSRSV1>\n"
+        "<BANKMSGSRSV1><STMTTRNRS>\n"
+        "<TRNUID>1\n"
+        "<STATUS><CODE>0<SEVERITY>INFO</STATUS>\n"
+        "<STMTRS>\n"
+        "<CURDEF>BRL\n"
+        "<BANKACCTFROM>\n"
+        "<BANKID>NOBANKO\n"
+        f"<BRANCHID>{cliente.usuario.agencia}\n"
+        f"<ACCTID>{cliente.usuario.conta}\n"
+        "<ACCTTYPE>CHECKING\n"
+        "</BANKACCTFROM>\n"
+        "<BANKTRANLIST>\n"
+        f"<DTSTART>{_data_ofx(inicio)}\n"
+        f"<DTEND>{_data_ofx(fim)}\n"
+    )
+
+    saldo = None
+    for movimento in movimentos:
+        valor = _valor_assinado(movimento)
+        saldo = movimento["saldo_resultante"]
+        yield (
+            "<STMTTRN>\n"
+            f"<TRNTYPE>{'CREDIT' if valor > 0 else 'DEBIT'}\n"
+            f"<DTPOSTED>{_data_ofx(movimento['data'])}\n"
+            f"<TRNAMT>{valor:.2f}\n"
+            f"<FITID>{movimento['pk']}\n"
+            f"<MEMO>{_texto_ofx(movimento['descricao'] or movimento['tipo'])}\n"
+            "</STMTTRN>\n"
+        )
+
+    saldo = saldo if saldo is not None else saldo_atual or Decimal("0")
+    yield (
+        "</BANKTRANLIST>\n"
+        "<LEDGERBAL>\n"
+        f"<BALAMT>{saldo:.2f}\n"
+        f"<DTASOF>{_data_ofx(fim)}\n"
+        "</LEDGERBAL>\n"
+        "</STMTRS>\n"
+        "</STMTTRNRS></BANKMSGSRSV1>\n"
+        "</OFX>\n"
+    )
@@ -0,0 +1,281 @@
+import calendar
+import logging
+import secrets
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, connections, transaction
+from django.db.models import Max, Min, OuterRef, Subquery, Sum
+from django.utils import timezone
+
+from . import metricas
+from .concorrencia import executar_com_retentativa
+from .models import Cartao, CheckpointFechamento, CompraCartao, Fatura, Mensagem
+from .utils import TAMANHO_LOTE
+
+logger = logging.getLogger(__name__)
+
+FATURAMENTO_PADRAO = {
+    # Cartões fechados por transação; cada lote grava também o checkpoint.
+    "LOTE": 2000,
+    "DIAS_VENCIMENTO": 7,
+    # Faixas de ids em que o dia é dividido; cada processo fecha uma por vez.
+    "FAIXAS": 8,
+    # Faturas vencidas marcadas como atrasadas por UPDATE.
+    "LOTE_ATRASO": 5000,
+    # Validade da trava que impede duas marcações de atraso ao mesmo tempo.
+    "TRAVA_ATRASO_SEGUNDOS": 3600,
+}
+
+CHAVE_TRAVA_ATRASO = "nobanko:faturamento:atraso"
+
+
+class MarcacaoEmAndamento(Exception):
+    """Outra execução de ``marcar_atrasadas`` ainda segura a trava no cache."""
+
+
+def _configuracao():
+    config = dict(FATURAMENTO_PADRAO)
+    config.update(getattr(settings, "NOBANKO_FATURAMENTO", {}))
+    return config
+
+
+def cartoes_do_dia(fechamento):
+    """Cartões que fecham em ``fechamento``; no último dia do mês entram os dias 29-31 que faltam."""
+    ultimo_dia = calendar.monthrange(fechamento.year, fechamento.month)[1]
+    dias = range(fechamento.day, 32) if fechamento.day == ultimo_dia else (fechamento.day,)
+    return Cartao.objects.filter(dia_fechamento__in=dias)
+
+
+def preparar_faixas(fechamento, faixas):
+    """Divide os ids dos cartões do dia em faixas com checkpoint; reaproveita as já criadas.
+
+    Cartões criados depois das faixas (ids a partir do maior ``fim``) ganham
+    uma faixa nova, única para que duas preparações simultâneas não criem
+    faixas sobrepostas.
+    """
+    existentes = list(CheckpointFechamento.objects.filter(fechamento=fechamento).order_by("inicio"))
+    cartoes = cartoes_do_dia(fechamento)
+    if existentes:
+        cartoes = cartoes.filter(pk__gte=existentes[-1].fim)
+        faixas = 1
+
+    limites = cartoes.aggregate(menor=Min("pk"), maior=Max("pk"))
+    if limites["menor"] is None:
+        return existentes
+
+    menor, fim = limites["menor"], limites["maior"] + 1
+    if existentes:
+        menor = existentes[-1].fim
+    passo = max(1, -(-(fim - menor) // faixas))
+    CheckpointFechamento.objects.bulk_create(
+        [
+            CheckpointFechamento(
+                fechamento=fechamento, inicio=inicio, fim=min(inicio + passo, fim), ultimo_cartao=inicio - 1
+            )
+            for inicio in range(menor, fim, passo)
+        ],
+        ignore_conflicts=True,
+    )
+    return list(CheckpointFechamento.objects.filter(fechamento=fechamento).order_by("inicio"))
+
+
+def _fechar_lote(fechamento, corte, vencimento, pks):
+    totais = (
+        CompraCartao.objects.filter(cartao_id__in=pks, fatura__isnull=True, data__lt=corte)
+        .order_by()
+        .values("cartao_id")
+        .annotate(total=Sum("valor"))
+    )
+    faturas = [
+        Fatura(
+            cartao_id=linha["cartao_id"],
+            valor_total=linha["total"],
+            vencimento=vencimento,
+            fechamento=fechamento,
+            status="pendente",
+        )
+        for linha in totais
+    ]
+    if not faturas:
+        return 0
+
+    Fatura.objects.bulk_create(faturas, batch_size=TAMANHO_LOTE)
+    CompraCartao.objects.filter(
+        cartao_id__in=[fatura.cartao_id for fatura in faturas], fatura__isnull=True, data__lt=corte
+    ).update(
+        fatura_id=Subquery(
+            Fatura.objects.filter(cartao_id=OuterRef("cartao_id"), fechamento=fechamento).values("pk")[:1]
+        )
+    )
+    return len(faturas)
+
+
+def fechar_faixa(checkpoint_pk, lote=None):
+    """Fecha os cartões de uma faixa a partir do último checkpoint gravado.
+
+    Faturas, vínculo das compras e checkpoint de cada lote entram na mesma
+    transação: uma execução interrompida recomeça do lote seguinte ao último
+    confirmado, sem duplicar faturas.
+    """
+    config = _configuracao()
+    lote = lote or config["LOTE"]
+    checkpoint = CheckpointFechamento.objects.get(pk=checkpoint_pk)
+    fechamento = checkpoint.fechamento
+    corte = timezone.make_aware(datetime.combine(fechamento, datetime.min.time()))
+    vencimento = fechamento + timedelta(days=config["DIAS_VENCIMENTO"])
+    cartoes = cartoes_do_dia(fechamento).filter(pk__lt=checkpoint.fim).order_by("pk")
+
+    criadas = 0
+    while not checkpoint.concluido:
+        pks = list(cartoes.filter(pk__gt=checkpoint.ultimo_cartao).values_list("pk", flat=True)[:lote])
+        with transaction.atomic():
+            if pks:
+                quantidade = _fechar_lote(fechamento, corte, vencimento, pks)
+                checkpoint.ultimo_cartao = pks[-1]
+                checkpoint.faturas += quantidade
+                criadas += quantidade
+            checkpoint.concluido = len(pks) < lote
+            checkpoint.save(update_fields=["ultimo_cartao", "faturas", "concluido", "atualizado_em"])
+        if pks:
+            metricas.incrementar("faturamento.faturas", quantidade)
+
+    return criadas
+
+
+def fechar_faixa_com_retentativa(checkpoint_pk, lote=None):
+    """Fecha a faixa repetindo lotes perdidos em deadlock ou banco ocupado.
+
+    Devolve as faturas gravadas no checkpoint durante a chamada: lotes
+    confirmados por uma tentativa que falhou depois também contam.
+    """
+    faturas = CheckpointFechamento.objects.filter(pk=checkpoint_pk).values_list("faturas", flat=True)
+    antes = faturas.get()
+    executar_com_retentativa(fechar_faixa, checkpoint_pk, lote, nome="faturamento")
+    return faturas.get() - antes
+
+
+def _inicializar_processo():
+    import django
+
+    django.setup()
+    # Conexões herdadas do processo pai não podem ser compartilhadas.
+    connections.close_all()
+
+
+def fechar_ciclo(fechamento, processos=1, lote=None):
+    """Fecha as faturas do dia ``fechamento``; devolve ``(faturas criadas, segundos)``.
+
+    Com ``processos`` > 1 as faixas pendentes são distribuídas entre processos
+    de trabalho, cada um com a própria conexão ao banco. No SQLite, que aceita
+    um escritor por vez, o fechamento roda sempre num único processo.
+    """
+    if processos > 1 and connection.vendor == "sqlite":
+        logger.warning("SQLite não aceita escritas paralelas; fechando as faturas num único processo.")
+        processos = 1
+
+    inicio = time.perf_counter()
+    criadas = 0
+    while True:
+        # Depois de fechar as faixas, uma nova passada pega os cartões criados no meio do caminho.
+        faixas = preparar_faixas(fechamento, _configuracao()["FAIXAS"])
+        pendentes = [checkpoint.pk for checkpoint in faixas if not checkpoint.concluido]
+        if not pendentes:
+            break
+
+        if processos > 1 and len(pendentes) > 1:
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=processos, initializer=_inicializar_processo) as executor:
+                criadas += sum(executor.map(fechar_faixa_com_retentativa, pendentes, [lote] * len(pendentes)))
+        else:
+            criadas += sum(fechar_faixa_com_retentativa(pk, lote) for pk in pendentes)
+
+    duracao = time.perf_counter() - inicio
+    metricas.registrar_duracao("faturamento.ciclo", duracao)
+    logger.info("Fechamento de %s: %s faturas em %.2fs.", fechamento, criadas, duracao)
+    return criadas, duracao
+
+
+def marcar_atrasadas(hoje=None, lote=None):
+    """Passa para ``atrasado`` as faturas pendentes vencidas antes de ``hoje``.
+
+    Os lotes seguem a ordem dos clientes e nunca dividem as faturas de um
+    deles, então cada cliente recebe uma única ``Mensagem``, gravada na mesma
+    transação do UPDATE. Uma trava no cache compartilhado impede duas
+    execuções simultâneas (no SQLite, ``skip_locked`` não existe); sem ela
+    levanta ``MarcacaoEmAndamento``. Devolve ``(faturas, mensagens, segundos)``.
+    """
+    config = _configuracao()
+    hoje = hoje or timezone.localdate()
+    lote = lote or config["LOTE_ATRASO"]
+    dono = secrets.token_hex(8)
+    if not cache.add(CHAVE_TRAVA_ATRASO, dono, config["TRAVA_ATRASO_SEGUNDOS"]):
+        raise MarcacaoEmAndamento("Já há uma marcação de faturas atrasadas em andamento.")
+
+    try:
+        return _marcar_atrasadas(hoje, lote)
+    finally:
+        if cache.get(CHAVE_TRAVA_ATRASO) == dono:
+            cache.delete(CHAVE_TRAVA_ATRASO)
+
+
+def _marcar_atrasadas(hoje, lote):
+    inicio = time.perf_counter()
+    vencidas = Fatura.objects.filter(status="pendente", vencimento__lt=hoje).order_by(
+        "cartao__cliente_id", "pk"
+    )
+    if connection.features.has_select_for_update_skip_locked:
+        vencidas = vencidas.select_for_update(skip_locked=True, of=("self",))
+
+    faturas = mensagens = 0
+    while True:
+        with transaction.atomic():
+            linhas = list(vencidas.values_list("pk", "cartao__cliente_id")[:lote])
+            if not linhas:
+                break
+            ultimo_lote = len(linhas) < lote
+            if not ultimo_lote:
+                # O último cliente pode ter mais faturas além do lote: fica para o
+                # próximo, ou vem inteiro se for o único cliente do lote.
+                ultimo_cliente = linhas[-1][1]
+                completas = [linha for linha in linhas if linha[1] != ultimo_cliente]
+                linhas = completas or list(
+                    vencidas.filter(cartao__cliente_id=ultimo_cliente).values_list("pk", "cartao__cliente_id")
+                )
+
+            faturas += Fatura.objects.filter(
+                pk__in=[pk for pk, _cliente in linhas], status="pendente"
+            ).update(status="atrasado")
+
+            por_cliente = defaultdict(int)
+            for _pk, cliente_id in linhas:
+                por_cliente[cliente_id] += 1
+            mensagens += len(
+                Mensagem.objects.bulk_create(
+                    [
+                        Mensagem(
+                            cliente_id=cliente_id,
+                            remetente="sistema",
+                            conteudo=(
+                                "Sua fatura venceu e ainda não foi paga."
+                                if quantidade == 1
+                                else f"{quantidade} faturas suas venceram e ainda não foram pagas."
+                            ),
+                        )
+                        for cliente_id, quantidade in por_cliente.items()
+                    ],
+                    batch_size=TAMANHO_LOTE,
+                )
+            )
+        if ultimo_lote:
+            break
+
+    duracao = time.perf_counter() - inicio
+    metricas.incrementar("faturamento.atrasadas", faturas)
+    metricas.registrar_duracao("faturamento.atraso", duracao)
+    logger.info("%s faturas marcadas como atrasadas em %.2fs.", faturas, duracao)
+    return faturas, mensagens, duracao
@@ -0,0 +1,117 @@
+from collections import namedtuple
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import metricas
+from .cartoes import emitir_cartoes
+from .models import PedidoCartao, SolicitacaoCredito
+from .utils import TAMANHO_LOTE, em_lotes
+
+TAMANHO_PAGINA_FILA = 50
+MAXIMO_LOTE_FILA = 1000
+
+TipoFila = namedtuple("TipoFila", "modelo campo_resposta relacionados")
+
+TIPOS_FILA = {
+    "credito": TipoFila(SolicitacaoCredito, "resposta", ("cliente__usuario",)),
+    "cartao": TipoFila(PedidoCartao, "observacao", ("cliente__usuario", "modelo")),
+}
+
+
+def _tipo(tipo):
+    try:
+        return TIPOS_FILA[tipo]
+    except KeyError:
+        raise ValidationError("Tipo de fila inválido.") from None
+
+
+def pendentes(gerente, tipo, apos=None, limite=TAMANHO_PAGINA_FILA):
+    """Página da fila do gerente, mais antigos primeiro, por keyset sobre (criado_em, id).
+
+    ``apos`` é o ``(criado_em, id)`` do último item da página anterior; a
+    consulta percorre o índice (gerente, status, criado_em) em qualquer página.
+    """
+    config = _tipo(tipo)
+    itens = (
+        config.modelo.objects.select_related(*config.relacionados)
+        .filter(gerente=gerente, status=config.modelo.Status.PENDENTE)
+        .order_by("criado_em", "id")
+    )
+    if apos:
+        criado_em, pk = apos
+        itens = itens.filter(Q(criado_em__gt=criado_em) | Q(criado_em=criado_em, id__gt=pk))
+
+    pagina = list(itens[:limite + 1])
+    proximo = (pagina[limite - 1].criado_em, pagina[limite - 1].pk) if len(pagina) > limite else None
+    return pagina[:limite], proximo
+
+
+def contar_pendentes(gerente):
+    return {
+        tipo: config.modelo.objects.filter(gerente=gerente, status=config.modelo.Status.PENDENTE).count()
+        for tipo, config in TIPOS_FILA.items()
+    }
+
+
+def _travar_pendentes(config, gerente, pks):
+    pendentes_lote = []
+    for lote in em_lotes(sorted(set(pks))):
+        consulta = (
+            config.modelo.objects.select_related(*config.relacionados)
+            .filter(pk__in=lote, gerente=gerente, status=config.modelo.Status.PENDENTE)
+            .order_by("pk")
+        )
+        if connection.features.has_select_for_update:
+            consulta = consulta.select_for_update(of=("self",))
+        pendentes_lote.extend(consulta)
+    return pendentes_lote
+
+
+def _responder(gerente, tipo, pks, decisao, texto):
+    """Responde de uma vez os pedidos pendentes do gerente em ``pks``.
+
+    Itens de outro gerente ou já analisados são ignorados; o retorno traz
+    só os que mudaram de status.
+    """
+    config = _tipo(tipo)
+    status = config.modelo.Status[decisao]
+    pks = list(pks)
+    if len(pks) > MAXIMO_LOTE_FILA:
+        raise ValidationError(f"Selecione no máximo {MAXIMO_LOTE_FILA} itens por vez.")
+
+    texto = (texto or "").strip()
+    campos = ["status", config.campo_resposta, "respondido_em"]
+    with transaction.atomic():
+        itens = _travar_pendentes(config, gerente, pks)
+        if not itens:
+            return []
+
+        agora = timezone.now()
+        for item in itens:
+            item.status = status
+            setattr(item, config.campo_resposta, texto)
+            item.respondido_em = agora
+
+        if config.modelo is PedidoCartao and status == PedidoCartao.Status.APROVADO:
+            cartoes = emitir_cartoes(
+                (pedido.cliente, pedido.modelo, pedido.modelo.limite_para(pedido.cliente)) for pedido in itens
+            )
+            for pedido, cartao in zip(itens, cartoes):
+                pedido.cartao_emitido = cartao
+            campos.append("cartao_emitido")
+
+        config.modelo.objects.bulk_update(itens, campos, batch_size=TAMANHO_LOTE)
+
+    metricas.incrementar(f"fila_gerente.{tipo}.{status}", len(itens))
+    return itens
+
+
+def aprovar_em_lote(gerente, tipo, pks, texto=""):
+    return _responder(gerente, tipo, pks, "APROVADO", texto)
+
+
+def negar_em_lote(gerente, tipo, pks, texto=""):
+    return _responder(gerente, tipo, pks, "NEGADO", texto)
@@ -0,0 +1,180 @@
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Case, F, When
+from django.utils import timezone
+
+from . import metricas
+from .concorrencia import executar_com_retentativa
+from .metricas import ContadorConsultas
+from .models import Cliente, FluxoCaixa, SaldoFracionado, Transacao, Transferencia
+from .utils import TAMANHO_LOTE, em_lotes
+
+logger = logging.getLogger(__name__)
+
+LOTE_LIQUIDACAO_PADRAO = 5000
+
+
+def calcular_posicoes(transferencias):
+    """Posição líquida de cada conta: créditos menos débitos das transferências."""
+    posicoes = defaultdict(Decimal)
+    for transferencia in transferencias:
+        posicoes[transferencia["origem_id"]] -= transferencia["valor"]
+        posicoes[transferencia["destino_id"]] += transferencia["valor"]
+    return posicoes
+
+
+def _separar_descobertas(transferencias, saldos):
+    """Retira do ciclo só as transferências que deixam a conta de origem descoberta.
+
+    De cada conta que não cobre sua posição líquida saem as transferências
+    mais recentes do lote até que a posição caiba no saldo; as demais seguem
+    no ciclo. Tirar débitos pode descobrir outra conta que contava com esse
+    crédito, então a verificação se repete até estabilizar.
+    """
+    liquidaveis = list(transferencias)
+    descobertas = []
+
+    while True:
+        posicoes = calcular_posicoes(liquidaveis)
+        faltas = {
+            pk: -(saldos[pk] + posicao) for pk, posicao in posicoes.items() if saldos[pk] + posicao < 0
+        }
+        if not faltas:
+            return liquidaveis, descobertas
+
+        retiradas = set()
+        for transferencia in sorted(liquidaveis, key=lambda t: t["pk"], reverse=True):
+            origem_id = transferencia["origem_id"]
+            if faltas.get(origem_id, 0) > 0:
+                faltas[origem_id] -= transferencia["valor"]
+                retiradas.add(transferencia["pk"])
+
+        descobertas.extend(t for t in liquidaveis if t["pk"] in retiradas)
+        liquidaveis = [t for t in liquidaveis if t["pk"] not in retiradas]
+
+
+def _liquidar(limite):
+    features = connection.features
+    pendentes = Transferencia.objects.filter(status=Transferencia.Status.PENDENTE).order_by("pk")
+    if features.has_select_for_update_skip_locked:
+        pendentes = pendentes.select_for_update(skip_locked=True)
+
+    with ContadorConsultas() as contador, transaction.atomic():
+        transferencias = list(
+            pendentes.values("pk", "origem_id", "destino_id", "valor", "descricao")[:limite]
+        )
+        if not transferencias:
+            return {"liquidadas": 0, "canceladas": 0, "contas": 0, "consultas": contador.total}
+
+        pks = sorted({t["origem_id"] for t in transferencias} | {t["destino_id"] for t in transferencias})
+        contas = {}
+        for lote in em_lotes(pks):
+            consulta = Cliente.objects.filter(pk__in=lote).order_by("pk")
+            if features.has_select_for_update:
+                consulta = consulta.select_for_update(of=("self",))
+            contas.update(
+                (pk, (saldo, agencia, conta, fracoes))
+                for pk, saldo, agencia, conta, fracoes in consulta.values_list(
+                    "pk", "saldo", "usuario__agencia", "usuario__conta", "fracoes_saldo"
+                )
+            )
+
+        saldos = {pk: saldo for pk, (saldo, _agencia, _conta, _fracoes) in contas.items()}
+
+        posicoes = calcular_posicoes(transferencias)
+        fracionadas = [pk for pk, conta in contas.items() if conta[3] and posicoes[pk] < 0]
+        if fracionadas:
+            for pk, consolidado in SaldoFracionado.consolidar(fracionadas).items():
+                saldos[pk] += consolidado
+
+        liquidaveis, descobertas = _separar_descobertas(transferencias, saldos)
+        posicoes = {pk: posicao for pk, posicao in calcular_posicoes(liquidaveis).items() if posicao}
+
+        for lote in em_lotes(sorted(posicoes)):
+            Cliente.objects.filter(pk__in=lote).update(
+                saldo=Case(
+                    *[When(pk=pk, then=F("saldo") + posicoes[pk]) for pk in lote],
+                    default=F("saldo"),
+                ),
+                versao=F("versao") + 1,
+            )
+
+        transacoes = []
+        for transferencia in liquidaveis:
+            origem_id = transferencia["origem_id"]
+            destino_id = transferencia["destino_id"]
+            valor = transferencia["valor"]
+            saldos[origem_id] -= valor
+            saldos[destino_id] += valor
+            _saldo, agencia_origem, conta_origem, _fracoes = contas[origem_id]
+            _saldo, agencia_destino, conta_destino, _fracoes = contas[destino_id]
+
+            transacoes.append(
+                Transacao(
+                    cliente_id=origem_id,
+                    valor=valor,
+                    tipo=Transacao.Tipo.SAIDA,
+                    descricao=transferencia["descricao"]
+                    or f"Transferência para conta {agencia_destino}-{conta_destino}",
+                    saldo_resultante=saldos[origem_id],
+                    contraparte_id=destino_id,
+                    transferencia_id=transferencia["pk"],
+                )
+            )
+            transacoes.append(
+                Transacao(
+                    cliente_id=destino_id,
+                    valor=valor,
+                    tipo=Transacao.Tipo.ENTRADA,
+                    descricao=transferencia["descricao"]
+                    or f"Transferência recebida de conta {agencia_origem}-{conta_origem}",
+                    saldo_resultante=saldos[destino_id],
+                    contraparte_id=origem_id,
+                    transferencia_id=transferencia["pk"],
+                )
+            )
+        Transacao.objects.bulk_create(transacoes, batch_size=TAMANHO_LOTE)
+        FluxoCaixa.registrar(
+            (transacao.cliente_id, transacao.tipo, transacao.valor, 0) for transacao in transacoes
+        )
+
+        processada_em = timezone.now()
+        for lote in em_lotes([t["pk"] for t in liquidaveis]):
+            Transferencia.objects.filter(pk__in=lote).update(
+                status=Transferencia.Status.CONCLUIDA, processada_em=processada_em
+            )
+
+        for lote in em_lotes([t["pk"] for t in descobertas]):
+            Transferencia.objects.filter(pk__in=lote).update(
+                status=Transferencia.Status.CANCELADA, processada_em=processada_em
+            )
+
+    resumo = {
+        "liquidadas": len(liquidaveis),
+        "canceladas": len(descobertas),
+        "contas": len(posicoes),
+        "consultas": contador.total,
+    }
+    metricas.incrementar("liquidacao.ciclos")
+    metricas.incrementar("liquidacao.transferencias", resumo["liquidadas"])
+    metricas.incrementar("liquidacao.canceladas", resumo["canceladas"])
+    logger.info(
+        "Liquidação: %(liquidadas)s transferências, %(canceladas)s canceladas, "
+        "%(contas)s contas atualizadas, %(consultas)s consultas.",
+        resumo,
+    )
+    return resumo
+
+
+def liquidar_pendentes(limite=LOTE_LIQUIDACAO_PADRAO):
+    """Compensa até ``limite`` transferências pendentes num único ciclo atômico.
+
+    Cada conta tocada recebe uma só atualização de saldo com sua posição
+    líquida. De contas que não cobrem a própria posição, só as transferências
+    mais recentes que excedem o saldo são canceladas; o restante do lote é
+    concluído.
+    """
+    return executar_com_retentativa(_liquidar, limite, nome="liquidacao")
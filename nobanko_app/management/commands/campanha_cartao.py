@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from nobanko_app.cartoes import emitir_cartoes
+from nobanko_app.elegibilidade import clientes_elegiveis
+from nobanko_app.models import ModeloCartao
+
+
+class Command(BaseCommand):
+    help = "Lista quantos clientes são elegíveis a um modelo de cartão e, opcionalmente, emite os cartões."
+
+    def add_arguments(self, parser):
+        parser.add_argument("modelo", type=int, help="Id do ModeloCartao da campanha.")
+        parser.add_argument("--emitir", action="store_true", help="Emite o cartão para os elegíveis que ainda não o têm.")
+        parser.add_argument("--lote", type=int, default=1000, help="Cartões emitidos por iteração.")
+
+    def handle(self, *args, **options):
+        try:
+            modelo = ModeloCartao.objects.get(pk=options["modelo"])
+        except ModeloCartao.DoesNotExist:
+            raise CommandError(f"Modelo de cartão {options['modelo']} não encontrado.") from None
+        if not modelo.ativo:
+            raise CommandError(f"O modelo {modelo.nome} está inativo.")
+
+        alvo = clientes_elegiveis(modelo).exclude(cartao__modelo=modelo).order_by("pk")
+        if not options["emitir"]:
+            self.stdout.write(f"{alvo.count()} clientes elegíveis ao {modelo.nome} sem este cartão.")
+            return
+
+        emitidos = 0
+        ultimo_pk = 0
+        while True:
+            clientes = list(alvo.filter(pk__gt=ultimo_pk).only("pk", "limite_credito")[:options["lote"]])
+            if not clientes:
+                break
+            ultimo_pk = clientes[-1].pk
+            emitidos += len(
+                emitir_cartoes((cliente, modelo, modelo.limite_para(cliente)) for cliente in clientes)
+            )
+
+        self.stdout.write(f"{emitidos} cartões {modelo.nome} emitidos.")
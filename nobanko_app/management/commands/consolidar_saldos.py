@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from nobanko_app.models import SaldoFracionado
+
+
+class Command(BaseCommand):
+    help = "Consolida as frações de saldo das contas de alto volume na linha de cada cliente."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--intervalo",
+            type=float,
+            default=0,
+            help="Segundos entre consolidações; 0 executa uma única vez.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            totais = SaldoFracionado.consolidar()
+            self.stdout.write(
+                f"{len(totais)} contas consolidadas, {sum(totais.values(), 0):.2f} movidos das frações."
+            )
+
+            if not options["intervalo"]:
+                break
+            time.sleep(options["intervalo"])
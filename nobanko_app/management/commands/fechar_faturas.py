@@ -0,0 +1,26 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from nobanko_app.faturamento import fechar_ciclo
+
+
+class Command(BaseCommand):
+    help = "Gera as faturas dos cartões que fecham no dia; pode ser reexecutado e continua de onde parou."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--data", help="Dia de fechamento (AAAA-MM-DD); padrão: hoje.")
+        parser.add_argument(
+            "--processos", type=int, default=1, help="Processos de trabalho em paralelo (sempre 1 no SQLite)."
+        )
+        parser.add_argument("--lote", type=int, default=None, help="Cartões fechados por transação.")
+
+    def handle(self, *args, **options):
+        try:
+            fechamento = date.fromisoformat(options["data"]) if options["data"] else timezone.localdate()
+        except ValueError:
+            raise CommandError("Data de fechamento inválida; use AAAA-MM-DD.") from None
+
+        criadas, duracao = fechar_ciclo(fechamento, max(1, options["processos"]), options["lote"])
+        self.stdout.write(f"{criadas} faturas geradas para o fechamento de {fechamento:%d/%m/%Y} em {duracao:.2f}s.")
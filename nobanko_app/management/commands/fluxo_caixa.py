@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from nobanko_app.models import FluxoCaixa
+
+
+class Command(BaseCommand):
+    help = "Verifica ou reconstrói os totais de fluxo de caixa a partir das transações."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "acao",
+            choices=["verificar", "reconstruir", "abrir"],
+            help=(
+                "'verificar' compara os totais com o histórico; 'reconstruir' os recalcula; "
+                "'abrir' cria as linhas zeradas de um mês antes da virada."
+            ),
+        )
+        parser.add_argument(
+            "--cliente",
+            type=int,
+            action="append",
+            dest="clientes",
+            help="Restringe a um cliente (pode ser repetido).",
+        )
+        parser.add_argument("--competencia", help="Mês aberto por 'abrir' (AAAA-MM); padrão: o próximo.")
+
+    def handle(self, *args, **options):
+        clientes = options["clientes"]
+
+        if options["acao"] == "abrir":
+            if options["competencia"]:
+                try:
+                    competencia = datetime.strptime(options["competencia"], "%Y-%m").date()
+                except ValueError:
+                    raise CommandError("Competência inválida; use AAAA-MM.") from None
+            else:
+                competencia = (timezone.localdate().replace(day=1) + timedelta(days=32)).replace(day=1)
+            total = FluxoCaixa.abrir_competencia(competencia, clientes)
+            self.stdout.write(
+                self.style.SUCCESS(f"Competência {competencia:%m/%Y} aberta para {total} clientes.")
+            )
+            return
+
+        if options["acao"] == "reconstruir":
+            linhas = FluxoCaixa.reconstruir(clientes)
+            self.stdout.write(self.style.SUCCESS(f"{linhas} linhas de fluxo de caixa reconstruídas."))
+            return
+
+        esperado = FluxoCaixa.calcular_do_historico(clientes)
+        gravado = FluxoCaixa.calcular_gravado(clientes)
+        divergencias = sorted(
+            (chave for chave in esperado.keys() | gravado.keys() if esperado.get(chave) != gravado.get(chave)),
+            key=lambda chave: (chave[0], chave[1] is not None, chave[1]),
+        )
+
+        for cliente_id, competencia in divergencias:
+            periodo = competencia.strftime("%m/%Y") if competencia else "histórico"
+            self.stdout.write(
+                f"Cliente {cliente_id} ({periodo}): esperado {esperado.get((cliente_id, competencia))}, "
+                f"gravado {gravado.get((cliente_id, competencia))}"
+            )
+
+        if divergencias:
+            raise CommandError(f"{len(divergencias)} divergências encontradas.")
+        self.stdout.write(self.style.SUCCESS(f"{len(esperado)} linhas conferidas, nenhuma divergência."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from nobanko_app.models import ChaveIdempotencia
+
+
+class Command(BaseCommand):
+    help = "Remove as chaves de idempotência mais antigas que NOBANKO_IDEMPOTENCIA_TTL_HORAS."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=5000, help="Chaves removidas por iteração.")
+
+    def handle(self, *args, **options):
+        removidas = ChaveIdempotencia.limpar_expiradas(options["lote"])
+        self.stdout.write(f"{removidas} chaves de idempotência removidas.")
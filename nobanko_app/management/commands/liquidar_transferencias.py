@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from nobanko_app.liquidacao import LOTE_LIQUIDACAO_PADRAO, liquidar_pendentes
+
+
+class Command(BaseCommand):
+    help = "Compensa as transferências pendentes e aplica uma atualização de saldo por conta."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lote",
+            type=int,
+            default=LOTE_LIQUIDACAO_PADRAO,
+            help="Máximo de transferências liquidadas por ciclo.",
+        )
+        parser.add_argument(
+            "--intervalo",
+            type=float,
+            default=0,
+            help="Segundos entre ciclos; 0 executa um único ciclo.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            resumo = liquidar_pendentes(options["lote"])
+            self.stdout.write(
+                f"{resumo['liquidadas']} liquidadas, {resumo['canceladas']} canceladas, "
+                f"{resumo['contas']} contas atualizadas ({resumo['consultas']} consultas)."
+            )
+
+            if not options["intervalo"]:
+                break
+            if resumo["liquidadas"] + resumo["canceladas"] < options["lote"]:
+                time.sleep(options["intervalo"])
@@ -0,0 +1,28 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from nobanko_app.faturamento import MarcacaoEmAndamento, marcar_atrasadas
+
+
+class Command(BaseCommand):
+    help = "Marca como atrasadas as faturas pendentes já vencidas e avisa os clientes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--data", help="Dia de referência (AAAA-MM-DD); padrão: hoje.")
+        parser.add_argument("--lote", type=int, default=None, help="Faturas atualizadas por transação.")
+
+    def handle(self, *args, **options):
+        try:
+            hoje = date.fromisoformat(options["data"]) if options["data"] else timezone.localdate()
+        except ValueError:
+            raise CommandError("Data de referência inválida; use AAAA-MM-DD.") from None
+
+        try:
+            faturas, mensagens, duracao = marcar_atrasadas(hoje, options["lote"])
+        except MarcacaoEmAndamento as exc:
+            raise CommandError(str(exc)) from None
+        self.stdout.write(
+            f"{faturas} faturas marcadas como atrasadas e {mensagens} clientes avisados em {duracao:.2f}s."
+        )
@@ -0,0 +1,67 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from nobanko_app.models import Cliente, Usuario
+
+MOTORES = {
+    "db": "django.contrib.sessions.backends.db",
+    "cached_db": "django.contrib.sessions.backends.cached_db",
+    "nobanko": "nobanko_app.sessoes",
+}
+
+
+class Command(BaseCommand):
+    help = "Mede consultas e tempo por requisição autenticada com cada motor de sessão."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requisicoes", type=int, default=50, help="Requisições medidas por motor.")
+        parser.add_argument("--url", default="nobanko_app:cliente", help="Nome da URL requisitada.")
+
+    def handle(self, *args, **options):
+        url = reverse(options["url"])
+        total = options["requisicoes"]
+
+        self.stdout.write(f"{'motor':<10} {'consultas/req':>14} {'sessao/req':>11} {'ms/req':>8}")
+        # Tudo numa transação desfeita no fim: o usuário e as sessões de teste não ficam no banco.
+        with transaction.atomic():
+            usuario = Usuario.objects.create(
+                nome="Benchmark Sessões",
+                email="benchmark-sessoes@nobanko.invalid",
+                senha="!",
+                conta="99999999",
+                agencia="0000",
+            )
+            Cliente.objects.create(usuario=usuario)
+
+            for nome, motor in MOTORES.items():
+                with override_settings(SESSION_ENGINE=motor, ALLOWED_HOSTS=["testserver"]):
+                    consultas, consultas_sessao, segundos = self._medir(usuario, url, total)
+                self.stdout.write(
+                    f"{nome:<10} {consultas / total:>14.2f} {consultas_sessao / total:>11.2f} "
+                    f"{segundos * 1000 / total:>8.2f}"
+                )
+
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def _medir(usuario, url, total):
+        cliente_http = Client()
+        sessao = cliente_http.session
+        sessao["usuario_id"] = usuario.pk
+        sessao["usuario_nome"] = usuario.nome
+        sessao.save()
+        cliente_http.get(url)
+
+        with CaptureQueriesContext(connection) as capturadas:
+            inicio = time.perf_counter()
+            for _ in range(total):
+                cliente_http.get(url)
+            segundos = time.perf_counter() - inicio
+
+        consultas_sessao = sum('"django_session"' in consulta["sql"] for consulta in capturadas)
+        return len(capturadas), consultas_sessao, segundos
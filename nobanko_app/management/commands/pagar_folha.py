@@ -0,0 +1,107 @@
+import csv
+import json
+import re
+from pathlib import Path
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from nobanko_app.models import Cliente
+
+COLUNAS_RELATORIO = ["linha", "agencia", "conta", "valor", "status", "mensagem", "transferencia"]
+
+
+# "1234.56" ou, no formato brasileiro, "1.234,56" / "1234,56". Qualquer outra
+# forma ("1,234.56", "1.5e3") é ambígua demais para uma folha e vira linha inválida.
+VALOR_SIMPLES = re.compile(r"\d+(\.\d{1,2})?")
+VALOR_BRASILEIRO = re.compile(r"(\d{1,3}(\.\d{3})+|\d+)(,\d{1,2})?")
+
+
+def _normalizar_valor(valor):
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        valor = repr(valor)
+    valor = str(valor if valor is not None else "").strip().replace("R$", "").replace(" ", "")
+    if VALOR_SIMPLES.fullmatch(valor):
+        return valor
+    if VALOR_BRASILEIRO.fullmatch(valor):
+        return valor.replace(".", "").replace(",", ".")
+    return None
+
+
+def ler_lancamentos(caminho, formato=None):
+    caminho = Path(caminho)
+    formato = (formato or caminho.suffix.lstrip(".")).lower()
+
+    with caminho.open(encoding="utf-8-sig", newline="") as arquivo:
+        if formato == "json":
+            dados = json.load(arquivo)
+            if isinstance(dados, dict):
+                dados = dados.get("lancamentos", [])
+            linhas = dados
+        elif formato == "csv":
+            amostra = arquivo.read(2048)
+            arquivo.seek(0)
+            try:
+                dialeto = csv.Sniffer().sniff(amostra, delimiters=",;")
+            except csv.Error:
+                dialeto = csv.excel
+            linhas = list(csv.DictReader(arquivo, dialect=dialeto))
+        else:
+            raise CommandError(f"Formato de arquivo não suportado: {formato or caminho.name}.")
+
+    return [
+        {
+            "agencia": linha.get("agencia"),
+            "conta": linha.get("conta"),
+            "valor": _normalizar_valor(linha.get("valor")),
+        }
+        for linha in linhas
+    ]
+
+
+class Command(BaseCommand):
+    help = "Debita a conta pagadora uma única vez e credita todos os lançamentos de uma folha de pagamento."
+
+    def add_arguments(self, parser):
+        parser.add_argument("arquivo", help="Arquivo CSV ou JSON com agencia, conta e valor por linha.")
+        parser.add_argument("--agencia", required=True, help="Agência da conta pagadora.")
+        parser.add_argument("--conta", required=True, help="Conta pagadora.")
+        parser.add_argument("--formato", choices=["csv", "json"], help="Força o formato do arquivo.")
+        parser.add_argument("--descricao", default="", help="Descrição registrada nas transações.")
+        parser.add_argument("--relatorio", help="Grava o relatório por linha neste CSV em vez da saída padrão.")
+
+    def handle(self, *args, **options):
+        pagador = (
+            Cliente.objects.select_related("usuario")
+            .filter(usuario__agencia=options["agencia"], usuario__conta=options["conta"])
+            .first()
+        )
+        if not pagador:
+            raise CommandError("Conta pagadora não encontrada.")
+
+        lancamentos = ler_lancamentos(options["arquivo"], options["formato"])
+
+        try:
+            resultados = pagador.pagar_folha(lancamentos, options["descricao"])
+        except ValidationError as exc:
+            raise CommandError(exc.messages[0]) from exc
+
+        if options["relatorio"]:
+            with open(options["relatorio"], "w", encoding="utf-8", newline="") as saida:
+                self._escrever_relatorio(saida, resultados)
+        else:
+            self._escrever_relatorio(self.stdout, resultados)
+
+        pagos = [resultado for resultado in resultados if resultado["status"] == "ok"]
+        total = sum(resultado["valor"] for resultado in pagos)
+        resumo = f"{len(pagos)} de {len(resultados)} lançamentos pagos, total de {total:.2f}."
+        if len(pagos) == len(resultados):
+            self.stderr.write(self.style.SUCCESS(resumo))
+        else:
+            self.stderr.write(self.style.WARNING(resumo))
+
+    @staticmethod
+    def _escrever_relatorio(saida, resultados):
+        escritor = csv.DictWriter(saida, fieldnames=COLUNAS_RELATORIO, lineterminator="\n")
+        escritor.writeheader()
+        escritor.writerows(resultados)
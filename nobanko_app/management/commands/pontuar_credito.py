@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from nobanko_app import score_credito
+
+
+class Command(BaseCommand):
+    help = "Recalcula o score das solicitações de crédito pendentes a partir do histórico de transações."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=None, help="Solicitações pontuadas por iteração.")
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        pontuadas = score_credito.pontuar_pendentes(options["lote"])
+        motor = "numpy" if score_credito.np is not None else "python"
+        self.stdout.write(
+            f"{pontuadas} solicitações pontuadas em {time.perf_counter() - inicio:.2f}s ({motor})."
+        )
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from nobanko_app import prerender
+
+
+class Command(BaseCommand):
+    help = "Renderiza as páginas institucionais em HTML estático com hash no nome e grava o manifesto."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--destino",
+            help="Diretório de saída (padrão: NOBANKO_PRERENDER_DIR).",
+        )
+
+    def handle(self, *args, **options):
+        manifesto = prerender.gerar(options["destino"])
+        for caminho, pagina in manifesto.items():
+            self.stdout.write(f"{caminho} -> {pagina['arquivo']}")
+        self.stdout.write(self.style.SUCCESS(f"{len(manifesto)} páginas pré-renderizadas."))
@@ -0,0 +1,54 @@
+import threading
+from collections import defaultdict
+
+from django.db import connections, DEFAULT_DB_ALIAS
+
+_lock = threading.Lock()
+_contadores = defaultdict(int)
+
+
+def incrementar(nome, quantidade=1):
+    with _lock:
+        _contadores[nome] += quantidade
+
+
+def registrar_duracao(nome, segundos):
+    with _lock:
+        _contadores[f"{nome}.quantidade"] += 1
+        _contadores[f"{nome}.microssegundos"] += int(segundos * 1_000_000)
+
+
+def obter(nome):
+    with _lock:
+        return _contadores.get(nome, 0)
+
+
+def snapshot():
+    with _lock:
+        return dict(_contadores)
+
+
+def zerar():
+    with _lock:
+        _contadores.clear()
+
+
+class ContadorConsultas:
+    """Conta as consultas SQL executadas numa conexão dentro do bloco."""
+
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        self.connection = connections[using]
+        self.total = 0
+        self._wrapper = None
+
+    def __call__(self, execute, sql, params, many, context):
+        self.total += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._wrapper = self.connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self._wrapper.__exit__(exc_type, exc_value, traceback)
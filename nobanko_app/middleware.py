@@ -0,0 +1,196 @@
+import logging
+import mimetypes
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.middleware.clickjacking import XFrameOptionsMiddleware
+from django.middleware.security import SecurityMiddleware
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.functional import cached_property
+
+from . import estaticos, prerender
+from .models import Cliente, Gerente, Usuario
+
+logger = logging.getLogger(__name__)
+
+
+class SessaoCliente:
+    """Usuário e cliente da sessão, carregados uma vez por requisição.
+
+    A primeira leitura de ``usuario``, ``cliente`` ou ``gerente`` faz uma única
+    consulta (Usuario com LEFT JOIN em Cliente e Gerente); as seguintes usam o
+    resultado guardado.
+    """
+
+    def __init__(self, request):
+        self.usuario_id = request.session.get("usuario_id")
+        self.usuario_nome = request.session.get("usuario_nome")
+
+    @cached_property
+    def usuario(self):
+        if not self.usuario_id:
+            return None
+        return Usuario.objects.select_related("cliente", "gerente").filter(pk=self.usuario_id).first()
+
+    @cached_property
+    def cliente(self):
+        if self.usuario is None:
+            return None
+        try:
+            return self.usuario.cliente
+        except Cliente.DoesNotExist:
+            return None
+
+    @cached_property
+    def gerente(self):
+        if self.usuario is None:
+            return None
+        try:
+            return self.usuario.gerente
+        except Gerente.DoesNotExist:
+            return None
+
+    @property
+    def carregada(self):
+        return "usuario" in self.__dict__
+
+
+def sessao_cliente(request):
+    if not hasattr(request, "sessao_cliente"):
+        request.sessao_cliente = SessaoCliente(request)
+    return request.sessao_cliente
+
+
+class SessaoClienteMiddleware(MiddlewareMixin):
+    def process_request(self, request):
+        sessao_cliente(request)
+
+
+class CabecalhosSeguranca:
+    """Cabeçalhos de ``SecurityMiddleware`` e ``XFrameOptionsMiddleware`` para respostas antecipadas.
+
+    Os middlewares que respondem antes desses dois na pilha passam a resposta
+    por aqui: ``X-Frame-Options``, ``nosniff``, ``Referrer-Policy`` e os demais
+    ``SECURE_*`` continuam valendo conforme as settings.
+    """
+
+    def __init__(self, get_response):
+        self.seguranca = SecurityMiddleware(get_response)
+        self.moldura = XFrameOptionsMiddleware(get_response)
+
+    def exige_redirecionamento(self, request):
+        # Com SECURE_SSL_REDIRECT, quem redireciona é o SecurityMiddleware da pilha.
+        return self.seguranca.process_request(request) is not None
+
+    def aplicar(self, request, resposta):
+        resposta = self.seguranca.process_response(request, resposta)
+        return self.moldura.process_response(request, resposta)
+
+
+class PaginasPrerenderizadasMiddleware(MiddlewareMixin):
+    """Entrega as páginas geradas por ``prerenderizar_paginas`` sem chegar às views.
+
+    Fica no topo de ``MIDDLEWARE`` e só atende GET/HEAD sem cookie de sessão;
+    os cabeçalhos de segurança são aplicados por ``CabecalhosSeguranca``.
+    As páginas ficam em memória; com ``NOBANKO_PRERENDER_X_ACCEL`` a resposta
+    leva só o ``X-Accel-Redirect`` e o proxy entrega o arquivo.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "NOBANKO_PRERENDER_SERVIR", False):
+            raise MiddlewareNotUsed
+
+        super().__init__(get_response)
+        self.cabecalhos = CabecalhosSeguranca(get_response)
+        self.x_accel = getattr(settings, "NOBANKO_PRERENDER_X_ACCEL", "")
+        destino = prerender.diretorio_padrao()
+        self.paginas = {}
+        for caminho, pagina in prerender.carregar_manifesto(destino).items():
+            conteudo = b"" if self.x_accel else (destino / pagina["arquivo"]).read_bytes()
+            self.paginas[caminho] = (pagina, conteudo)
+        if not self.paginas:
+            logger.warning("Nenhuma página pré-renderizada em %s; rode prerenderizar_paginas.", destino)
+            raise MiddlewareNotUsed
+
+    def process_request(self, request):
+        encontrada = self.paginas.get(request.path_info)
+        if (
+            encontrada is None
+            or request.method not in ("GET", "HEAD")
+            or settings.SESSION_COOKIE_NAME in request.COOKIES
+            or self.cabecalhos.exige_redirecionamento(request)
+        ):
+            return None
+
+        pagina, conteudo = encontrada
+        etag = f'"{pagina["hash"]}"'
+        if request.headers.get("If-None-Match") == etag:
+            resposta = HttpResponseNotModified()
+        elif self.x_accel:
+            resposta = HttpResponse(content_type=pagina["content_type"])
+            resposta["X-Accel-Redirect"] = self.x_accel + pagina["arquivo"]
+        else:
+            resposta = HttpResponse(conteudo, content_type=pagina["content_type"])
+        resposta["ETag"] = etag
+        resposta["Vary"] = "Cookie"
+        return self.cabecalhos.aplicar(request, resposta)
+
+
+class EstaticosMiddleware(MiddlewareMixin):
+    """Serve ``STATIC_ROOT`` com as variantes pré-comprimidas do ``collectstatic``.
+
+    Arquivos com hash no nome (listados no manifesto) recebem cache de um ano
+    e ``immutable``; os demais, um ``max-age`` curto. ``Vary: Accept-Encoding``
+    só é enviado quando o arquivo tem variante comprimida.
+    """
+
+    MAX_AGE_IMUTAVEL = 60 * 60 * 24 * 365
+    MAX_AGE_SEM_HASH = 60 * 5
+
+    def __init__(self, get_response):
+        raiz = getattr(settings, "STATIC_ROOT", None)
+        if not raiz or not Path(raiz).is_dir() or not settings.STATIC_URL:
+            raise MiddlewareNotUsed
+
+        super().__init__(get_response)
+        self.cabecalhos = CabecalhosSeguranca(get_response)
+        self.raiz = Path(raiz)
+        self.prefixo = urlsplit(settings.STATIC_URL).path
+        if not self.prefixo.startswith("/"):
+            self.prefixo = "/" + self.prefixo
+        self.arquivos = estaticos.indexar(self.raiz)
+        self.imutaveis = estaticos.nomes_com_hash(self.raiz)
+
+    def process_request(self, request):
+        if request.method not in ("GET", "HEAD") or not request.path_info.startswith(self.prefixo):
+            return None
+
+        nome = request.path_info[len(self.prefixo):]
+        codificacoes = self.arquivos.get(nome)
+        if codificacoes is None or self.cabecalhos.exige_redirecionamento(request):
+            return None
+
+        aceitas = estaticos.codificacoes_aceitas(request.headers.get("Accept-Encoding"))
+        codificacao = next(
+            (codificacao for codificacao in codificacoes if codificacao in aceitas or "*" in aceitas),
+            None,
+        )
+        caminho = self.raiz / nome
+        if codificacao:
+            extensao = dict(estaticos.CODIFICACOES)[codificacao]
+            caminho = caminho.with_name(caminho.name + extensao)
+
+        content_type, _codificacao = mimetypes.guess_type(nome)
+        resposta = FileResponse(caminho.open("rb"), content_type=content_type or "application/octet-stream")
+        if codificacao:
+            resposta["Content-Encoding"] = codificacao
+        if codificacoes:
+            resposta["Vary"] = "Accept-Encoding"
+        if nome in self.imutaveis:
+            resposta["Cache-Control"] = f"public, max-age={self.MAX_AGE_IMUTAVEL}, immutable"
+        else:
+            resposta["Cache-Control"] = f"public, max-age={self.MAX_AGE_SEM_HASH}"
+        return self.cabecalhos.aplicar(request, resposta)
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nobanko_app', '0007_modelocartao_cliente_limite_credito_cartao_modelo_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cliente',
+            name='versao',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nobanko_app', '0008_cliente_versao'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transferencia',
+            name='transacao_destino',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='transferencia_entrada', to='nobanko_app.transacao'),
+        ),
+        migrations.AlterField(
+            model_name='transferencia',
+            name='transacao_origem',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='transferencia_saida', to='nobanko_app.transacao'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nobanko_app', '0009_transferencia_pendente_sem_transacoes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cliente',
+            name='fracoes_saldo',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='SaldoFracionado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('indice', models.PositiveSmallIntegerField()),
+                ('saldo', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saldos_fracionados', to='nobanko_app.cliente')),
+            ],
+            options={
+                'ordering': ['cliente', 'indice'],
+                'constraints': [models.UniqueConstraint(fields=('cliente', 'indice'), name='saldo_fracionado_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nobanko_app', '0010_saldo_fracionado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChaveIdempotencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chave', models.CharField(max_length=64)),
+                ('operacao', models.CharField(choices=[('deposito', 'Depósito'), ('transferencia', 'Transferência')], max_length=20)),
+                ('valor', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('criada_em', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chaves_idempotencia', to='nobanko_app.cliente')),
+                ('transacao', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='nobanko_app.transacao')),
+                ('transferencia', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='nobanko_app.transferencia')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('cliente', 'chave'), name='chave_idempotencia_unica')],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nobanko_app', '0011_chave_idempotencia'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transacao',
+            index=models.Index(fields=['cliente', '-data', '-id'], name='transacao_cliente_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transacao',
+            index=models.Index(fields=['cliente', 'tipo', '-data', '-id'], name='transacao_cliente_tipo_idx'),
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:53
+
+import django.db.models.deletion
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncMonth
+
+
+def preencher_fluxo_caixa(apps, schema_editor):
+    Transacao = apps.get_model('nobanko_app', 'Transacao')
+    FluxoCaixa = apps.get_model('nobanko_app', 'FluxoCaixa')
+
+    totais = {}
+    linhas = (
+        Transacao.objects.annotate(mes=TruncMonth('data'))
+        .order_by()
+        .values('cliente_id', 'mes')
+        .annotate(
+            entradas=Sum('valor', filter=Q(tipo='entrada')),
+            saidas=Sum('valor', filter=Q(tipo='saida')),
+            quantidade=Count('id'),
+        )
+    )
+    for linha in linhas:
+        for competencia in (linha['mes'].date(), None):
+            atual = totais.setdefault((linha['cliente_id'], competencia), [Decimal('0'), Decimal('0'), 0])
+            atual[0] += linha['entradas'] or Decimal('0')
+            atual[1] += linha['saidas'] or Decimal('0')
+            atual[2] += linha['quantidade']
+
+    FluxoCaixa.objects.bulk_create(
+        [
+            FluxoCaixa(
+                cliente_id=cliente_id,
+                competencia=competencia,
+                total_entradas=entradas,
+                total_saidas=saidas,
+                quantidade=quantidade,
+            )
+            for (cliente_id, competencia), (entradas, saidas, quantidade) in totais.items()
+        ],
+        batch_size=250,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nobanko_app', '0012_transacao_indices_extrato'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FluxoCaixa',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('competencia', models.DateField(blank=True, null=True)),
+                ('fracao', models.PositiveSmallIntegerField(default=0)),
+                ('total_entradas', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_saidas', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('quantidade', models.PositiveIntegerField(default=0)),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fluxos_caixa', to='nobanko_app.cliente')),
+            ],
+            options={
+                'ordering': ['cliente', 'competencia', 'fracao'],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('competencia__isnull', False)), fields=('cliente', 'competencia', 'fracao'), name='fluxo_caixa_mensal_unico'), models.UniqueConstraint(condition=models.Q(('competencia__isnull', True)), fields=('cliente', 'fracao'), name='fluxo_caixa_total_unico')],
+            },
+        ),
+        migrations.RunPython(preencher_fluxo_caixa, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:03
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def normalizar_emails(apps, schema_editor):
+    Usuario = apps.get_model('nobanko_app', 'Usuario')
+    por_email = defaultdict(list)
+    for pk, email in Usuario.objects.order_by('pk').values_list('pk', 'email').iterator():
+        por_email[email.strip().lower()].append((pk, email))
+
+    # Contas que só diferem na caixa do e-mail não teriam como entrar pelo
+    # login, que compara em minúsculas; a migração para até que sejam resolvidas.
+    conflitos = {email: contas for email, contas in por_email.items() if len(contas) > 1}
+    if conflitos:
+        linhas = '\n'.join(
+            f"  {email}: usuários {', '.join(str(pk) for pk, _original in contas)}"
+            for email, contas in sorted(conflitos.items())
+        )
+        raise RuntimeError(
+            'E-mails iguais a menos de maiúsculas/minúsculas; una ou altere estas contas '
+            f'antes de migrar:\n{linhas}'
+        )
+
+    for normalizado, [(pk, email)] in por_email.items():
+        if email != normalizado:
+            Usuario.objects.filter(pk=pk).update(email=normalizado)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nobanko_app', '0013_fluxo_caixa'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usuario',
+            name='cpf',
+            field=models.CharField(blank=True, max_length=11, null=True, unique=True),
+        ),
+        migrations.RunPython(normalizar_emails, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nobanko_app', '0014_usuario_cpf_email_normalizado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SequenciaConta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('agencia', models.CharField(max_length=10, unique=True)),
+                ('proximo', models.PositiveBigIntegerField(default=1)),
+            ],
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:07
+
+from django.db import migrations, models
+
+BIN_INICIAL = 650000
+
+
+def atribuir_bins(apps, schema_editor):
+    ModeloCartao = apps.get_model('nobanko_app', 'ModeloCartao')
+    for pk in ModeloCartao.objects.filter(bin__isnull=True).values_list('pk', flat=True):
+        ModeloCartao.objects.filter(pk=pk).update(bin=f"{BIN_INICIAL + pk:06d}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nobanko_app', '0015_sequencia_conta'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SequenciaCartao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('proximo', models.PositiveBigIntegerField(default=1)),
+                ('bin', models.CharField(max_length=6, unique=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='modelocartao',
+            name='bin',
+            field=models.CharField(blank=True, max_length=6, null=True, unique=True),
+        ),
+        migrations.RunPython(atribuir_bins, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nobanko_app', '0016_cartao_bin_sequencia'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pedidocartao',
+            index=models.Index(fields=['gerente', 'status', 'criado_em'], name='pedido_cartao_fila_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='solicitacaocredito',
+            index=models.Index(fields=['gerente', 'status', 'criado_em'], name='credito_fila_gerente_idx'),
+        ),
+    ]
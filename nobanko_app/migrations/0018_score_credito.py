@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nobanko_app', '0017_fila_gerente_indices'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='solicitacaocredito',
+            name='pontuado_em',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='solicitacaocredito',
+            name='score',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:11
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nobanko_app', '0018_score_credito'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cliente',
+            name='limite_credito',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=Decimal('2000.00'), max_digits=12),
+        ),
+    ]
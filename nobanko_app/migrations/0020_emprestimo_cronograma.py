@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nobanko_app', '0019_cliente_limite_credito_indice'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emprestimo',
+            name='sistema',
+            field=models.CharField(choices=[('price', 'Price'), ('sac', 'SAC')], default='price', max_length=10),
+        ),
+        migrations.CreateModel(
+            name='ParcelaEmprestimo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('numero', models.PositiveSmallIntegerField()),
+                ('vencimento', models.DateField()),
+                ('valor', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('juros', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('amortizacao', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('saldo_devedor', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('paga', models.BooleanField(default=False)),
+                ('emprestimo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cronograma', to='nobanko_app.emprestimo')),
+            ],
+            options={
+                'ordering': ['emprestimo', 'numero'],
+                'constraints': [models.UniqueConstraint(fields=('emprestimo', 'numero'), name='parcela_emprestimo_unica')],
+            },
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:14
+
+import django.core.validators
+import django.db.models.deletion
+import django.utils.timezone
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nobanko_app', '0020_emprestimo_cronograma'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CheckpointFechamento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fechamento', models.DateField()),
+                ('inicio', models.PositiveBigIntegerField()),
+                ('fim', models.PositiveBigIntegerField()),
+                ('ultimo_cartao', models.PositiveBigIntegerField(default=0)),
+                ('faturas', models.PositiveIntegerField(default=0)),
+                ('concluido', models.BooleanField(default=False)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CompraCartao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('valor', models.DecimalField(decimal_places=2, max_digits=12, validators=[django.core.validators.MinValueValidator(Decimal('0.01'))])),
+                ('descricao', models.CharField(blank=True, max_length=255)),
+                ('data', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['-data'],
+            },
+        ),
+        migrations.AddField(
+            model_name='cartao',
+            name='dia_fechamento',
+            field=models.PositiveSmallIntegerField(default=10, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(31)]),
+        ),
+        migrations.AddField(
+            model_name='fatura',
+            name='fechamento',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='cartao',
+            index=models.Index(fields=['dia_fechamento', 'id'], name='cartao_fechamento_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='fatura',
+            constraint=models.UniqueConstraint(fields=('cartao', 'fechamento'), name='fatura_ciclo_unica'),
+        ),
+        migrations.AddConstraint(
+            model_name='checkpointfechamento',
+            constraint=models.UniqueConstraint(fields=('fechamento', 'inicio'), name='checkpoint_fechamento_unico'),
+        ),
+        migrations.AddField(
+            model_name='compracartao',
+            name='cartao',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='compras', to='nobanko_app.cartao'),
+        ),
+        migrations.AddField(
+            model_name='compracartao',
+            name='fatura',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='compras', to='nobanko_app.fatura'),
+        ),
+        migrations.AddIndex(
+            model_name='compracartao',
+            index=models.Index(condition=models.Q(('fatura__isnull', True)), fields=['cartao', 'data'], name='compra_em_aberto_idx'),
+        ),
+    ]
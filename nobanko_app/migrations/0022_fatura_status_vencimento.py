@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nobanko_app', '0021_fechamento_faturas'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='fatura',
+            index=models.Index(fields=['status', 'vencimento'], name='fatura_status_vencimento_idx'),
+        ),
+    ]
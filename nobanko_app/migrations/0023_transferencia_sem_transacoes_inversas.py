@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:22
+
+from django.db import migrations
+
+
+def ligar_transacoes(apps, schema_editor):
+    """Garante que toda transação de uma transferência aponte para ela antes de remover o caminho inverso."""
+    Transacao = apps.get_model('nobanko_app', 'Transacao')
+    Transferencia = apps.get_model('nobanko_app', 'Transferencia')
+    pares = Transferencia.objects.values_list('pk', 'transacao_origem_id', 'transacao_destino_id')
+    for pk, origem_id, destino_id in pares.iterator():
+        Transacao.objects.filter(
+            pk__in=[id_ for id_ in (origem_id, destino_id) if id_], transferencia__isnull=True
+        ).update(transferencia_id=pk)
+
+
+def religar_transferencias(apps, schema_editor):
+    Transacao = apps.get_model('nobanko_app', 'Transacao')
+    Transferencia = apps.get_model('nobanko_app', 'Transferencia')
+    campos = {'saida': 'transacao_origem_id', 'entrada': 'transacao_destino_id'}
+    transacoes = Transacao.objects.filter(transferencia__isnull=False).values_list('pk', 'tipo', 'transferencia_id')
+    for pk, tipo, transferencia_id in transacoes.iterator():
+        Transferencia.objects.filter(pk=transferencia_id).update(**{campos[tipo]: pk})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nobanko_app', '0022_fatura_status_vencimento'),
+    ]
+
+    operations = [
+        migrations.RunPython(ligar_transacoes, religar_transferencias),
+        migrations.RemoveField(
+            model_name='transferencia',
+            name='transacao_destino',
+        ),
+        migrations.RemoveField(
+            model_name='transferencia',
+            name='transacao_origem',
+        ),
+    ]
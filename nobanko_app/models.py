@@ -1,24 +1,158 @@
+import logging
 import secrets
+from collections import defaultdict
 from datetime import timedelta
 from decimal import Decimal, InvalidOperation
 
 from django.core.exceptions import ValidationError
-from django.core.validators import MinValueValidator
-from django.db import models, transaction
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.conf import settings
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models import Case, Count, F, Q, Sum, Value, When
+from django.db.models.functions import TruncMonth
 from django.utils import timezone
+from django.utils.functional import cached_property
+
+from . import amortizacao, metricas
+from .concorrencia import (
+    MODO_OTIMISTA,
+    ConflitoConcorrencia,
+    executar_com_retentativa,
+    modo_concorrencia,
+)
+from .metricas import ContadorConsultas
+from .utils import TAMANHO_LOTE, cpf_valido, em_lotes, somente_digitos
+
+logger = logging.getLogger(__name__)
+
+
+def travar_clientes(pks):
+    """Trava as linhas de ``Cliente`` em ordem de pk, quando o banco aceita ``FOR UPDATE``.
+
+    Toda transação que mexe em saldos trava os clientes nesta ordem e só
+    depois as frações de saldo; créditos numa fração vêm sempre depois do
+    último cliente travado. Com isso não há ciclo de espera entre elas.
+    """
+    if not connection.features.has_select_for_update:
+        return
+    for lote in em_lotes(sorted(set(pks))):
+        list(
+            Cliente.objects.select_for_update(of=("self",))
+            .filter(pk__in=lote)
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+
 
 class Usuario(models.Model):
     nome = models.CharField(max_length=100)
+    # Sempre em minúsculas (ver save()), para o login usar o índice único com igualdade exata.
     email = models.EmailField(unique=True)
+    cpf = models.CharField(max_length=11, unique=True, null=True, blank=True)
     senha = models.CharField(max_length=128)
     conta = models.CharField(max_length=20, unique=True)
     agencia = models.CharField(max_length=10)
     data_criacao = models.DateTimeField(auto_now_add=True)
 
+    def save(self, *args, **kwargs):
+        self.email = self.normalizar_email(self.email)
+        self.cpf = somente_digitos(self.cpf) or None
+        super().save(*args, **kwargs)
+
+    @staticmethod
+    def normalizar_email(email):
+        return (email or "").strip().lower()
+
+    @classmethod
+    def filtro_identificador(cls, identificador):
+        """Lookup de login para o identificador informado, num único índice único.
+
+        E-mail quando tem "@"; CPF quando, sem pontuação, sobram 11 dígitos
+        válidos; número da conta quando só há dígitos. ``None`` se não for
+        nenhum deles.
+        """
+        identificador = (identificador or "").strip()
+        if "@" in identificador:
+            return {"email": cls.normalizar_email(identificador)}
+
+        digitos = identificador.replace(".", "").replace("-", "")
+        if not digitos.isdigit():
+            return None
+        if cpf_valido(digitos):
+            return {"cpf": digitos}
+        if digitos == identificador:
+            return {"conta": identificador}
+        return None
+
     def __str__(self):
         return self.nome
 
 
+class SequenciaReservada(models.Model):
+    """Contador por chave (``CAMPO``) do qual se reservam intervalos inteiros."""
+
+    CAMPO = None
+    LIMITE = None
+    MENSAGEM_ESGOTADA = "Numeração esgotada para {chave}."
+
+    proximo = models.PositiveBigIntegerField(default=1)
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def reservar(cls, chave, quantidade):
+        """Reserva ``quantidade`` números e devolve o intervalo ``(inicio, fim)``, fim exclusivo.
+
+        O UPDATE vem antes da leitura: a linha fica travada até o commit e o
+        SELECT seguinte enxerga o próprio incremento em qualquer backend.
+        """
+        filtro = {cls.CAMPO: chave}
+        with transaction.atomic():
+            if not cls.objects.filter(**filtro).update(proximo=F("proximo") + quantidade):
+                try:
+                    with transaction.atomic():
+                        cls.objects.create(**filtro, proximo=1 + quantidade)
+                except IntegrityError:
+                    cls.objects.filter(**filtro).update(proximo=F("proximo") + quantidade)
+                else:
+                    fim = 1 + quantidade
+                    if fim > cls.LIMITE:
+                        raise ValidationError(cls.MENSAGEM_ESGOTADA.format(chave=chave))
+                    return 1, fim
+
+            fim = cls.objects.filter(**filtro).values_list("proximo", flat=True).get()
+            if fim > cls.LIMITE:
+                raise ValidationError(cls.MENSAGEM_ESGOTADA.format(chave=chave))
+            return fim - quantidade, fim
+
+
+class SequenciaConta(SequenciaReservada):
+    """Próximo número sequencial de conta por agência, reservado em blocos."""
+
+    CAMPO = "agencia"
+    LIMITE = 10 ** 7
+    MENSAGEM_ESGOTADA = "Numeração de contas esgotada na agência {chave}."
+
+    agencia = models.CharField(max_length=10, unique=True)
+
+    def __str__(self):
+        return f"Sequência de contas {self.agencia}"
+
+
+class SequenciaCartao(SequenciaReservada):
+    """Próximo número de identificação de cartão por BIN, reservado em blocos."""
+
+    CAMPO = "bin"
+    LIMITE = 10 ** 9
+    MENSAGEM_ESGOTADA = "Numeração de cartões esgotada no BIN {chave}."
+
+    bin = models.CharField(max_length=6, unique=True)
+
+    def __str__(self):
+        return f"Sequência de cartões {self.bin}"
+
+
 class Gerente(models.Model):
     usuario = models.OneToOneField(Usuario, on_delete=models.CASCADE)
     codigo_gerente = models.CharField(max_length=20, unique=True)
@@ -32,12 +166,67 @@ class Cliente(models.Model):
     gerente = models.ForeignKey(Gerente, on_delete=models.SET_NULL, null=True, blank=True)
     saldo = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     colégio = models.CharField(max_length=100, blank=True, null=True)
-    limite_credito = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("2000.00"))
+    limite_credito = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("2000.00"), db_index=True)
+    versao = models.PositiveIntegerField(default=0)
+    fracoes_saldo = models.PositiveSmallIntegerField(default=0)
 
     def __str__(self):
         return f"Cliente {self.usuario.nome}"
 
-    def depositar(self, valor, descricao=""):
+    def save(self, *args, **kwargs):
+        criando = self._state.adding
+        super().save(*args, **kwargs)
+        if criando:
+            FluxoCaixa.abrir_linhas([(self.pk, self.fracoes_saldo)], FluxoCaixa.competencia_de(timezone.now()))
+
+    def saldo_total(self):
+        """Saldo da conta somado às frações de contas de alto volume."""
+        if not self.fracoes_saldo:
+            return self.saldo
+
+        saldo, fracoes = Cliente.objects.filter(pk=self.pk).annotate(
+            fracoes=Sum("saldos_fracionados__saldo")
+        ).values_list("saldo", "fracoes").get()
+        return saldo + (fracoes or Decimal("0"))
+
+    def ativar_saldo_fracionado(self, fracoes=8):
+        """Passa a distribuir os créditos desta conta entre ``fracoes`` linhas de saldo.
+
+        Indicado para contas que recebem uma fração grande de todos os
+        depósitos e transferências, cuja linha única vira gargalo.
+        """
+        if fracoes < 1:
+            raise ValidationError("Informe ao menos uma fração de saldo.")
+
+        with transaction.atomic():
+            # O UPDATE trava o cliente antes de qualquer fração.
+            Cliente.objects.filter(pk=self.pk).update(fracoes_saldo=fracoes)
+            SaldoFracionado.objects.bulk_create(
+                [SaldoFracionado(cliente_id=self.pk, indice=indice) for indice in range(fracoes)],
+                ignore_conflicts=True,
+            )
+            excedentes = SaldoFracionado.objects.filter(cliente_id=self.pk, indice__gte=fracoes)
+            if excedentes.exclude(saldo=0).exists():
+                SaldoFracionado.consolidar([self.pk])
+            excedentes.delete()
+            FluxoCaixa.abrir_linhas([(self.pk, fracoes)], FluxoCaixa.competencia_de(timezone.now()))
+        self.fracoes_saldo = fracoes
+
+    def desativar_saldo_fracionado(self):
+        with transaction.atomic():
+            Cliente.objects.filter(pk=self.pk).update(fracoes_saldo=0)
+            SaldoFracionado.consolidar([self.pk])
+            SaldoFracionado.objects.filter(cliente_id=self.pk).delete()
+        self.fracoes_saldo = 0
+
+    def _creditar_fracao(self, valor_decimal):
+        """Credita uma fração sorteada sem tocar na linha do cliente."""
+        indice = secrets.randbelow(self.fracoes_saldo)
+        return SaldoFracionado.objects.filter(cliente_id=self.pk, indice=indice).update(
+            saldo=F("saldo") + valor_decimal
+        )
+
+    def depositar(self, valor, descricao="", chave_idempotencia=None):
         try:
             valor_decimal = Decimal(valor)
         except (TypeError, ValueError, InvalidOperation):
@@ -50,21 +239,83 @@ class Cliente(models.Model):
 
         descricao = (descricao or "Depósito")[:255]
 
+        return self._executar_idempotente(
+            chave_idempotencia,
+            ChaveIdempotencia.Operacao.DEPOSITO,
+            valor_decimal,
+            self._depositar,
+            valor_decimal,
+            descricao,
+            nome="depositos",
+        )
+
+    def _executar_idempotente(self, chave, operacao, valor_decimal, funcao, *args, nome):
+        """Executa ``funcao`` com retentativa; com ``chave``, repete o resultado original.
+
+        A chave é gravada no início da transação da operação. Uma repetição
+        concorrente esbarra no índice único antes de travar qualquer saldo e
+        devolve o resultado da primeira.
+        """
+        chave = (chave or "").strip()[:64]
+        if not chave:
+            return executar_com_retentativa(funcao, *args, None, nome=nome)
+
+        anterior = ChaveIdempotencia.repetir(self.pk, chave, operacao, valor_decimal)
+        if anterior is not None:
+            return anterior
+
+        try:
+            return executar_com_retentativa(funcao, *args, chave, nome=nome)
+        except IntegrityError:
+            anterior = ChaveIdempotencia.repetir(self.pk, chave, operacao, valor_decimal)
+            if anterior is None:
+                raise
+            return anterior
+
+    def _depositar(self, valor_decimal, descricao, chave_idempotencia):
         with transaction.atomic():
-            cliente = Cliente.objects.select_for_update().get(pk=self.pk)
-            cliente.saldo += valor_decimal
-            cliente.save(update_fields=["saldo"])
+            registro = ChaveIdempotencia.reservar(
+                self.pk, chave_idempotencia, ChaveIdempotencia.Operacao.DEPOSITO, valor_decimal
+            )
+            cliente = self
+            saldo_resultante = None
+            if self.fracoes_saldo and self._creditar_fracao(valor_decimal):
+                saldo_resultante = self.saldo_total()
+
+            if saldo_resultante is None:
+                if modo_concorrencia() == MODO_OTIMISTA:
+                    saldo_resultante = self._creditar_otimista(valor_decimal)
+                else:
+                    cliente = Cliente.objects.select_for_update().get(pk=self.pk)
+                    cliente.saldo += valor_decimal
+                    cliente.versao += 1
+                    cliente.save(update_fields=["saldo", "versao"])
+                    saldo_resultante = cliente.saldo
 
             transacao = Transacao.objects.create(
                 cliente=cliente,
                 valor=valor_decimal,
                 tipo=Transacao.Tipo.ENTRADA,
                 descricao=descricao,
-                saldo_resultante=cliente.saldo,
+                saldo_resultante=saldo_resultante,
             )
 
+            FluxoCaixa.registrar([(self.pk, Transacao.Tipo.ENTRADA, valor_decimal, self.fracoes_saldo)])
+
+            if registro:
+                ChaveIdempotencia.objects.filter(pk=registro.pk).update(transacao=transacao)
+
         return transacao
 
+    def _creditar_otimista(self, valor_decimal):
+        saldo, versao = Cliente.objects.filter(pk=self.pk).values_list("saldo", "versao").get()
+        atualizadas = Cliente.objects.filter(pk=self.pk, versao=versao).update(
+            saldo=F("saldo") + valor_decimal, versao=F("versao") + 1
+        )
+        if not atualizadas:
+            raise ConflitoConcorrencia(f"Cliente {self.pk} alterado durante o depósito.")
+        return saldo + valor_decimal
+
     def solicitar_credito(self, valor, motivo=""):
         if not self.gerente:
             raise ValidationError("Nenhum gerente vinculado ao cliente.")
@@ -121,7 +372,7 @@ class Cliente(models.Model):
             justificativa=justificativa,
         )
 
-    def transferir_para(self, destino, valor, descricao=""):
+    def _validar_transferencia(self, destino, valor):
         if not isinstance(destino, Cliente):
             raise ValidationError("Destino inválido para transferência.")
 
@@ -136,68 +387,702 @@ class Cliente(models.Model):
         if valor_decimal <= 0:
             raise ValidationError("O valor da transferência deve ser maior que zero.")
 
-        valor_decimal = valor_decimal.quantize(Decimal("0.01"))
+        return valor_decimal.quantize(Decimal("0.01"))
+
+    def agendar_transferencia(self, destino, valor, descricao=""):
+        """Registra a transferência como pendente, sem tocar nos saldos.
 
+        O débito e o crédito acontecem na próxima liquidação
+        (``liquidacao.liquidar_pendentes``), que compensa todas as pendências
+        de cada conta numa única atualização de saldo.
+        """
+        valor_decimal = self._validar_transferencia(destino, valor)
         descricao = (descricao or "").strip()
 
-        with transaction.atomic():
-            remetente = Cliente.objects.select_for_update().get(pk=self.pk)
-            destinatario = Cliente.objects.select_for_update().get(pk=destino.pk)
+        return Transferencia.objects.create(
+            origem_id=self.pk,
+            destino_id=destino.pk,
+            valor=valor_decimal,
+            descricao=descricao,
+            status=Transferencia.Status.PENDENTE,
+        )
+
+    def transferir_para(self, destino, valor, descricao="", chave_idempotencia=None):
+        valor_decimal = self._validar_transferencia(destino, valor)
+        descricao = (descricao or "").strip()
 
-            if remetente.saldo < valor_decimal:
+        return self._executar_idempotente(
+            chave_idempotencia,
+            ChaveIdempotencia.Operacao.TRANSFERENCIA,
+            valor_decimal,
+            self._transferir,
+            destino,
+            valor_decimal,
+            descricao,
+            nome="transferencias",
+        )
+
+    def _movimentar_saldos(self, destino, valor_decimal):
+        """Aplica débito e crédito num só UPDATE e devolve saldo, agência e conta por pk.
+
+        No modo pessimista as contas são travadas em ordem de pk, então dois
+        clientes pagando um ao outro ao mesmo tempo não entram em deadlock; sem
+        ``SELECT ... FOR UPDATE`` (SQLite) o próprio UPDATE toma o lock de
+        escrita e os saldos são lidos depois dele. No modo otimista nada é
+        travado: o UPDATE só casa com as versões lidas e qualquer divergência
+        vira ``ConflitoConcorrencia``.
+
+        Um destino com saldo fracionado recebe o crédito numa das frações, sem
+        travar a linha do cliente e só depois de todas as outras travas; uma
+        origem fracionada tem as frações consolidadas antes do débito, já com
+        as contas travadas em ordem de pk (ver ``travar_clientes``).
+        """
+        debito_pk = self.pk
+        credito_fracionado = bool(destino.fracoes_saldo)
+        pks = sorted([self.pk] if credito_fracionado else [self.pk, destino.pk])
+
+        if self.fracoes_saldo:
+            travar_clientes(pks)
+            SaldoFracionado.consolidar([self.pk])
+
+        consulta = Cliente.objects.filter(pk__in=pks).order_by("pk").values_list(
+            "pk", "saldo", "versao", "usuario__agencia", "usuario__conta"
+        )
+        otimista = modo_concorrencia() == MODO_OTIMISTA
+        ler_antes = otimista or connection.features.has_select_for_update
+
+        filtro = Q(pk=debito_pk, saldo__gte=valor_decimal) | Q(pk__in=pks) & ~Q(pk=debito_pk)
+        if ler_antes:
+            if not otimista:
+                consulta = consulta.select_for_update(of=("self",))
+            contas = {pk: [saldo, versao, agencia, conta] for pk, saldo, versao, agencia, conta in consulta}
+            if len(contas) != len(pks) or contas[debito_pk][0] < valor_decimal:
                 raise ValidationError("Saldo insuficiente para realizar a transferência.")
+            if otimista:
+                filtro = Q(pk=debito_pk, saldo__gte=valor_decimal, versao=contas[debito_pk][1])
+                for pk in pks:
+                    if pk != debito_pk:
+                        filtro |= Q(pk=pk, versao=contas[pk][1])
+
+        movimentadas = Cliente.objects.filter(filtro).update(
+            saldo=Case(
+                When(pk=debito_pk, then=F("saldo") - valor_decimal),
+                default=F("saldo") + valor_decimal,
+            ),
+            versao=F("versao") + 1,
+        )
+
+        if movimentadas != len(pks):
+            if otimista:
+                raise ConflitoConcorrencia("Contas alteradas durante a transferência.")
+            raise ValidationError("Saldo insuficiente para realizar a transferência.")
+
+        if not ler_antes:
+            resultado = {pk: (saldo, agencia, conta) for pk, saldo, _versao, agencia, conta in consulta}
+        else:
+            resultado = {
+                pk: (
+                    saldo - valor_decimal if pk == debito_pk else saldo + valor_decimal,
+                    agencia,
+                    conta,
+                )
+                for pk, (saldo, _versao, agencia, conta) in contas.items()
+            }
+
+        if credito_fracionado:
+            if not destino._creditar_fracao(valor_decimal):
+                Cliente.objects.filter(pk=destino.pk).update(
+                    saldo=F("saldo") + valor_decimal, versao=F("versao") + 1
+                )
+            saldo, fracoes, agencia, conta = (
+                Cliente.objects.filter(pk=destino.pk)
+                .annotate(fracoes=Sum("saldos_fracionados__saldo"))
+                .values_list("saldo", "fracoes", "usuario__agencia", "usuario__conta")
+                .get()
+            )
+            resultado[destino.pk] = (saldo + (fracoes or Decimal("0")), agencia, conta)
 
-            remetente.saldo -= valor_decimal
-            destinatario.saldo += valor_decimal
+        return resultado
 
-            remetente.save(update_fields=["saldo"])
-            destinatario.save(update_fields=["saldo"])
+    def _transferir(self, destino, valor_decimal, descricao, chave_idempotencia):
+        with ContadorConsultas() as contador, transaction.atomic():
+            registro = ChaveIdempotencia.reservar(
+                self.pk, chave_idempotencia, ChaveIdempotencia.Operacao.TRANSFERENCIA, valor_decimal
+            )
+            contas = self._movimentar_saldos(destino, valor_decimal)
+            saldo_remetente, agencia_remetente, conta_remetente = contas[self.pk]
+            saldo_destinatario, agencia_destinatario, conta_destinatario = contas[destino.pk]
 
             descricao_saida = descricao or (
-                f"Transferência para conta {destinatario.usuario.agencia}-"
-                f"{destinatario.usuario.conta}"
+                f"Transferência para conta {agencia_destinatario}-{conta_destinatario}"
             )
             descricao_entrada = descricao or (
-                f"Transferência recebida de conta {remetente.usuario.agencia}-"
-                f"{remetente.usuario.conta}"
+                f"Transferência recebida de conta {agencia_remetente}-{conta_remetente}"
             )
 
-            transacao_saida = Transacao.objects.create(
-                cliente=remetente,
+            transferencia = Transferencia.objects.create(
+                origem_id=self.pk,
+                destino_id=destino.pk,
+                valor=valor_decimal,
+                descricao=descricao,
+                status=Transferencia.Status.CONCLUIDA,
+                processada_em=timezone.now(),
+            )
+            transacao_saida = Transacao(
+                cliente_id=self.pk,
                 valor=valor_decimal,
                 tipo=Transacao.Tipo.SAIDA,
                 descricao=descricao_saida,
-                saldo_resultante=remetente.saldo,
-                contraparte=destinatario,
+                saldo_resultante=saldo_remetente,
+                contraparte_id=destino.pk,
+                transferencia=transferencia,
             )
-
-            transacao_entrada = Transacao.objects.create(
-                cliente=destinatario,
+            transacao_entrada = Transacao(
+                cliente_id=destino.pk,
                 valor=valor_decimal,
                 tipo=Transacao.Tipo.ENTRADA,
                 descricao=descricao_entrada,
-                saldo_resultante=destinatario.saldo,
-                contraparte=remetente,
+                saldo_resultante=saldo_destinatario,
+                contraparte_id=self.pk,
+                transferencia=transferencia,
+            )
+            Transacao.objects.bulk_create([transacao_saida, transacao_entrada])
+            transferencia.transacao_origem = transacao_saida
+            transferencia.transacao_destino = transacao_entrada
+            FluxoCaixa.registrar(
+                [
+                    (self.pk, Transacao.Tipo.SAIDA, valor_decimal, self.fracoes_saldo),
+                    (destino.pk, Transacao.Tipo.ENTRADA, valor_decimal, destino.fracoes_saldo),
+                ]
             )
 
-            transferencia = Transferencia.objects.create(
-                origem=remetente,
-                destino=destinatario,
-                valor=valor_decimal,
-                descricao=descricao,
-                status=Transferencia.Status.CONCLUIDA,
-                processada_em=timezone.now(),
-                transacao_origem=transacao_saida,
-                transacao_destino=transacao_entrada,
+            if registro:
+                ChaveIdempotencia.objects.filter(pk=registro.pk).update(transferencia=transferencia)
+
+        transferencia.consultas_executadas = contador.total
+        metricas.incrementar("transferencias.concluidas")
+        metricas.incrementar("transferencias.consultas", contador.total)
+        logger.debug(
+            "Transferência %s concluída com %s consultas.", transferencia.pk, contador.total
+        )
+
+        return transferencia
+
+    def pagar_folha(self, lancamentos, descricao=""):
+        """Paga uma folha: um débito nesta conta e um crédito por lançamento, num só lote.
+
+        ``lancamentos`` é um iterável de mapeamentos com ``agencia``, ``conta`` e
+        ``valor``. Devolve um resultado por linha; linhas inválidas ficam de fora
+        do lote e o restante é pago de forma atômica.
+        """
+        descricao = (descricao or "").strip()[:255]
+        resultados = []
+        validos = []
+
+        for numero, lancamento in enumerate(lancamentos, start=1):
+            resultado = {
+                "linha": numero,
+                "agencia": str(lancamento.get("agencia") or "").strip(),
+                "conta": str(lancamento.get("conta") or "").strip(),
+                "valor": None,
+                "status": "erro",
+                "mensagem": "",
+                "transferencia": None,
+            }
+            resultados.append(resultado)
+
+            try:
+                valor_decimal = Decimal(str(lancamento.get("valor")).strip())
+            except (TypeError, ValueError, InvalidOperation):
+                resultado["mensagem"] = "Informe um valor numérico válido."
+                continue
+
+            if not valor_decimal.is_finite() or valor_decimal <= 0:
+                resultado["mensagem"] = "O valor do pagamento deve ser maior que zero."
+                continue
+
+            resultado["valor"] = valor_decimal.quantize(Decimal("0.01"))
+            validos.append(resultado)
+
+        destinos = {}
+        contas = sorted({resultado["conta"] for resultado in validos})
+        for lote in em_lotes(contas):
+            destinos.update(
+                (conta, (pk, agencia))
+                for pk, conta, agencia in Cliente.objects.filter(usuario__conta__in=lote)
+                .values_list("pk", "usuario__conta", "usuario__agencia")
             )
 
-            transacao_saida.transferencia = transferencia
-            transacao_saida.save(update_fields=["transferencia"])
+        pagaveis = []
+        for resultado in validos:
+            pk, agencia = destinos.get(resultado["conta"], (None, None))
+            if pk is None or agencia.lower() != resultado["agencia"].lower():
+                resultado["mensagem"] = "Conta de destino não encontrada."
+            elif pk == self.pk:
+                resultado["mensagem"] = "Não é possível transferir para a mesma conta."
+            else:
+                resultado["cliente_id"] = pk
+                pagaveis.append(resultado)
+
+        if pagaveis:
+            executar_com_retentativa(self._pagar_folha, pagaveis, descricao, nome="folha")
+
+        for resultado in resultados:
+            resultado.pop("cliente_id", None)
+
+        return resultados
 
-            transacao_entrada.transferencia = transferencia
-            transacao_entrada.save(update_fields=["transferencia"])
+    def _pagar_folha(self, pagaveis, descricao):
+        total = sum(resultado["valor"] for resultado in pagaveis)
+        creditos = defaultdict(Decimal)
+        for resultado in pagaveis:
+            creditos[resultado["cliente_id"]] += resultado["valor"]
+        pks = sorted({self.pk, *creditos})
 
-            return transferencia
+        with ContadorConsultas() as contador, transaction.atomic():
+            travar_clientes(pks)
+
+            if self.fracoes_saldo:
+                SaldoFracionado.consolidar([self.pk])
+
+            debitado = Cliente.objects.filter(pk=self.pk, saldo__gte=total).update(
+                saldo=F("saldo") - total, versao=F("versao") + 1
+            )
+            if not debitado:
+                raise ValidationError("Saldo insuficiente para pagar a folha.")
+
+            for lote in em_lotes(sorted(creditos)):
+                Cliente.objects.filter(pk__in=lote).update(
+                    saldo=Case(
+                        *[When(pk=pk, then=F("saldo") + creditos[pk]) for pk in lote],
+                        default=F("saldo"),
+                    ),
+                    versao=F("versao") + 1,
+                )
+
+            contas = {}
+            for lote in em_lotes(pks):
+                contas.update(
+                    (pk, (saldo, agencia, conta))
+                    for pk, saldo, agencia, conta in Cliente.objects.filter(pk__in=lote)
+                    .values_list("pk", "saldo", "usuario__agencia", "usuario__conta")
+                )
+
+            saldo_pagador, agencia_pagador, conta_pagador = contas[self.pk]
+            saldo_pagador += total
+            saldos_correntes = {pk: contas[pk][0] - valor for pk, valor in creditos.items()}
+
+            transacoes = []
+            for resultado in pagaveis:
+                pk = resultado["cliente_id"]
+                saldo_pagador -= resultado["valor"]
+                saldos_correntes[pk] += resultado["valor"]
+                transacoes.append(
+                    Transacao(
+                        cliente_id=self.pk,
+                        valor=resultado["valor"],
+                        tipo=Transacao.Tipo.SAIDA,
+                        descricao=descricao or (
+                            f"Folha de pagamento para conta {resultado['agencia']}-{resultado['conta']}"
+                        ),
+                        saldo_resultante=saldo_pagador,
+                        contraparte_id=pk,
+                    )
+                )
+                transacoes.append(
+                    Transacao(
+                        cliente_id=pk,
+                        valor=resultado["valor"],
+                        tipo=Transacao.Tipo.ENTRADA,
+                        descricao=descricao or (
+                            f"Folha de pagamento recebida de conta {agencia_pagador}-{conta_pagador}"
+                        ),
+                        saldo_resultante=saldos_correntes[pk],
+                        contraparte_id=self.pk,
+                    )
+                )
+            processada_em = timezone.now()
+            transferencias = [
+                Transferencia(
+                    origem_id=self.pk,
+                    destino_id=resultado["cliente_id"],
+                    valor=resultado["valor"],
+                    descricao=descricao,
+                    status=Transferencia.Status.CONCLUIDA,
+                    processada_em=processada_em,
+                )
+                for resultado in pagaveis
+            ]
+            Transferencia.objects.bulk_create(transferencias, batch_size=TAMANHO_LOTE)
+
+            for transferencia, saida, entrada in zip(transferencias, transacoes[::2], transacoes[1::2]):
+                saida.transferencia = transferencia
+                entrada.transferencia = transferencia
+                transferencia.transacao_origem = saida
+                transferencia.transacao_destino = entrada
+            Transacao.objects.bulk_create(transacoes, batch_size=TAMANHO_LOTE)
+            FluxoCaixa.registrar(
+                (transacao.cliente_id, transacao.tipo, transacao.valor, 0) for transacao in transacoes
+            )
+
+        for resultado, transferencia in zip(pagaveis, transferencias):
+            resultado["status"] = "ok"
+            resultado["transferencia"] = transferencia.pk
+
+        metricas.incrementar("folha.lancamentos", len(pagaveis))
+        metricas.incrementar("folha.consultas", contador.total)
+        logger.info(
+            "Folha do cliente %s: %s lançamentos pagos com %s consultas.",
+            self.pk,
+            len(pagaveis),
+            contador.total,
+        )
+
+        return transferencias
+
+
+class SaldoFracionado(models.Model):
+    cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE, related_name='saldos_fracionados')
+    indice = models.PositiveSmallIntegerField()
+    saldo = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['cliente', 'indice']
+        constraints = [
+            models.UniqueConstraint(fields=['cliente', 'indice'], name='saldo_fracionado_unico'),
+        ]
+
+    @classmethod
+    def consolidar(cls, cliente_pks=None):
+        """Move o saldo das frações para a linha do cliente e devolve o valor movido por cliente.
+
+        As linhas de ``Cliente`` são travadas antes das frações, na mesma ordem
+        das transferências; quem chama e também debita ou credita outras
+        contas deve travá-las todas antes (``travar_clientes``). As frações são decrementadas pelo valor lido em vez
+        de zeradas, então créditos concorrentes nunca se perdem.
+        """
+        with transaction.atomic():
+            fracoes = cls.objects.exclude(saldo=0).order_by("pk")
+            if cliente_pks is not None:
+                fracoes = fracoes.filter(cliente_id__in=cliente_pks)
+
+            if connection.features.has_select_for_update:
+                pks = cliente_pks
+                if pks is None:
+                    pks = fracoes.values_list("cliente_id", flat=True).distinct()
+                travar_clientes(pks)
+                fracoes = fracoes.select_for_update()
+
+            lidas = list(fracoes.values_list("pk", "cliente_id", "saldo"))
+            totais = defaultdict(Decimal)
+            for _pk, cliente_id, saldo in lidas:
+                totais[cliente_id] += saldo
+
+            for lote in em_lotes(sorted(totais)):
+                Cliente.objects.filter(pk__in=lote).update(
+                    saldo=Case(
+                        *[When(pk=pk, then=F("saldo") + totais[pk]) for pk in lote],
+                        default=F("saldo"),
+                    ),
+                    versao=F("versao") + 1,
+                )
+
+            for lote in em_lotes(lidas):
+                cls.objects.filter(pk__in=[pk for pk, _cliente_id, _saldo in lote]).update(
+                    saldo=Case(
+                        *[When(pk=pk, then=F("saldo") - saldo) for pk, _cliente_id, saldo in lote],
+                        default=F("saldo"),
+                    )
+                )
+
+        return dict(totais)
+
+    def __str__(self):
+        return f"Fração {self.indice} de {self.cliente}"
+
+
+class FluxoCaixa(models.Model):
+    """Totais de entradas e saídas por cliente, mantidos na mesma transação dos movimentos.
+
+    Linhas com ``competencia`` vazia acumulam o histórico completo; as demais,
+    o mês iniciado em ``competencia``. Contas com saldo fracionado espalham os
+    incrementos por ``fracao`` pelo mesmo motivo das frações de saldo.
+    """
+
+    cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE, related_name='fluxos_caixa')
+    competencia = models.DateField(null=True, blank=True)
+    fracao = models.PositiveSmallIntegerField(default=0)
+    total_entradas = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_saidas = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    quantidade = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['cliente', 'competencia', 'fracao']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['cliente', 'competencia', 'fracao'],
+                condition=Q(competencia__isnull=False),
+                name='fluxo_caixa_mensal_unico',
+            ),
+            models.UniqueConstraint(
+                fields=['cliente', 'fracao'],
+                condition=Q(competencia__isnull=True),
+                name='fluxo_caixa_total_unico',
+            ),
+        ]
+
+    @staticmethod
+    def competencia_de(momento):
+        return timezone.localdate(momento).replace(day=1)
+
+    @classmethod
+    def registrar(cls, movimentos, momento=None):
+        """Soma ``(cliente_id, tipo, valor, fracoes_saldo)`` às linhas do mês e do histórico.
+
+        O caso comum é um único UPDATE por lote de clientes: as linhas nascem
+        com o cliente e cada mês é aberto de antemão (``abrir_competencia``).
+        Linhas que ainda faltem são criadas num savepoint e, se outra transação
+        as criou antes, recebem o incremento por UPDATE.
+        """
+        competencia = cls.competencia_de(momento or timezone.now())
+        incrementos = {}
+        fracoes = {}
+        for cliente_id, tipo, valor, fracoes_saldo in movimentos:
+            if cliente_id not in fracoes:
+                fracoes[cliente_id] = secrets.randbelow(fracoes_saldo) if fracoes_saldo else 0
+            chave = (cliente_id, fracoes[cliente_id])
+            entradas, saidas, quantidade = incrementos.get(chave, (Decimal("0"), Decimal("0"), 0))
+            if tipo == Transacao.Tipo.ENTRADA:
+                entradas += valor
+            else:
+                saidas += valor
+            incrementos[chave] = (entradas, saidas, quantidade + 1)
+
+        for lote in em_lotes(sorted(incrementos), 100):
+            cls._incrementar({chave: incrementos[chave] for chave in lote}, competencia)
+
+    @classmethod
+    def abrir_linhas(cls, clientes, competencia):
+        """Cria zeradas as linhas do mês e do histórico de ``(cliente_id, fracoes_saldo)`` que faltam."""
+        cls.objects.bulk_create(
+            [
+                cls(cliente_id=cliente_id, fracao=fracao, competencia=periodo)
+                for cliente_id, fracoes_saldo in clientes
+                for fracao in range(fracoes_saldo or 1)
+                for periodo in (competencia, None)
+            ],
+            batch_size=TAMANHO_LOTE,
+            ignore_conflicts=True,
+        )
+
+    @classmethod
+    def abrir_competencia(cls, competencia, cliente_pks=None):
+        """Abre o mês ``competencia`` para todos os clientes; devolve quantos foram percorridos.
+
+        Rodado antes da virada do mês, tira das transações o INSERT da primeira
+        movimentação de cada cliente: com as linhas prontas, ``registrar`` é um
+        único UPDATE. Linhas já existentes não são tocadas.
+        """
+        clientes = Cliente.objects.order_by("pk")
+        if cliente_pks is not None:
+            clientes = clientes.filter(pk__in=cliente_pks)
+
+        total = 0
+        ultimo_pk = 0
+        while True:
+            lote = list(clientes.filter(pk__gt=ultimo_pk).values_list("pk", "fracoes_saldo")[:TAMANHO_LOTE])
+            if not lote:
+                break
+            cls.abrir_linhas(lote, competencia)
+            total += len(lote)
+            ultimo_pk = lote[-1][0]
+        return total
+
+    @classmethod
+    def _filtro(cls, chaves, competencia):
+        filtro = Q()
+        for cliente_id, fracao in chaves:
+            filtro |= Q(cliente_id=cliente_id, fracao=fracao) & (
+                Q(competencia=competencia) | Q(competencia__isnull=True)
+            )
+        return filtro
+
+    @classmethod
+    def _aplicar(cls, incrementos, filtro):
+        def _campo(nome, posicao):
+            campo = cls._meta.get_field(nome)
+            return Case(
+                *[
+                    When(
+                        cliente_id=cliente_id,
+                        fracao=fracao,
+                        then=F(nome) + Value(valores[posicao], output_field=campo),
+                    )
+                    for (cliente_id, fracao), valores in incrementos.items()
+                ],
+                default=F(nome),
+            )
+
+        return cls.objects.filter(filtro).update(
+            total_entradas=_campo("total_entradas", 0),
+            total_saidas=_campo("total_saidas", 1),
+            quantidade=_campo("quantidade", 2),
+        )
+
+    @classmethod
+    def _existentes(cls, filtro):
+        return set(cls.objects.filter(filtro).values_list("cliente_id", "fracao", "competencia"))
+
+    @staticmethod
+    def _filtro_linhas(linhas):
+        filtro = Q()
+        for cliente_id, fracao, periodo in linhas:
+            filtro |= Q(cliente_id=cliente_id, fracao=fracao, competencia=periodo)
+        return filtro
+
+    @classmethod
+    def _incrementar(cls, incrementos, competencia):
+        filtro = cls._filtro(incrementos, competencia)
+        atualizadas = cls._aplicar(incrementos, filtro)
+        if atualizadas == 2 * len(incrementos):
+            return
+
+        existentes = cls._existentes(filtro)
+        if len(existentes) != atualizadas:
+            # Outra transação criou linhas entre o UPDATE e a leitura: não há
+            # como saber quais receberam o incremento, então a operação recomeça.
+            raise ConflitoConcorrencia("Fluxo de caixa alterado durante o registro.")
+
+        ausentes = {
+            (cliente_id, fracao, periodo)
+            for cliente_id, fracao in incrementos
+            for periodo in (competencia, None)
+        } - existentes
+
+        # Cada conflito no INSERT significa que outra transação criou parte das
+        # linhas: essas recebem o incremento por UPDATE e o resto é inserido de novo.
+        while ausentes:
+            linhas = sorted(ausentes, key=lambda linha: (linha[0], linha[1], linha[2] is None))
+            try:
+                with transaction.atomic():
+                    cls.objects.bulk_create(
+                        [
+                            cls(
+                                cliente_id=cliente_id,
+                                fracao=fracao,
+                                competencia=periodo,
+                                total_entradas=incrementos[(cliente_id, fracao)][0],
+                                total_saidas=incrementos[(cliente_id, fracao)][1],
+                                quantidade=incrementos[(cliente_id, fracao)][2],
+                            )
+                            for cliente_id, fracao, periodo in linhas
+                        ]
+                    )
+                return
+            except IntegrityError:
+                criadas = cls._existentes(cls._filtro_linhas(ausentes))
+                if not criadas:
+                    raise
+                if cls._aplicar(incrementos, cls._filtro_linhas(criadas)) != len(criadas):
+                    raise ConflitoConcorrencia("Fluxo de caixa alterado durante o registro.") from None
+                ausentes -= criadas
+
+    @classmethod
+    def totais(cls, cliente_pk, competencia=None):
+        linhas = cls.objects.filter(cliente_id=cliente_pk)
+        if competencia is None:
+            linhas = linhas.filter(competencia__isnull=True)
+        else:
+            linhas = linhas.filter(competencia=competencia)
+        totais = linhas.aggregate(
+            total_entradas=Sum("total_entradas"),
+            total_saidas=Sum("total_saidas"),
+            quantidade=Sum("quantidade"),
+        )
+        return {chave: valor or 0 for chave, valor in totais.items()}
+
+    @classmethod
+    def calcular_do_historico(cls, cliente_pks=None):
+        """Recalcula os totais a partir de ``Transacao``: {(cliente_id, competencia): (entradas, saidas, quantidade)}."""
+        transacoes = Transacao.objects.all()
+        if cliente_pks is not None:
+            transacoes = transacoes.filter(cliente_id__in=cliente_pks)
+
+        resultado = {}
+        linhas = (
+            transacoes.annotate(mes=TruncMonth("data"))
+            .order_by()
+            .values("cliente_id", "mes")
+            .annotate(
+                entradas=Sum("valor", filter=Q(tipo=Transacao.Tipo.ENTRADA)),
+                saidas=Sum("valor", filter=Q(tipo=Transacao.Tipo.SAIDA)),
+                quantidade=Count("id"),
+            )
+        )
+        for linha in linhas:
+            entradas = linha["entradas"] or Decimal("0")
+            saidas = linha["saidas"] or Decimal("0")
+            for periodo in (cls.competencia_de(linha["mes"]), None):
+                atual = resultado.get((linha["cliente_id"], periodo), (Decimal("0"), Decimal("0"), 0))
+                resultado[(linha["cliente_id"], periodo)] = (
+                    atual[0] + entradas,
+                    atual[1] + saidas,
+                    atual[2] + linha["quantidade"],
+                )
+        return resultado
+
+    @classmethod
+    def calcular_gravado(cls, cliente_pks=None):
+        # Linhas abertas de antemão e ainda sem movimento não entram na comparação.
+        linhas = cls.objects.filter(quantidade__gt=0)
+        if cliente_pks is not None:
+            linhas = linhas.filter(cliente_id__in=cliente_pks)
+
+        return {
+            (linha["cliente_id"], linha["competencia"]): (
+                linha["entradas"], linha["saidas"], linha["quantidade"]
+            )
+            for linha in linhas.order_by().values("cliente_id", "competencia").annotate(
+                entradas=Sum("total_entradas"),
+                saidas=Sum("total_saidas"),
+                quantidade=Sum("quantidade"),
+            )
+        }
+
+    @classmethod
+    def reconstruir(cls, cliente_pks=None):
+        """Apaga e recria as linhas a partir do histórico, travando-as durante o cálculo.
+
+        O DELETE vem antes da leitura do histórico: ele trava as linhas (no
+        SQLite, o banco inteiro para escrita), então um ``registrar``
+        concorrente ou já terminou e aparece no histórico, ou espera e soma
+        o seu movimento às linhas recriadas.
+        """
+        with transaction.atomic():
+            linhas = cls.objects.all()
+            if cliente_pks is not None:
+                linhas = linhas.filter(cliente_id__in=cliente_pks)
+            linhas.delete()
+            esperado = cls.calcular_do_historico(cliente_pks)
+            cls.objects.bulk_create(
+                [
+                    cls(
+                        cliente_id=cliente_id,
+                        competencia=competencia,
+                        total_entradas=entradas,
+                        total_saidas=saidas,
+                        quantidade=quantidade,
+                    )
+                    for (cliente_id, competencia), (entradas, saidas, quantidade) in esperado.items()
+                ],
+                batch_size=TAMANHO_LOTE,
+            )
+            cls.abrir_competencia(cls.competencia_de(timezone.now()), cliente_pks)
+        return len(esperado)
+
+    def __str__(self):
+        periodo = self.competencia.strftime("%m/%Y") if self.competencia else "histórico"
+        return f"Fluxo de caixa {periodo} - cliente {self.cliente_id}"
 
 
 class Cartao(models.Model):
@@ -207,6 +1092,23 @@ class Cartao(models.Model):
     validade = models.DateField()
     codigo_seguranca = models.CharField(max_length=4)
     limite = models.DecimalField(max_digits=12, decimal_places=2)
+    dia_fechamento = models.PositiveSmallIntegerField(
+        default=10, validators=[MinValueValidator(1), MaxValueValidator(31)]
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['dia_fechamento', 'id'], name='cartao_fechamento_idx'),
+        ]
+
+    def registrar_compra(self, valor, descricao=""):
+        try:
+            valor_decimal = Decimal(valor).quantize(Decimal("0.01"))
+        except (TypeError, ValueError, InvalidOperation):
+            raise ValidationError("Informe um valor numérico válido.")
+        if valor_decimal <= 0:
+            raise ValidationError("O valor da compra deve ser maior que zero.")
+        return CompraCartao.objects.create(cartao=self, valor=valor_decimal, descricao=(descricao or "").strip())
 
     def __str__(self):
         sufixo = self.numero[-4:] if self.numero else "????"
@@ -215,16 +1117,56 @@ class Cartao(models.Model):
 
 
 class ModeloCartao(models.Model):
+    BIN_INICIAL = 650000
+
     nome = models.CharField(max_length=80, unique=True)
     descricao = models.TextField(blank=True)
     limite_minimo = models.DecimalField(max_digits=12, decimal_places=2, validators=[MinValueValidator(Decimal('0.00'))])
     limite_maximo = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    bin = models.CharField(max_length=6, unique=True, null=True, blank=True)
     ativo = models.BooleanField(default=True)
     criado_em = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['limite_minimo', 'nome']
 
+    @classmethod
+    def bin_padrao(cls, pk):
+        bin_ = cls.BIN_INICIAL + pk
+        if bin_ >= 10 ** 6:
+            raise ValidationError("Não há BIN livre para o modelo de cartão.")
+        return f"{bin_:06d}"
+
+    def save(self, *args, **kwargs):
+        if self.bin:
+            self.bin = somente_digitos(self.bin)
+            if len(self.bin) != 6:
+                raise ValidationError("O BIN deve ter 6 dígitos.")
+        super().save(*args, **kwargs)
+        if not self.bin:
+            # O BIN derivado da pk só existe depois do INSERT.
+            self.bin = self.bin_padrao(self.pk)
+            ModeloCartao.objects.filter(pk=self.pk).update(bin=self.bin)
+        self._invalidar_catalogo()
+
+    def delete(self, *args, **kwargs):
+        resultado = super().delete(*args, **kwargs)
+        self._invalidar_catalogo()
+        return resultado
+
+    @staticmethod
+    def _invalidar_catalogo():
+        # Os outros processos percebem a mudança quando o catálogo deles expira.
+        from .elegibilidade import invalidar_catalogo
+
+        invalidar_catalogo()
+
+    def limite_para(self, cliente):
+        limite = cliente.limite_credito
+        if self.limite_maximo is not None:
+            limite = min(limite, self.limite_maximo)
+        return limite
+
     def __str__(self):
         return self.nome
 
@@ -233,16 +1175,63 @@ class Fatura(models.Model):
     cartao = models.ForeignKey(Cartao, on_delete=models.CASCADE)
     valor_total = models.DecimalField(max_digits=12, decimal_places=2)
     vencimento = models.DateField()
+    fechamento = models.DateField(null=True, blank=True)
     status = models.CharField(max_length=20, choices=[
         ('pendente', 'Pendente'),
         ('pago', 'Pago'),
         ('atrasado', 'Atrasado')
     ])
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cartao', 'fechamento'], name='fatura_ciclo_unica'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'vencimento'], name='fatura_status_vencimento_idx'),
+        ]
+
     def __str__(self):
         return f"Fatura {self.id} - {self.cartao.cliente.usuario.nome}"
 
 
+class CompraCartao(models.Model):
+    cartao = models.ForeignKey(Cartao, on_delete=models.CASCADE, related_name='compras')
+    valor = models.DecimalField(max_digits=12, decimal_places=2, validators=[MinValueValidator(Decimal('0.01'))])
+    descricao = models.CharField(max_length=255, blank=True)
+    data = models.DateTimeField(default=timezone.now)
+    fatura = models.ForeignKey(Fatura, on_delete=models.SET_NULL, null=True, blank=True, related_name='compras')
+
+    class Meta:
+        ordering = ['-data']
+        indexes = [
+            # Compras ainda sem fatura, por cartão: o que o fechamento soma.
+            models.Index(fields=['cartao', 'data'], condition=Q(fatura__isnull=True), name='compra_em_aberto_idx'),
+        ]
+
+    def __str__(self):
+        return f"Compra de {self.valor} no cartão {self.cartao_id}"
+
+
+class CheckpointFechamento(models.Model):
+    """Progresso de uma faixa de ids de cartão no fechamento de um dia."""
+
+    fechamento = models.DateField()
+    inicio = models.PositiveBigIntegerField()
+    fim = models.PositiveBigIntegerField()
+    ultimo_cartao = models.PositiveBigIntegerField(default=0)
+    faturas = models.PositiveIntegerField(default=0)
+    concluido = models.BooleanField(default=False)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['fechamento', 'inicio'], name='checkpoint_fechamento_unico'),
+        ]
+
+    def __str__(self):
+        return f"Fechamento {self.fechamento} [{self.inicio}, {self.fim})"
+
+
 class Solicitacao(models.Model):
     cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE)
     tipo = models.CharField(max_length=50)  # ex: "aumento de limite", "cartão adicional"
@@ -254,17 +1243,76 @@ class Solicitacao(models.Model):
 
 
 class Emprestimo(models.Model):
+    class Sistema(models.TextChoices):
+        PRICE = amortizacao.PRICE, 'Price'
+        SAC = amortizacao.SAC, 'SAC'
+
     cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE)
     valor = models.DecimalField(max_digits=12, decimal_places=2)
-    taxa_juros = models.FloatField()
+    taxa_juros = models.FloatField()  # % ao mês
     parcelas = models.IntegerField()
     data_inicio = models.DateField()
     status = models.CharField(max_length=20, default='ativo')
+    sistema = models.CharField(max_length=10, choices=Sistema.choices, default=Sistema.PRICE)
+
+    @classmethod
+    def contratar(cls, cliente, valor, taxa_juros, parcelas, sistema=Sistema.PRICE, data_inicio=None):
+        valor, taxa, parcelas, sistema = amortizacao.normalizar(valor, taxa_juros, parcelas, sistema)
+        with transaction.atomic():
+            emprestimo = cls.objects.create(
+                cliente=cliente,
+                valor=valor,
+                taxa_juros=float(taxa),
+                parcelas=parcelas,
+                sistema=sistema,
+                data_inicio=data_inicio or timezone.localdate(),
+            )
+            emprestimo.gerar_cronograma()
+        return emprestimo
+
+    def gerar_cronograma(self):
+        """Grava as parcelas do contrato de uma vez; vencimentos mensais a partir de ``data_inicio``."""
+        simulacao = amortizacao.simular(self.valor, self.taxa_juros, self.parcelas, self.sistema)
+        return ParcelaEmprestimo.objects.bulk_create(
+            [
+                ParcelaEmprestimo(
+                    emprestimo=self,
+                    numero=parcela.numero,
+                    vencimento=amortizacao.somar_meses(self.data_inicio, parcela.numero),
+                    valor=parcela.valor,
+                    juros=parcela.juros,
+                    amortizacao=parcela.amortizacao,
+                    saldo_devedor=parcela.saldo,
+                )
+                for parcela in simulacao.cronograma
+            ],
+            batch_size=TAMANHO_LOTE,
+        )
 
     def __str__(self):
         return f"Empréstimo {self.id} - {self.cliente.usuario.nome}"
 
 
+class ParcelaEmprestimo(models.Model):
+    emprestimo = models.ForeignKey(Emprestimo, on_delete=models.CASCADE, related_name='cronograma')
+    numero = models.PositiveSmallIntegerField()
+    vencimento = models.DateField()
+    valor = models.DecimalField(max_digits=12, decimal_places=2)
+    juros = models.DecimalField(max_digits=12, decimal_places=2)
+    amortizacao = models.DecimalField(max_digits=12, decimal_places=2)
+    saldo_devedor = models.DecimalField(max_digits=12, decimal_places=2)
+    paga = models.BooleanField(default=False)
+
+    class Meta:
+        ordering = ['emprestimo', 'numero']
+        constraints = [
+            models.UniqueConstraint(fields=['emprestimo', 'numero'], name='parcela_emprestimo_unica'),
+        ]
+
+    def __str__(self):
+        return f"Parcela {self.numero}/{self.emprestimo.parcelas} do empréstimo {self.emprestimo_id}"
+
+
 class Transacao(models.Model):
     class Tipo(models.TextChoices):
         ENTRADA = 'entrada', 'Entrada'
@@ -297,6 +1345,10 @@ class Transacao(models.Model):
 
     class Meta:
         ordering = ['-data']
+        indexes = [
+            models.Index(fields=['cliente', '-data', '-id'], name='transacao_cliente_data_idx'),
+            models.Index(fields=['cliente', 'tipo', '-data', '-id'], name='transacao_cliente_tipo_idx'),
+        ]
 
     def __str__(self):
         sinal = '+' if self.tipo == self.Tipo.ENTRADA else '-'
@@ -328,20 +1380,23 @@ class Transferencia(models.Model):
     status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDENTE)
     criada_em = models.DateTimeField(auto_now_add=True)
     processada_em = models.DateTimeField(null=True, blank=True)
-    transacao_origem = models.OneToOneField(
-        'Transacao',
-        on_delete=models.PROTECT,
-        related_name='transferencia_saida'
-    )
-    transacao_destino = models.OneToOneField(
-        'Transacao',
-        on_delete=models.PROTECT,
-        related_name='transferencia_entrada'
-    )
 
     class Meta:
         ordering = ['-criada_em']
 
+    # As transações apontam para a transferência (``Transacao.transferencia``);
+    # guardar também o caminho inverso exigiria um UPDATE depois de cada inserção.
+    def _transacao(self, tipo):
+        return next((transacao for transacao in self.transacoes.all() if transacao.tipo == tipo), None)
+
+    @cached_property
+    def transacao_origem(self):
+        return self._transacao(Transacao.Tipo.SAIDA)
+
+    @cached_property
+    def transacao_destino(self):
+        return self._transacao(Transacao.Tipo.ENTRADA)
+
     def concluir(self):
         self.status = self.Status.CONCLUIDA
         self.processada_em = timezone.now()
@@ -354,6 +1409,76 @@ class Transferencia(models.Model):
         )
 
 
+class ChaveIdempotencia(models.Model):
+    class Operacao(models.TextChoices):
+        DEPOSITO = 'deposito', 'Depósito'
+        TRANSFERENCIA = 'transferencia', 'Transferência'
+
+    cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE, related_name='chaves_idempotencia')
+    chave = models.CharField(max_length=64)
+    operacao = models.CharField(max_length=20, choices=Operacao.choices)
+    valor = models.DecimalField(max_digits=12, decimal_places=2)
+    transacao = models.ForeignKey(Transacao, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    transferencia = models.ForeignKey(Transferencia, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    criada_em = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cliente', 'chave'], name='chave_idempotencia_unica'),
+        ]
+
+    @staticmethod
+    def validade():
+        return timedelta(hours=getattr(settings, "NOBANKO_IDEMPOTENCIA_TTL_HORAS", 24))
+
+    @classmethod
+    def reservar(cls, cliente_pk, chave, operacao, valor):
+        if not chave:
+            return None
+        return cls.objects.create(cliente_id=cliente_pk, chave=chave, operacao=operacao, valor=valor)
+
+    @classmethod
+    def repetir(cls, cliente_pk, chave, operacao, valor):
+        """Resultado já gravado para a chave, ou ``None`` se ela ainda não foi usada."""
+        registro = (
+            cls.objects.select_related("transacao", "transferencia")
+            .filter(cliente_id=cliente_pk, chave=chave)
+            .first()
+        )
+        if registro is None:
+            return None
+
+        if registro.criada_em < timezone.now() - cls.validade():
+            registro.delete()
+            return None
+
+        if registro.operacao != operacao or registro.valor != valor:
+            raise ValidationError("Chave de idempotência já utilizada em outra operação.")
+
+        resultado = (
+            registro.transacao if operacao == cls.Operacao.DEPOSITO else registro.transferencia
+        )
+        if resultado is None:
+            raise ValidationError("Operação com esta chave não pôde ser recuperada.")
+
+        metricas.incrementar(f"idempotencia.{operacao}.repeticoes")
+        return resultado
+
+    @classmethod
+    def limpar_expiradas(cls, lote=5000):
+        limite = timezone.now() - cls.validade()
+        removidas = 0
+        while True:
+            pks = list(cls.objects.filter(criada_em__lt=limite).values_list("pk", flat=True)[:lote])
+            if not pks:
+                return removidas
+            for parte in em_lotes(pks):
+                removidas += cls.objects.filter(pk__in=parte).delete()[0]
+
+    def __str__(self):
+        return f"Chave {self.chave} ({self.get_operacao_display()})"
+
+
 class SolicitacaoCredito(models.Model):
     class Status(models.TextChoices):
         PENDENTE = 'pendente', 'Pendente'
@@ -368,14 +1493,19 @@ class SolicitacaoCredito(models.Model):
     resposta = models.TextField(blank=True)
     criado_em = models.DateTimeField(auto_now_add=True)
     respondido_em = models.DateTimeField(null=True, blank=True)
+    score = models.PositiveSmallIntegerField(null=True, blank=True)
+    pontuado_em = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         ordering = ['-criado_em']
+        indexes = [
+            models.Index(fields=['gerente', 'status', 'criado_em'], name='credito_fila_gerente_idx'),
+        ]
 
     def aprovar(self, gerente, resposta=""):
         if self.status != self.Status.PENDENTE:
             raise ValidationError("Solicitação já foi analisada.")
-        if gerente.pk != self.gerente.pk:
+        if gerente.pk != self.gerente_id:
             raise ValidationError("Gerente inválido para aprovação.")
 
         self.status = self.Status.APROVADO
@@ -386,7 +1516,7 @@ class SolicitacaoCredito(models.Model):
     def negar(self, gerente, resposta=""):
         if self.status != self.Status.PENDENTE:
             raise ValidationError("Solicitação já foi analisada.")
-        if gerente.pk != self.gerente.pk:
+        if gerente.pk != self.gerente_id:
             raise ValidationError("Gerente inválido para reprovação.")
 
         self.status = self.Status.NEGADO
@@ -416,30 +1546,19 @@ class PedidoCartao(models.Model):
 
     class Meta:
         ordering = ['-criado_em']
+        indexes = [
+            models.Index(fields=['gerente', 'status', 'criado_em'], name='pedido_cartao_fila_idx'),
+        ]
 
     def aprovar(self, gerente, observacao=""):
         if self.status != self.Status.PENDENTE:
             raise ValidationError("Pedido já foi analisado.")
-        if gerente.pk != self.gerente.pk:
+        if gerente.pk != self.gerente_id:
             raise ValidationError("Gerente inválido para aprovação.")
 
-        limite_cliente = self.cliente.limite_credito
-        limite_cartao = limite_cliente
-        if self.modelo.limite_maximo is not None:
-            limite_cartao = min(limite_cartao, self.modelo.limite_maximo)
-
-        numero = self._gerar_numero_cartao_unico()
-        validade = (timezone.now() + timedelta(days=365 * 4)).date()
-        codigo = f"{secrets.randbelow(1000):03d}"
-
-        cartao = Cartao.objects.create(
-            cliente=self.cliente,
-            modelo=self.modelo,
-            numero=numero,
-            validade=validade,
-            codigo_seguranca=codigo,
-            limite=limite_cartao,
-        )
+        from .cartoes import emitir_cartoes
+
+        cartao = emitir_cartoes([(self.cliente, self.modelo, self.modelo.limite_para(self.cliente))])[0]
 
         self.status = self.Status.APROVADO
         self.observacao = (observacao or "").strip()
@@ -452,7 +1571,7 @@ class PedidoCartao(models.Model):
     def negar(self, gerente, observacao=""):
         if self.status != self.Status.PENDENTE:
             raise ValidationError("Pedido já foi analisado.")
-        if gerente.pk != self.gerente.pk:
+        if gerente.pk != self.gerente_id:
             raise ValidationError("Gerente inválido para reprovação.")
 
         self.status = self.Status.NEGADO
@@ -460,13 +1579,6 @@ class PedidoCartao(models.Model):
         self.respondido_em = timezone.now()
         self.save(update_fields=['status', 'observacao', 'respondido_em'])
 
-    @staticmethod
-    def _gerar_numero_cartao_unico():
-        while True:
-            numero = ''.join(str(secrets.randbelow(10)) for _ in range(16))
-            if not Cartao.objects.filter(numero=numero).exists():
-                return numero
-
     def __str__(self):
         return f"Pedido de cartão {self.modelo.nome} - {self.cliente.usuario.nome} ({self.get_status_display()})"
 
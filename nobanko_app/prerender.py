@@ -0,0 +1,75 @@
+import hashlib
+import json
+import os
+from importlib import import_module
+from pathlib import Path
+
+from django.conf import settings
+from django.urls import URLPattern, resolve, reverse
+
+NOME_MANIFESTO = "manifest.json"
+
+
+def diretorio_padrao():
+    return Path(getattr(settings, "NOBANKO_PRERENDER_DIR", Path(settings.BASE_DIR) / "prerender"))
+
+
+def paginas_anonimas():
+    """Caminhos das views marcadas com ``cache_pagina_anonima``, na ordem de ``urls.py``."""
+    from . import urls
+
+    for padrao in urls.urlpatterns:
+        if isinstance(padrao, URLPattern) and getattr(padrao.callback, "pagina_anonima", False):
+            yield reverse(f"{urls.app_name}:{padrao.name}"), padrao.name
+
+
+def renderizar(caminho):
+    """Renderiza ``caminho`` como um visitante sem sessão, pelos templates reais."""
+    from django.test import RequestFactory
+
+    request = RequestFactory().get(caminho)
+    request.session = import_module(settings.SESSION_ENGINE).SessionStore()
+    request.resolver_match = resolve(caminho)
+    # Chama a view original: o cache de páginas não deve participar da geração.
+    view = getattr(request.resolver_match.func, "__wrapped__", request.resolver_match.func)
+    resposta = view(request, *request.resolver_match.args, **request.resolver_match.kwargs)
+    if resposta.status_code != 200:
+        raise ValueError(f"{caminho} respondeu {resposta.status_code}.")
+    return resposta.content, resposta["Content-Type"]
+
+
+def gerar(destino=None):
+    """Grava cada página em ``<nome>.<hash>.html`` e o mapa caminho -> arquivo no manifesto.
+
+    O manifesto é trocado atomicamente e só depois os arquivos da geração
+    anterior são apagados, então quem está servindo nunca aponta para um
+    arquivo ausente.
+    """
+    destino = Path(destino or diretorio_padrao())
+    destino.mkdir(parents=True, exist_ok=True)
+
+    manifesto = {}
+    for caminho, nome in paginas_anonimas():
+        conteudo, content_type = renderizar(caminho)
+        resumo = hashlib.sha256(conteudo).hexdigest()[:12]
+        arquivo = f"{nome}.{resumo}.html"
+        (destino / arquivo).write_bytes(conteudo)
+        manifesto[caminho] = {"arquivo": arquivo, "hash": resumo, "content_type": content_type}
+
+    temporario = destino / f"{NOME_MANIFESTO}.tmp"
+    temporario.write_text(json.dumps(manifesto, indent=2, sort_keys=True), encoding="utf-8")
+    os.replace(temporario, destino / NOME_MANIFESTO)
+
+    atuais = {pagina["arquivo"] for pagina in manifesto.values()}
+    for antigo in destino.glob("*.html"):
+        if antigo.name not in atuais:
+            antigo.unlink()
+    return manifesto
+
+
+def carregar_manifesto(destino=None):
+    caminho = Path(destino or diretorio_padrao()) / NOME_MANIFESTO
+    try:
+        return json.loads(caminho.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return {}
@@ -0,0 +1,285 @@
+import copy
+import logging
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.contrib.sessions.backends.base import CreateError
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import close_old_connections, connections, router
+
+from . import metricas
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "nobanko.sessoes:"
+
+# Sessões com estas chaves (login do nobanko e do admin) não ficam no LRU local:
+# um logout ou troca de permissão noutro processo tem de valer na próxima leitura.
+CHAVES_AUTENTICADAS = ("usuario_id", "_auth_user_id")
+
+SESSOES_PADRAO = {
+    "LRU_TAMANHO": 2048,
+    "LRU_SEGUNDOS": 5,
+    "ESCRITA_ASSINCRONA": True,
+}
+
+
+def _configuracao():
+    config = dict(SESSOES_PADRAO)
+    config.update(getattr(settings, "NOBANKO_SESSOES", {}))
+    return config
+
+
+class CacheLocal:
+    """LRU por processo com validade curta, para limitar a defasagem entre processos."""
+
+    def __init__(self):
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, chave):
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                return None
+            dados, expira_em = item
+            if expira_em < time.monotonic():
+                del self._itens[chave]
+                return None
+            self._itens.move_to_end(chave)
+        return copy.deepcopy(dados)
+
+    def guardar(self, chave, dados, tamanho, segundos):
+        if tamanho <= 0 or segundos <= 0:
+            return
+        with self._lock:
+            self._itens[chave] = (copy.deepcopy(dados), time.monotonic() + segundos)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > tamanho:
+                self._itens.popitem(last=False)
+
+    def remover(self, chave):
+        with self._lock:
+            self._itens.pop(chave, None)
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+
+cache_local = CacheLocal()
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Gravações ainda na fila, por chave de sessão.
+_pendentes = defaultdict(int)
+_pendentes_lock = threading.Lock()
+
+
+def _fila():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="nobanko-sessoes")
+        return _executor
+
+
+def aguardar_gravacoes():
+    """Espera a fila de gravações no banco esvaziar (útil em shutdown e benchmarks)."""
+    _fila().submit(lambda: None).result()
+
+
+def gravacoes_pendentes(session_key):
+    with _pendentes_lock:
+        return session_key in _pendentes
+
+
+def _enfileirar(session_key, funcao, *args):
+    with _pendentes_lock:
+        _pendentes[session_key] += 1
+    _fila().submit(_executar_no_banco, session_key, funcao, *args)
+
+
+def _executar_no_banco(session_key, funcao, *args):
+    close_old_connections()
+    try:
+        funcao(*args)
+    except Exception:
+        metricas.incrementar("sessoes.gravacoes_falhas")
+        logger.exception("Falha ao gravar sessão no banco.")
+    finally:
+        with _pendentes_lock:
+            _pendentes[session_key] -= 1
+            if not _pendentes[session_key]:
+                del _pendentes[session_key]
+        close_old_connections()
+
+
+def cache_compartilhado():
+    """Cache de ``SESSION_CACHE_ALIAS``; fora do DEBUG ele precisa valer para todos os processos."""
+    cache = caches[settings.SESSION_CACHE_ALIAS]
+    if isinstance(cache, LocMemCache) and not settings.DEBUG:
+        raise ImproperlyConfigured(
+            "nobanko_app.sessoes exige um cache compartilhado entre processos em "
+            f"CACHES[{settings.SESSION_CACHE_ALIAS!r}]; LocMemCache vale só para um processo."
+        )
+    return cache
+
+
+class SessionStore(DBStore):
+    """Sessões no cache compartilhado, com uma camada LRU local e gravação assíncrona no banco.
+
+    Leitura: LRU do processo (só sessões anônimas) -> cache
+    (``SESSION_CACHE_ALIAS``) -> tabela ``django_session``. Gravação (o ``SessionMiddleware`` só grava sessões
+    alteradas): cache e LRU na hora. Sessões novas e chaves renovadas vão ao
+    banco na hora, para que qualquer processo as encontre mesmo sem o cache;
+    as demais alterações vão numa fila de uma thread, que preserva a ordem das
+    operações de cada chave.
+    """
+
+    cache_key_prefix = KEY_PREFIX
+
+    def __init__(self, session_key=None):
+        self._cache = cache_compartilhado()
+        self._config = _configuracao()
+        super().__init__(session_key)
+
+    def _chave(self, session_key):
+        return self.cache_key_prefix + session_key
+
+    def _guardar_local(self, session_key, dados):
+        if any(chave in dados for chave in CHAVES_AUTENTICADAS):
+            cache_local.remover(self._chave(session_key))
+            return
+        cache_local.guardar(
+            self._chave(session_key), dados, self._config["LRU_TAMANHO"], self._config["LRU_SEGUNDOS"]
+        )
+
+    def _no_banco(self, session_key, funcao, *args, assincrona=True):
+        # Dentro de uma transação de quem chamou a gravação acompanha essa
+        # transação; uma conexão paralela poderia esperar pelos locks dela.
+        using = router.db_for_write(self.model, instance=None)
+        if assincrona and self._config["ESCRITA_ASSINCRONA"] and not connections[using].in_atomic_block:
+            _enfileirar(session_key, funcao, *args)
+        else:
+            funcao(*args)
+
+    def load(self):
+        if not self.session_key:
+            return {}
+        chave = self._chave(self.session_key)
+
+        dados = cache_local.obter(chave)
+        if dados is not None:
+            metricas.incrementar("sessoes.leituras_locais")
+            return dados
+
+        try:
+            dados = self._cache.get(chave)
+        except Exception:
+            dados = None
+        if dados is not None:
+            metricas.incrementar("sessoes.leituras_cache")
+            self._guardar_local(self.session_key, dados)
+            return dados
+
+        metricas.incrementar("sessoes.leituras_banco")
+        sessao = self._get_session_from_db()
+        if not sessao:
+            return {}
+        dados = self.decode(sessao.session_data)
+        self._cache.set(chave, dados, self.get_expiry_age(expiry=sessao.expire_date))
+        self._guardar_local(self.session_key, dados)
+        return dados
+
+    def exists(self, session_key):
+        # Chaves têm 32 caracteres aleatórios; a reserva atômica em save()
+        # cobre a colisão no cache sem consultar o banco.
+        if not session_key:
+            return False
+        chave = self._chave(session_key)
+        return cache_local.obter(chave) is not None or chave in self._cache
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+
+        dados = self._get_session(no_load=must_create)
+        chave = self._chave(self.session_key)
+        idade = self.get_expiry_age()
+        if must_create:
+            if not self._cache.add(chave, dados, idade):
+                raise CreateError
+        else:
+            self._cache.set(chave, dados, idade)
+        self._guardar_local(self.session_key, dados)
+
+        # create() e cycle_key() chegam aqui com must_create: a próxima
+        # requisição pode cair noutro processo antes de a fila andar.
+        self._no_banco(
+            self.session_key,
+            self._gravar_no_banco,
+            self.session_key,
+            self.encode(dados),
+            self.get_expiry_date(),
+            assincrona=not must_create,
+        )
+
+    def _gravar_no_banco(self, session_key, session_data, expire_date):
+        using = router.db_for_write(self.model, instance=None)
+        self.model.objects.using(using).update_or_create(
+            session_key=session_key,
+            defaults={"session_data": session_data, "expire_date": expire_date},
+        )
+
+    def delete(self, session_key=None):
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        chave = self._chave(session_key)
+        cache_local.remover(chave)
+        self._cache.delete(chave)
+        if gravacoes_pendentes(session_key):
+            # Passar na frente de uma gravação ainda na fila ressuscitaria a sessão.
+            _enfileirar(session_key, self._apagar_no_banco, session_key)
+        else:
+            self._no_banco(session_key, self._apagar_no_banco, session_key)
+
+    def _apagar_no_banco(self, session_key):
+        using = router.db_for_write(self.model, instance=None)
+        self.model.objects.using(using).filter(session_key=session_key).delete()
+
+    def flush(self):
+        self.clear()
+        self.delete(self.session_key)
+        self._session_key = None
+
+    # Versões assíncronas: as da classe base iriam direto ao banco, sem o cache.
+    async def aload(self):
+        return await sync_to_async(self.load)()
+
+    async def aexists(self, session_key):
+        return await sync_to_async(self.exists)(session_key)
+
+    async def asave(self, must_create=False):
+        if self.session_key is None:
+            return await self.acreate()
+        return await sync_to_async(self.save)(must_create)
+
+    async def adelete(self, session_key=None):
+        return await sync_to_async(self.delete)(session_key)
+
+    async def aflush(self):
+        self.clear()
+        await self.adelete(self.session_key)
+        self._session_key = None
@@ -1,9 +1,53 @@
+import csv
+import importlib.util
+import json
+import os
+import tempfile
+import unittest
+from datetime import timedelta
 from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
-from django.test import TestCase
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, OperationalError, connection
+from django.db.models import F
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
 
-from .models import Cliente, Transacao, Transferencia, Usuario
+from . import metricas
+from .concorrencia import (
+	ConflitoConcorrencia,
+	calcular_espera,
+	erro_transitorio,
+	executar_com_retentativa,
+)
+from .liquidacao import liquidar_pendentes
+from .models import (
+	Cartao,
+	ChaveIdempotencia,
+	CheckpointFechamento,
+	Cliente,
+	CompraCartao,
+	Fatura,
+	FluxoCaixa,
+	Gerente,
+	Mensagem,
+	ModeloCartao,
+	PedidoCartao,
+	SaldoFracionado,
+	SequenciaCartao,
+	SolicitacaoCredito,
+	Transacao,
+	Transferencia,
+	Usuario,
+)
 
 
 class TransferenciaEntreContasTestCase(TestCase):
@@ -81,3 +125,1727 @@ class TransferenciaEntreContasTestCase(TestCase):
 	def test_deposito_valor_invalido_dispara_erro(self):
 		with self.assertRaises(ValidationError):
 			self.cliente_origem.depositar("abc")
+
+	def test_transferencia_liga_transacoes_e_reporta_consultas(self):
+		transferencia = self.cliente_origem.transferir_para(
+			destino=self.cliente_destino,
+			valor=Decimal("100.00"),
+		)
+
+		saida = transferencia.transacao_origem
+		entrada = transferencia.transacao_destino
+		saida.refresh_from_db()
+		entrada.refresh_from_db()
+
+		self.assertEqual(saida.transferencia_id, transferencia.pk)
+		self.assertEqual(entrada.transferencia_id, transferencia.pk)
+		self.assertEqual(saida.saldo_resultante, Decimal("900.00"))
+		self.assertEqual(entrada.saldo_resultante, Decimal("600.00"))
+		self.assertEqual(saida.descricao, "Transferência para conta 0001-87654321")
+		self.assertEqual(entrada.descricao, "Transferência recebida de conta 0001-12345678")
+		self.assertLessEqual(transferencia.consultas_executadas, 7)
+
+	def test_transferencia_saldo_insuficiente_nao_altera_saldos(self):
+		with self.assertRaises(ValidationError):
+			self.cliente_origem.transferir_para(self.cliente_destino, Decimal("1000.01"))
+
+		self.cliente_origem.refresh_from_db()
+		self.cliente_destino.refresh_from_db()
+		self.assertEqual(self.cliente_origem.saldo, Decimal("1000.00"))
+		self.assertEqual(self.cliente_destino.saldo, Decimal("500.00"))
+		self.assertFalse(Transacao.objects.exists())
+
+
+@override_settings(NOBANKO_CONCORRENCIA={"sqlite": "otimista"})
+class ConcorrenciaOtimistaTestCase(TransferenciaEntreContasTestCase):
+	def _alterar_conta_antes_da_escrita(self, cliente):
+		alterou = []
+
+		def concorrente(execute, sql, params, many, context):
+			if not alterou and sql.startswith("UPDATE") and '"versao"' in sql:
+				alterou.append(True)
+				Cliente.objects.filter(pk=cliente.pk).update(versao=F("versao") + 1)
+			return execute(sql, params, many, context)
+
+		return connection.execute_wrapper(concorrente)
+
+	def test_transferencia_incrementa_versoes(self):
+		self.cliente_origem.transferir_para(self.cliente_destino, Decimal("10.00"))
+
+		self.cliente_origem.refresh_from_db()
+		self.cliente_destino.refresh_from_db()
+		self.assertEqual(self.cliente_origem.versao, 1)
+		self.assertEqual(self.cliente_destino.versao, 1)
+
+	@mock.patch("nobanko_app.concorrencia.time.sleep")
+	def test_conflito_na_transferencia_e_repetido(self, sleep):
+		metricas.zerar()
+
+		with self._alterar_conta_antes_da_escrita(self.cliente_destino):
+			transferencia = self.cliente_origem.transferir_para(self.cliente_destino, Decimal("100.00"))
+
+		self.cliente_origem.refresh_from_db()
+		self.cliente_destino.refresh_from_db()
+		self.assertEqual(self.cliente_origem.saldo, Decimal("900.00"))
+		self.assertEqual(self.cliente_destino.saldo, Decimal("600.00"))
+		self.assertEqual(transferencia.transacao_destino.saldo_resultante, Decimal("600.00"))
+		self.assertEqual(metricas.obter("transferencias.retentativas"), 1)
+
+	@mock.patch("nobanko_app.concorrencia.time.sleep")
+	def test_conflito_no_deposito_e_repetido(self, sleep):
+		metricas.zerar()
+
+		with self._alterar_conta_antes_da_escrita(self.cliente_origem):
+			transacao = self.cliente_origem.depositar(Decimal("50.00"))
+
+		self.assertEqual(transacao.saldo_resultante, Decimal("1050.00"))
+		self.assertEqual(metricas.obter("depositos.retentativas"), 1)
+
+
+@override_settings(NOBANKO_RETENTATIVAS={"TENTATIVAS": 3, "ESPERA_BASE": 0.01, "ESPERA_MAXIMA": 0.05})
+class RetentativaConcorrenciaTestCase(SimpleTestCase):
+	def setUp(self):
+		metricas.zerar()
+
+	def test_classifica_erros_transitorios(self):
+		self.assertTrue(erro_transitorio(OperationalError("database is locked")))
+		self.assertTrue(erro_transitorio(OperationalError("deadlock detected")))
+		self.assertTrue(erro_transitorio(ConflitoConcorrencia()))
+		self.assertFalse(erro_transitorio(IntegrityError("UNIQUE constraint failed")))
+		self.assertFalse(erro_transitorio(ValueError("database is locked")))
+
+	def test_espera_respeita_teto(self):
+		for tentativa in range(1, 10):
+			self.assertLessEqual(calcular_espera(tentativa), 0.05)
+
+	@mock.patch("nobanko_app.concorrencia.time.sleep")
+	def test_repete_ate_sucesso_e_conta_retentativas(self, sleep):
+		chamadas = []
+
+		def operacao():
+			chamadas.append(1)
+			if len(chamadas) < 3:
+				raise OperationalError("database is locked")
+			return "ok"
+
+		self.assertEqual(executar_com_retentativa(operacao, nome="teste"), "ok")
+		self.assertEqual(len(chamadas), 3)
+		self.assertEqual(sleep.call_count, 2)
+		self.assertEqual(metricas.obter("teste.retentativas"), 2)
+
+	@mock.patch("nobanko_app.concorrencia.time.sleep")
+	def test_desiste_apos_limite_de_tentativas(self, sleep):
+		def operacao():
+			raise OperationalError("deadlock detected")
+
+		with self.assertRaises(OperationalError):
+			executar_com_retentativa(operacao, nome="teste")
+		self.assertEqual(metricas.obter("teste.retentativas_esgotadas"), 1)
+
+	def test_erro_nao_transitorio_sobe_imediatamente(self):
+		operacao = mock.Mock(side_effect=IntegrityError("duplicada"))
+
+		with self.assertRaises(IntegrityError):
+			executar_com_retentativa(operacao, nome="teste")
+		operacao.assert_called_once()
+
+
+class FolhaPagamentoTestCase(TestCase):
+	def setUp(self):
+		self.empresa = Cliente.objects.create(
+			usuario=Usuario.objects.create(
+				nome="Empresa", email="empresa@example.com", senha="x", conta="10000000", agencia="0001"
+			),
+			saldo=Decimal("5000.00"),
+		)
+		self.funcionarios = [
+			Cliente.objects.create(
+				usuario=Usuario.objects.create(
+					nome=f"Funcionário {indice}",
+					email=f"funcionario{indice}@example.com",
+					senha="x",
+					conta=f"2000000{indice}",
+					agencia="0001",
+				),
+				saldo=Decimal("100.00"),
+			)
+			for indice in range(3)
+		]
+
+	def test_folha_debita_uma_vez_e_credita_cada_lancamento(self):
+		resultados = self.empresa.pagar_folha(
+			[
+				{"agencia": "0001", "conta": "20000000", "valor": "1000.00"},
+				{"agencia": "0001", "conta": "20000001", "valor": "1500.50"},
+				{"agencia": "0001", "conta": "20000000", "valor": "200"},
+				{"agencia": "0001", "conta": "99999999", "valor": "10"},
+				{"agencia": "0001", "conta": "20000002", "valor": "abc"},
+				{"agencia": "0001", "conta": "10000000", "valor": "10"},
+			],
+			descricao="Folha outubro",
+		)
+
+		self.assertEqual([r["status"] for r in resultados], ["ok", "ok", "ok", "erro", "erro", "erro"])
+		self.empresa.refresh_from_db()
+		self.assertEqual(self.empresa.saldo, Decimal("2299.50"))
+		self.assertEqual(self.empresa.versao, 1)
+
+		saldos = {c.pk: c.saldo for c in Cliente.objects.filter(pk__in=[f.pk for f in self.funcionarios])}
+		self.assertEqual(saldos[self.funcionarios[0].pk], Decimal("1300.00"))
+		self.assertEqual(saldos[self.funcionarios[1].pk], Decimal("1600.50"))
+		self.assertEqual(saldos[self.funcionarios[2].pk], Decimal("100.00"))
+
+		self.assertEqual(Transferencia.objects.count(), 3)
+		self.assertEqual(Transacao.objects.filter(transferencia__isnull=True).count(), 0)
+		entradas = Transacao.objects.filter(
+			cliente=self.funcionarios[0], tipo=Transacao.Tipo.ENTRADA
+		).order_by("pk")
+		self.assertEqual([t.saldo_resultante for t in entradas], [Decimal("1100.00"), Decimal("1300.00")])
+		ultima_saida = Transacao.objects.filter(cliente=self.empresa).order_by("-pk").first()
+		self.assertEqual(ultima_saida.saldo_resultante, Decimal("2299.50"))
+
+	def test_folha_sem_saldo_nao_movimenta_nada(self):
+		with self.assertRaises(ValidationError):
+			self.empresa.pagar_folha(
+				[
+					{"agencia": "0001", "conta": "20000000", "valor": "4000"},
+					{"agencia": "0001", "conta": "20000001", "valor": "1000.01"},
+				]
+			)
+
+		self.empresa.refresh_from_db()
+		self.assertEqual(self.empresa.saldo, Decimal("5000.00"))
+		self.assertFalse(Transacao.objects.exists())
+
+	def test_comando_le_csv_e_json_e_gera_relatorio(self):
+		with tempfile.TemporaryDirectory() as pasta:
+			caminho_csv = os.path.join(pasta, "folha.csv")
+			with open(caminho_csv, "w", encoding="utf-8") as arquivo:
+				arquivo.write("agencia;conta;valor\n0001;20000000;1.000,00\n0001;00000000;5,00\n")
+			caminho_json = os.path.join(pasta, "folha.json")
+			with open(caminho_json, "w", encoding="utf-8") as arquivo:
+				json.dump({"lancamentos": [{"agencia": "0001", "conta": "20000001", "valor": 250}]}, arquivo)
+
+			saida = StringIO()
+			call_command(
+				"pagar_folha", caminho_csv, agencia="0001", conta="10000000", stdout=saida, stderr=StringIO()
+			)
+			call_command(
+				"pagar_folha", caminho_json, agencia="0001", conta="10000000", stdout=StringIO(), stderr=StringIO()
+			)
+
+		linhas = saida.getvalue().strip().splitlines()
+		self.assertEqual(linhas[0], "linha,agencia,conta,valor,status,mensagem,transferencia")
+		self.assertIn(",ok,", linhas[1])
+		self.assertIn("Conta de destino não encontrada.", linhas[2])
+		self.empresa.refresh_from_db()
+		self.assertEqual(self.empresa.saldo, Decimal("3750.00"))
+
+	def test_valores_com_separador_de_milhar(self):
+		from .management.commands.pagar_folha import _normalizar_valor
+
+		self.assertEqual(_normalizar_valor("1.500"), "1500")
+		self.assertEqual(_normalizar_valor("R$ 1.234,56"), "1234.56")
+		self.assertEqual(_normalizar_valor("1234,5"), "1234.5")
+		self.assertEqual(_normalizar_valor("1234.56"), "1234.56")
+		self.assertEqual(_normalizar_valor(250), "250")
+		for ambiguo in ("1,234.56", "1.234.5", "1.5e3", "12.34.56", "-100"):
+			self.assertIsNone(_normalizar_valor(ambiguo), ambiguo)
+
+		resultados = self.empresa.pagar_folha(
+			[
+				{"agencia": "0001", "conta": "20000000", "valor": _normalizar_valor("1.500")},
+				{"agencia": "0001", "conta": "20000001", "valor": _normalizar_valor("1,234.56")},
+			]
+		)
+		self.assertEqual(resultados[0]["valor"], Decimal("1500.00"))
+		self.assertEqual(resultados[1]["status"], "erro")
+		self.assertEqual(resultados[1]["mensagem"], "Informe um valor numérico válido.")
+
+
+class LiquidacaoCompensadaTestCase(TestCase):
+	def setUp(self):
+		self.clientes = [
+			Cliente.objects.create(
+				usuario=Usuario.objects.create(
+					nome=f"Cliente {indice}",
+					email=f"cliente{indice}@example.com",
+					senha="x",
+					conta=f"3000000{indice}",
+					agencia="0001",
+				),
+				saldo=saldo,
+			)
+			for indice, saldo in enumerate([Decimal("100.00"), Decimal("0.00"), Decimal("10.00")])
+		]
+
+	def test_agendar_nao_movimenta_saldos(self):
+		a, b, _c = self.clientes
+		transferencia = a.agendar_transferencia(b, Decimal("50.00"))
+
+		self.assertEqual(transferencia.status, Transferencia.Status.PENDENTE)
+		self.assertIsNone(transferencia.transacao_origem)
+		a.refresh_from_db()
+		self.assertEqual(a.saldo, Decimal("100.00"))
+
+	def test_liquidacao_compensa_posicoes_e_conclui_lote(self):
+		a, b, c = self.clientes
+		a.agendar_transferencia(b, Decimal("80.00"))
+		b.agendar_transferencia(c, Decimal("70.00"))
+		c.agendar_transferencia(a, Decimal("30.00"))
+
+		with self.assertNumQueries(8):
+			resumo = liquidar_pendentes()
+
+		self.assertEqual(resumo["liquidadas"], 3)
+		self.assertEqual(resumo["canceladas"], 0)
+		saldos = dict(Cliente.objects.values_list("pk", "saldo"))
+		self.assertEqual(saldos[a.pk], Decimal("50.00"))
+		self.assertEqual(saldos[b.pk], Decimal("10.00"))
+		self.assertEqual(saldos[c.pk], Decimal("50.00"))
+		self.assertFalse(Transferencia.objects.exclude(status=Transferencia.Status.CONCLUIDA).exists())
+		self.assertEqual(Transacao.objects.filter(transferencia__isnull=False).count(), 6)
+		self.assertFalse(Transferencia.objects.filter(transacoes__isnull=True).exists())
+
+	def test_liquidacao_cancela_contas_sem_cobertura(self):
+		a, b, c = self.clientes
+		b.agendar_transferencia(c, Decimal("40.00"))
+		c.agendar_transferencia(a, Decimal("45.00"))
+		a.agendar_transferencia(c, Decimal("20.00"))
+
+		resumo = liquidar_pendentes()
+
+		self.assertEqual(resumo["canceladas"], 2)
+		self.assertEqual(resumo["liquidadas"], 1)
+		saldos = dict(Cliente.objects.values_list("pk", "saldo"))
+		self.assertEqual(saldos[a.pk], Decimal("80.00"))
+		self.assertEqual(saldos[c.pk], Decimal("30.00"))
+		self.assertEqual(
+			Transferencia.objects.filter(status=Transferencia.Status.CANCELADA).count(), 2
+		)
+
+
+	def test_cancela_so_as_transferencias_que_excedem_o_saldo(self):
+		a, b, c = self.clientes
+		primeira = a.agendar_transferencia(b, Decimal("60.00"))
+		segunda = a.agendar_transferencia(c, Decimal("60.00"))
+
+		resumo = liquidar_pendentes()
+
+		self.assertEqual((resumo["liquidadas"], resumo["canceladas"]), (1, 1))
+		primeira.refresh_from_db()
+		segunda.refresh_from_db()
+		self.assertEqual(primeira.status, Transferencia.Status.CONCLUIDA)
+		self.assertEqual(segunda.status, Transferencia.Status.CANCELADA)
+		a.refresh_from_db()
+		self.assertEqual(a.saldo, Decimal("40.00"))
+
+class SaldoFracionadoTestCase(TestCase):
+	def setUp(self):
+		self.loja = Cliente.objects.create(
+			usuario=Usuario.objects.create(
+				nome="Loja", email="loja@example.com", senha="x", conta="40000000", agencia="0001"
+			),
+			saldo=Decimal("0.00"),
+		)
+		self.comprador = Cliente.objects.create(
+			usuario=Usuario.objects.create(
+				nome="Comprador", email="comprador@example.com", senha="x", conta="40000001", agencia="0001"
+			),
+			saldo=Decimal("1000.00"),
+		)
+		self.loja.ativar_saldo_fracionado(4)
+
+	def test_creditos_vao_para_fracoes_sem_tocar_na_linha_do_cliente(self):
+		self.loja.depositar(Decimal("10.00"))
+		transferencia = self.comprador.transferir_para(self.loja, Decimal("90.00"))
+
+		self.loja.refresh_from_db()
+		self.assertEqual(self.loja.saldo, Decimal("0.00"))
+		self.assertEqual(self.loja.versao, 0)
+		self.assertEqual(self.loja.saldo_total(), Decimal("100.00"))
+		self.assertEqual(transferencia.transacao_destino.saldo_resultante, Decimal("100.00"))
+		self.assertEqual(SaldoFracionado.objects.filter(cliente=self.loja).count(), 4)
+
+	def test_debito_consolida_fracoes(self):
+		self.comprador.transferir_para(self.loja, Decimal("300.00"))
+
+		self.loja.transferir_para(self.comprador, Decimal("250.00"))
+
+		self.loja.refresh_from_db()
+		self.assertEqual(self.loja.saldo, Decimal("50.00"))
+		self.assertEqual(self.loja.saldo_total(), Decimal("50.00"))
+		self.assertFalse(SaldoFracionado.objects.exclude(saldo=0).exists())
+
+	def test_debito_trava_as_duas_contas_antes_de_consolidar(self):
+		from . import models
+
+		self.comprador.transferir_para(self.loja, Decimal("300.00"))
+		chamadas = []
+		consolidar = SaldoFracionado.consolidar.__func__
+
+		with mock.patch.object(
+			models, "travar_clientes", side_effect=lambda pks: chamadas.append(("travar", list(pks)))
+		), mock.patch.object(
+			SaldoFracionado,
+			"consolidar",
+			classmethod(lambda cls, pks=None: chamadas.append(("consolidar", pks)) or consolidar(cls, pks)),
+		):
+			self.loja.transferir_para(self.comprador, Decimal("250.00"))
+
+		self.assertEqual(
+			chamadas[:2],
+			[("travar", sorted([self.loja.pk, self.comprador.pk])), ("consolidar", [self.loja.pk])],
+		)
+
+	def test_consolidar_e_desativar(self):
+		for _ in range(5):
+			self.loja.depositar(Decimal("20.00"))
+
+		self.assertEqual(SaldoFracionado.consolidar(), {self.loja.pk: Decimal("100.00")})
+		self.loja.refresh_from_db()
+		self.assertEqual(self.loja.saldo, Decimal("100.00"))
+
+		self.loja.depositar(Decimal("5.00"))
+		self.loja.desativar_saldo_fracionado()
+		self.loja.refresh_from_db()
+		self.assertEqual(self.loja.fracoes_saldo, 0)
+		self.assertEqual(self.loja.saldo, Decimal("105.00"))
+		self.assertFalse(SaldoFracionado.objects.filter(cliente=self.loja).exists())
+
+
+class IdempotenciaTestCase(TransferenciaEntreContasTestCase):
+	def test_deposito_repetido_com_mesma_chave_credita_uma_vez(self):
+		primeira = self.cliente_origem.depositar(Decimal("100.00"), chave_idempotencia="dep-1")
+		with self.assertNumQueries(1):
+			segunda = self.cliente_origem.depositar(Decimal("100.00"), chave_idempotencia="dep-1")
+
+		self.assertEqual(primeira.pk, segunda.pk)
+		self.cliente_origem.refresh_from_db()
+		self.assertEqual(self.cliente_origem.saldo, Decimal("1100.00"))
+
+	def test_transferencia_repetida_devolve_a_original(self):
+		primeira = self.cliente_origem.transferir_para(
+			self.cliente_destino, Decimal("50.00"), chave_idempotencia="trf-1"
+		)
+		segunda = self.cliente_origem.transferir_para(
+			self.cliente_destino, Decimal("50.00"), chave_idempotencia="trf-1"
+		)
+
+		self.assertEqual(primeira.pk, segunda.pk)
+		self.assertEqual(Transferencia.objects.count(), 1)
+		self.cliente_origem.refresh_from_db()
+		self.assertEqual(self.cliente_origem.saldo, Decimal("950.00"))
+
+	def test_chave_reutilizada_com_outro_valor_e_rejeitada(self):
+		self.cliente_origem.depositar(Decimal("10.00"), chave_idempotencia="dep-2")
+
+		with self.assertRaises(ValidationError):
+			self.cliente_origem.depositar(Decimal("20.00"), chave_idempotencia="dep-2")
+
+	def test_chaves_expiradas_sao_removidas(self):
+		self.cliente_origem.depositar(Decimal("10.00"), chave_idempotencia="antiga")
+		ChaveIdempotencia.objects.update(criada_em=timezone.now() - ChaveIdempotencia.validade())
+		self.cliente_origem.depositar(Decimal("10.00"), chave_idempotencia="nova")
+
+		self.assertEqual(ChaveIdempotencia.limpar_expiradas(), 1)
+		self.assertEqual(list(ChaveIdempotencia.objects.values_list("chave", flat=True)), ["nova"])
+
+	def test_repost_do_formulario_nao_move_dinheiro_duas_vezes(self):
+		sessao = self.client.session
+		sessao["usuario_id"] = self.usuario_origem.pk
+		sessao.save()
+		dados = {
+			"operation": "transfer",
+			"agencia_destino": "0001",
+			"conta_destino": "87654321",
+			"valor": "100,00",
+			"chave_idempotencia": "form-1",
+		}
+
+		self.client.post(reverse("nobanko_app:transacoes"), dados)
+		resposta = self.client.post(reverse("nobanko_app:transacoes"), dados)
+
+		self.assertContains(resposta, "concluída com sucesso")
+		self.cliente_origem.refresh_from_db()
+		self.assertEqual(self.cliente_origem.saldo, Decimal("900.00"))
+
+
+	def test_deposito_e_transferencia_da_mesma_pagina_nao_colidem(self):
+		sessao = self.client.session
+		sessao["usuario_id"] = self.usuario_origem.pk
+		sessao.save()
+		url = reverse("nobanko_app:transacoes")
+
+		deposito = self.client.post(
+			url, {"operation": "deposit", "valor": "100,00", "chave_idempotencia": "pagina-1"}
+		)
+		transferencia = self.client.post(
+			url,
+			{
+				"operation": "transfer",
+				"agencia_destino": "0001",
+				"conta_destino": "87654321",
+				"valor": "100,00",
+				"chave_idempotencia": "pagina-1",
+			},
+		)
+
+		self.assertContains(deposito, "realizado com sucesso")
+		self.assertContains(transferencia, "concluída com sucesso")
+		self.cliente_origem.refresh_from_db()
+		self.assertEqual(self.cliente_origem.saldo, Decimal("1000.00"))
+
+class ExtratoPaginadoTestCase(TestCase):
+	def setUp(self):
+		self.usuario = Usuario.objects.create(
+			nome="Cliente Extrato", email="extrato@example.com", senha="x", conta="50000000", agencia="0001"
+		)
+		self.cliente = Cliente.objects.create(usuario=self.usuario)
+		agora = timezone.now()
+		for indice in range(7):
+			transacao = Transacao.objects.create(
+				cliente=self.cliente,
+				valor=Decimal("10.00") + indice,
+				tipo=Transacao.Tipo.ENTRADA if indice % 2 == 0 else Transacao.Tipo.SAIDA,
+				descricao=f"Movimento {indice}",
+			)
+			# Dois movimentos por dia para exercitar o desempate por id.
+			Transacao.objects.filter(pk=transacao.pk).update(data=agora - timedelta(days=indice // 2))
+
+		sessao = self.client.session
+		sessao["usuario_id"] = self.usuario.pk
+		sessao.save()
+
+	def _descricoes(self, resposta):
+		return [tx["descricao"] for tx in resposta.context["transactions"]]
+
+	def test_paginacao_por_cursor_percorre_tudo_sem_repetir(self):
+		from .views import _filtrar_transacoes, _filtros_transacoes, _paginar_transacoes
+
+		transacoes = _filtrar_transacoes(self.cliente.transacoes.all(), _filtros_transacoes({}))
+		vistas = []
+		cursor = None
+		while True:
+			pagina, cursor = _paginar_transacoes(transacoes, cursor, limite=3)
+			vistas.extend(tx.descricao for tx in pagina)
+			if not cursor:
+				break
+
+		self.assertEqual(vistas, [f"Movimento {indice}" for indice in (1, 0, 3, 2, 5, 4, 6)])
+
+	def test_filtros_por_tipo_e_periodo(self):
+		url = reverse("nobanko_app:transacoes")
+
+		saidas = self._descricoes(self.client.get(url, {"tipo": "saida"}))
+		self.assertEqual(saidas, ["Movimento 1", "Movimento 3", "Movimento 5"])
+
+		hoje = timezone.localdate()
+		periodo = self._descricoes(self.client.get(url, {"de": hoje - timedelta(days=1), "ate": hoje}))
+		self.assertEqual(periodo, [f"Movimento {indice}" for indice in (1, 0, 3, 2)])
+
+	def test_cursor_invalido_volta_para_primeira_pagina(self):
+		resposta = self.client.get(reverse("nobanko_app:transacoes"), {"cursor": "???"})
+
+		self.assertEqual(len(resposta.context["transactions"]), 7)
+		self.assertEqual(resposta.context["next_page_url"], "")
+
+	def test_exportacao_csv_em_streaming(self):
+		hoje = timezone.localdate()
+		resposta = self.client.get(
+			reverse("nobanko_app:exportar_transacoes", args=["csv"]),
+			{"de": hoje - timedelta(days=1), "ate": hoje},
+		)
+
+		self.assertTrue(resposta.streaming)
+		self.assertIn("attachment;", resposta["Content-Disposition"])
+		linhas = b"".join(resposta.streaming_content).decode("utf-8-sig").splitlines()
+		self.assertEqual(linhas[0].split(",")[:3], ["data", "tipo", "valor"])
+		self.assertEqual(
+			[linha.split(",")[3] for linha in linhas[1:]],
+			[f"Movimento {indice}" for indice in (2, 3, 0, 1)],
+		)
+		self.assertEqual(linhas[1].split(",")[2], "12.00")
+		self.assertEqual(linhas[2].split(",")[2], "-13.00")
+
+	def test_exportacao_csv_neutraliza_formulas(self):
+		Transacao.objects.filter(cliente=self.cliente, descricao="Movimento 0").update(
+			descricao='=HYPERLINK("http://example.com","x")'
+		)
+		Transacao.objects.filter(cliente=self.cliente, descricao="Movimento 1").update(descricao="@SUM(A1)")
+
+		resposta = self.client.get(reverse("nobanko_app:exportar_transacoes", args=["csv"]))
+		linhas = list(csv.reader(b"".join(resposta.streaming_content).decode("utf-8-sig").splitlines()))
+
+		descricoes = {linha[3] for linha in linhas[1:]}
+		self.assertIn("'=HYPERLINK(\"http://example.com\",\"x\")", descricoes)
+		self.assertIn("'@SUM(A1)", descricoes)
+		self.assertIn("Movimento 2", descricoes)
+		self.assertTrue(any(linha[2].startswith("-") for linha in linhas[1:]))
+
+	def test_exportacao_ofx(self):
+		resposta = self.client.get(reverse("nobanko_app:exportar_transacoes", args=["ofx"]))
+
+		conteudo = b"".join(resposta.streaming_content).decode()
+		self.assertTrue(conteudo.startswith("OFXHEADER:100"))
+		self.assertEqual(conteudo.count("<STMTTRN>"), 7)
+		self.assertIn("<ACCTID>50000000", conteudo)
+		self.assertIn("<TRNTYPE>DEBIT\n<DTPOSTED>", conteudo)
+		self.assertIn("<TRNAMT>-11.00", conteudo)
+
+	def test_usuario_e_cliente_carregados_uma_vez_por_requisicao(self):
+		for nome_url in ("nobanko_app:home", "nobanko_app:cliente", "nobanko_app:transacoes"):
+			with CaptureQueriesContext(connection) as consultas:
+				resposta = self.client.get(reverse(nome_url))
+			self.assertEqual(resposta.status_code, 200)
+			consultas_usuario = [
+				consulta["sql"] for consulta in consultas if 'FROM "nobanko_app_usuario"' in consulta["sql"]
+			]
+			self.assertLessEqual(len(consultas_usuario), 1, nome_url)
+		self.assertEqual(resposta.context["usuario_logado"]["nome"], "Cliente")
+
+	def test_exportacao_formato_desconhecido(self):
+		resposta = self.client.get(reverse("nobanko_app:exportar_transacoes", args=["pdf"]))
+		self.assertEqual(resposta.status_code, 404)
+
+
+class FluxoCaixaTestCase(TestCase):
+	def setUp(self):
+		self.clientes = [
+			Cliente.objects.create(
+				usuario=Usuario.objects.create(
+					nome=f"Cliente Fluxo {indice}",
+					email=f"fluxo{indice}@example.com",
+					senha="x",
+					conta=f"6000000{indice}",
+					agencia="0001",
+				),
+			)
+			for indice in range(2)
+		]
+
+	def test_totais_acompanham_depositos_e_transferencias(self):
+		a, b = self.clientes
+		a.depositar(Decimal("200.00"))
+		a.transferir_para(b, Decimal("50.00"))
+		b.transferir_para(a, Decimal("20.00"))
+
+		competencia = FluxoCaixa.competencia_de(timezone.now())
+		for periodo in (None, competencia):
+			self.assertEqual(
+				FluxoCaixa.totais(a.pk, periodo),
+				{"total_entradas": Decimal("220.00"), "total_saidas": Decimal("50.00"), "quantidade": 3},
+			)
+			self.assertEqual(
+				FluxoCaixa.totais(b.pk, periodo),
+				{"total_entradas": Decimal("50.00"), "total_saidas": Decimal("20.00"), "quantidade": 2},
+			)
+
+	def test_conta_fracionada_soma_todas_as_fracoes(self):
+		a, b = self.clientes
+		a.depositar(Decimal("100.00"))
+		b.ativar_saldo_fracionado(fracoes=4)
+		for _ in range(6):
+			a.transferir_para(b, Decimal("10.00"))
+
+		self.assertEqual(FluxoCaixa.totais(b.pk)["total_entradas"], Decimal("60.00"))
+		self.assertEqual(FluxoCaixa.totais(b.pk)["quantidade"], 6)
+
+	def test_conflito_parcial_incrementa_todas_as_linhas(self):
+		a, b = self.clientes
+		competencia = FluxoCaixa.competencia_de(timezone.now())
+		FluxoCaixa.objects.all().delete()
+		FluxoCaixa.objects.create(cliente=a, competencia=None, total_entradas=Decimal("5.00"), quantidade=1)
+
+		original = FluxoCaixa._existentes
+		chamadas = []
+
+		def concorrente(filtro):
+			existentes = original(filtro)
+			if not chamadas:
+				# Outra transação cria só parte das linhas que faltam.
+				FluxoCaixa.objects.create(cliente=a, competencia=competencia, total_entradas=Decimal("7.00"), quantidade=1)
+				FluxoCaixa.objects.create(cliente=b, competencia=None, total_saidas=Decimal("3.00"), quantidade=1)
+			chamadas.append(filtro)
+			return existentes
+
+		with mock.patch.object(FluxoCaixa, "_existentes", side_effect=concorrente):
+			FluxoCaixa.registrar(
+				[
+					(a.pk, Transacao.Tipo.ENTRADA, Decimal("10.00"), 0),
+					(b.pk, Transacao.Tipo.SAIDA, Decimal("10.00"), 0),
+				]
+			)
+
+		self.assertEqual(len(chamadas), 2)
+		self.assertEqual(
+			FluxoCaixa.totais(a.pk),
+			{"total_entradas": Decimal("15.00"), "total_saidas": Decimal("0.00"), "quantidade": 2},
+		)
+		self.assertEqual(
+			FluxoCaixa.totais(a.pk, competencia),
+			{"total_entradas": Decimal("17.00"), "total_saidas": Decimal("0.00"), "quantidade": 2},
+		)
+		self.assertEqual(
+			FluxoCaixa.totais(b.pk),
+			{"total_entradas": Decimal("0.00"), "total_saidas": Decimal("13.00"), "quantidade": 2},
+		)
+		self.assertEqual(
+			FluxoCaixa.totais(b.pk, competencia),
+			{"total_entradas": Decimal("0.00"), "total_saidas": Decimal("10.00"), "quantidade": 1},
+		)
+
+	def test_abrir_competencia_tira_o_insert_da_transferencia(self):
+		a, b = self.clientes
+		a.depositar(Decimal("100.00"))
+		proxima = (FluxoCaixa.competencia_de(timezone.now()) + timedelta(days=32)).replace(day=1)
+		b.ativar_saldo_fracionado(fracoes=3)
+
+		saida = StringIO()
+		call_command("fluxo_caixa", "abrir", "--competencia", proxima.strftime("%Y-%m"), stdout=saida)
+
+		self.assertIn("2 clientes", saida.getvalue())
+		self.assertEqual(FluxoCaixa.objects.filter(competencia=proxima, quantidade=0).count(), 4)
+		momento = timezone.now() + timedelta(days=(proxima - timezone.localdate()).days)
+		with self.assertNumQueries(1):
+			FluxoCaixa.registrar([(a.pk, Transacao.Tipo.SAIDA, Decimal("10.00"), 0)], momento)
+		self.assertEqual(FluxoCaixa.totais(a.pk, proxima)["total_saidas"], Decimal("10.00"))
+
+	def test_verificar_e_reconstruir(self):
+		a, b = self.clientes
+		a.depositar(Decimal("100.00"))
+		a.transferir_para(b, Decimal("30.00"))
+		call_command("fluxo_caixa", "verificar", stdout=StringIO())
+
+		FluxoCaixa.objects.filter(cliente=b, competencia__isnull=True).update(total_entradas=0)
+		saida = StringIO()
+		with self.assertRaises(CommandError):
+			call_command("fluxo_caixa", "verificar", stdout=saida)
+		self.assertIn(f"Cliente {b.pk} (histórico)", saida.getvalue())
+
+		call_command("fluxo_caixa", "reconstruir", "--cliente", str(b.pk), stdout=StringIO())
+		call_command("fluxo_caixa", "verificar", stdout=StringIO())
+		self.assertEqual(FluxoCaixa.totais(b.pk)["total_entradas"], Decimal("30.00"))
+
+
+	def test_reconstruir_le_o_historico_com_as_linhas_ja_travadas(self):
+		a, b = self.clientes
+		a.depositar(Decimal("100.00"))
+		calcular = FluxoCaixa.calcular_do_historico
+
+		def ler_historico(cliente_pks=None):
+			# Um movimento que terminou antes do DELETE tem de estar no histórico lido.
+			self.assertFalse(FluxoCaixa.objects.filter(cliente_id__in=cliente_pks).exists())
+			return calcular(cliente_pks)
+
+		with mock.patch.object(FluxoCaixa, "calcular_do_historico", side_effect=ler_historico):
+			FluxoCaixa.reconstruir([a.pk])
+
+		self.assertEqual(FluxoCaixa.totais(a.pk)["total_entradas"], Decimal("100.00"))
+
+class CachePaginasTestCase(TestCase):
+	def setUp(self):
+		cache.clear()
+		metricas.zerar()
+
+	def test_visitante_recebe_pagina_do_cache(self):
+		url = reverse("nobanko_app:atendimento")
+		primeira = self.client.get(url)
+		with mock.patch("nobanko_app.views.base_context", side_effect=AssertionError) as base_context:
+			segunda = self.client.get(url)
+
+		base_context.assert_not_called()
+		self.assertEqual(segunda.content, primeira.content)
+		self.assertEqual(metricas.obter("cache_paginas.acertos"), 1)
+
+	def test_nova_versao_de_deploy_descarta_paginas(self):
+		url = reverse("nobanko_app:boletos")
+		self.client.get(url)
+		with override_settings(NOBANKO_VERSAO_DEPLOY="nova"):
+			self.client.get(url)
+
+		self.assertEqual(metricas.obter("cache_paginas.faltas"), 2)
+
+	def test_query_string_nao_usa_cache_de_pagina(self):
+		from .views import base_context
+
+		url = reverse("nobanko_app:atendimento")
+		self.client.get(url)
+		with mock.patch("nobanko_app.views.base_context", wraps=base_context) as chamada:
+			self.client.get(url, {"origem": "email"})
+
+		chamada.assert_called_once()
+		self.assertEqual(metricas.obter("cache_paginas.acertos"), 0)
+
+	def test_usuario_logado_nao_usa_cache_de_pagina(self):
+		usuario = Usuario.objects.create(
+			nome="Cliente Cache", email="cache@example.com", senha="x", conta="70000000", agencia="0001"
+		)
+		sessao = self.client.session
+		sessao["usuario_id"] = usuario.pk
+		sessao.save()
+
+		url = reverse("nobanko_app:home")
+		self.client.get(url)
+		self.client.get(url)
+
+		self.assertEqual(metricas.obter("cache_paginas.acertos"), 0)
+		self.assertEqual(metricas.obter("cache_paginas.faltas"), 0)
+
+
+class PaginasPrerenderizadasTestCase(TestCase):
+	def setUp(self):
+		diretorio = tempfile.TemporaryDirectory()
+		self.addCleanup(diretorio.cleanup)
+		self.destino = diretorio.name
+
+	def test_gera_paginas_com_hash_e_manifesto(self):
+		saida = StringIO()
+		call_command("prerenderizar_paginas", "--destino", self.destino, stdout=saida)
+
+		with open(os.path.join(self.destino, "manifest.json"), encoding="utf-8") as arquivo:
+			manifesto = json.load(arquivo)
+		self.assertIn(reverse("nobanko_app:home"), manifesto)
+		self.assertIn(reverse("nobanko_app:boletos"), manifesto)
+		self.assertNotIn(reverse("nobanko_app:transacoes"), manifesto)
+		pagina = manifesto[reverse("nobanko_app:atendimento")]
+		self.assertRegex(pagina["arquivo"], r"^atendimento\.[0-9a-f]{12}\.html$")
+		with open(os.path.join(self.destino, pagina["arquivo"]), encoding="utf-8") as arquivo:
+			self.assertIn("nb-nav__link--active", arquivo.read())
+
+	def test_middleware_serve_arquivo_sem_chamar_a_view(self):
+		call_command("prerenderizar_paginas", "--destino", self.destino, stdout=StringIO())
+
+		with override_settings(NOBANKO_PRERENDER_SERVIR=True, NOBANKO_PRERENDER_DIR=self.destino):
+			cliente = Client()
+			with mock.patch("nobanko_app.views.base_context", side_effect=AssertionError):
+				resposta = cliente.get(reverse("nobanko_app:fatura"))
+				self.assertEqual(resposta.status_code, 200)
+				self.assertIn(b"<html", resposta.content)
+
+				revalidacao = cliente.get(reverse("nobanko_app:fatura"), HTTP_IF_NONE_MATCH=resposta["ETag"])
+				self.assertEqual(revalidacao.status_code, 304)
+
+			self.assertEqual(resposta["X-Frame-Options"], "DENY")
+			self.assertEqual(resposta["X-Content-Type-Options"], "nosniff")
+			self.assertEqual(resposta["Referrer-Policy"], "same-origin")
+
+			cliente.cookies["sessionid"] = "qualquer"
+			self.assertNotIn("ETag", cliente.get(reverse("nobanko_app:fatura")))
+
+
+class EstaticosComprimidosTestCase(TestCase):
+	def setUp(self):
+		diretorio = tempfile.TemporaryDirectory()
+		self.addCleanup(diretorio.cleanup)
+		self.raiz = diretorio.name
+
+	def _configuracao(self):
+		return override_settings(
+			STATIC_ROOT=self.raiz,
+			STORAGES={
+				"default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+				"staticfiles": {"BACKEND": "nobanko_app.estaticos.ArmazenamentoEstaticoComprimido"},
+			},
+		)
+
+	def test_collectstatic_gera_hash_e_variantes_e_middleware_serve(self):
+		with self._configuracao():
+			call_command("collectstatic", "--noinput", "-i", "admin", verbosity=0)
+			with open(os.path.join(self.raiz, "staticfiles.json"), encoding="utf-8") as arquivo:
+				css = json.load(arquivo)["paths"]["css/main.css"]
+			self.assertRegex(css, r"^css/main\.[0-9a-f]{12}\.css$")
+			self.assertTrue(os.path.exists(os.path.join(self.raiz, css + ".gz")))
+			self.assertFalse(os.path.exists(os.path.join(self.raiz, "images", "logo_gpt.png.gz")))
+
+			cliente = Client()
+			resposta = cliente.get("/static/" + css, HTTP_ACCEPT_ENCODING="gzip, deflate")
+			self.assertEqual(resposta.status_code, 200)
+			self.assertEqual(resposta["Content-Encoding"], "gzip")
+			self.assertEqual(resposta["Content-Type"], "text/css")
+			self.assertIn("immutable", resposta["Cache-Control"])
+			self.assertEqual(resposta["Vary"], "Accept-Encoding")
+			self.assertEqual(resposta["X-Content-Type-Options"], "nosniff")
+			self.assertEqual(resposta["X-Frame-Options"], "DENY")
+			resposta.close()
+
+			sem_compressao = cliente.get("/static/css/main.css", HTTP_ACCEPT_ENCODING="gzip;q=0")
+			self.assertFalse(sem_compressao.has_header("Content-Encoding"))
+			self.assertNotIn("immutable", sem_compressao["Cache-Control"])
+			sem_compressao.close()
+
+
+class SessaoCacheTestCase(TestCase):
+	def setUp(self):
+		metricas.zerar()
+		self.usuario = Usuario.objects.create(
+			nome="Cliente Sessao", email="sessao@example.com", senha="x", conta="80000000", agencia="0001"
+		)
+		Cliente.objects.create(usuario=self.usuario)
+		sessao = self.client.session
+		sessao["usuario_id"] = self.usuario.pk
+		sessao.save()
+
+	def test_requisicao_autenticada_nao_le_sessao_do_banco(self):
+		with CaptureQueriesContext(connection) as consultas:
+			for _ in range(3):
+				self.assertEqual(self.client.get(reverse("nobanko_app:cliente")).status_code, 200)
+
+		self.assertFalse([c for c in consultas if '"django_session"' in c["sql"]])
+		self.assertEqual(metricas.obter("sessoes.leituras_banco"), 0)
+		self.assertEqual(metricas.obter("sessoes.leituras_locais"), 0)
+		self.assertGreaterEqual(metricas.obter("sessoes.leituras_cache"), 3)
+
+	def test_logout_noutro_processo_vale_na_leitura_seguinte(self):
+		from django.contrib.sessions.models import Session
+
+		from .sessoes import SessionStore
+
+		chave = self.client.session.session_key
+		self.assertEqual(SessionStore(chave)["usuario_id"], self.usuario.pk)
+
+		# Outro processo apaga a sessão: só o cache compartilhado fica sabendo.
+		cache.delete(SessionStore.cache_key_prefix + chave)
+		Session.objects.filter(session_key=chave).delete()
+
+		self.assertNotIn("usuario_id", SessionStore(chave))
+
+	def test_sessao_anonima_usa_o_lru_local(self):
+		from .sessoes import SessionStore
+
+		sessao = SessionStore()
+		sessao["tema"] = "escuro"
+		sessao.save()
+
+		self.assertEqual(SessionStore(sessao.session_key)["tema"], "escuro")
+		self.assertEqual(metricas.obter("sessoes.leituras_locais"), 1)
+
+	def test_sessao_sobrevive_a_perda_do_cache(self):
+		from .sessoes import SessionStore, cache_local
+
+		chave = self.client.session.session_key
+		cache_local.limpar()
+		cache.clear()
+
+		self.assertEqual(SessionStore(chave)["usuario_id"], self.usuario.pk)
+		self.assertEqual(metricas.obter("sessoes.leituras_banco"), 1)
+
+	def test_gravacao_fora_de_transacao_vai_para_a_fila(self):
+		from . import sessoes
+
+		sessao = sessoes.SessionStore()
+		sessao["x"] = 1
+		with mock.patch.object(sessoes, "_fila") as fila, mock.patch.object(
+			connection, "in_atomic_block", False
+		), mock.patch.object(sessoes.SessionStore, "_gravar_no_banco") as gravar:
+			sessao.save()
+			# Sessão nova vai ao banco na hora: outro processo a encontra sem o cache.
+			gravar.assert_called_once()
+			fila.return_value.submit.assert_not_called()
+
+			sessao["x"] = 2
+			sessao.save()
+
+		gravar.assert_called_once()
+		fila.return_value.submit.assert_called_once()
+		self.assertEqual(sessoes.SessionStore(sessao.session_key)["x"], 2)
+		sessoes._pendentes.clear()
+
+	def test_logout_nao_passa_na_frente_de_gravacao_na_fila(self):
+		from django.contrib.sessions.models import Session
+
+		from . import sessoes
+
+		sessao = sessoes.SessionStore()
+		sessao["x"] = 1
+		sessao.save()
+		chave = sessao.session_key
+		enfileiradas = []
+
+		with mock.patch.object(sessoes, "_fila") as fila, mock.patch.object(
+			connection, "in_atomic_block", False
+		):
+			fila.return_value.submit.side_effect = lambda *args: enfileiradas.append(args)
+			sessao["x"] = 2
+			sessao.save()
+			sessoes.SessionStore(chave).delete()
+
+		# Mesmo numa transação, o DELETE entra na fila atrás da gravação pendente.
+		self.assertEqual(len(enfileiradas), 2)
+		self.assertTrue(Session.objects.filter(session_key=chave).exists())
+		with mock.patch.object(sessoes, "close_old_connections"):
+			for funcao, *args in enfileiradas:
+				funcao(*args)
+		self.assertFalse(Session.objects.filter(session_key=chave).exists())
+		self.assertFalse(sessoes.gravacoes_pendentes(chave))
+
+	@override_settings(
+		DEBUG=False, CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+	)
+	def test_cache_por_processo_e_recusado_fora_do_debug(self):
+		from django.core.exceptions import ImproperlyConfigured
+
+		from .sessoes import SessionStore
+
+		with self.assertRaises(ImproperlyConfigured):
+			SessionStore()
+
+	def test_login_renova_chave_e_descarta_a_anterior(self):
+		from .sessoes import SessionStore
+
+		anterior = self.client.session.session_key
+		Usuario.objects.filter(pk=self.usuario.pk).update(senha=make_password("segredo"))
+		self.client.post(reverse("nobanko_app:login"), {"username": "sessao@example.com", "password": "segredo"})
+
+		self.assertNotEqual(self.client.session.session_key, anterior)
+		self.assertFalse(SessionStore().exists(anterior))
+
+
+class LoginAssincronoTestCase(TestCase):
+	def setUp(self):
+		cache.clear()
+		metricas.zerar()
+		self.usuario = Usuario.objects.create(
+			nome="Cliente Login",
+			email="login@example.com",
+			senha=make_password("segredo123"),
+			conta="81000000",
+			agencia="0001",
+		)
+		Cliente.objects.create(usuario=self.usuario)
+		self.url = reverse("nobanko_app:login")
+
+	def _entrar(self, senha, **extra):
+		return self.client.post(self.url, {"username": "login@example.com", "password": senha}, **extra)
+
+	def test_login_valido_registra_tempo_de_hash(self):
+		resposta = self._entrar("segredo123")
+
+		self.assertRedirects(resposta, reverse("nobanko_app:cliente"), fetch_redirect_response=False)
+		self.assertEqual(self.client.session["usuario_id"], self.usuario.pk)
+		self.assertEqual(metricas.obter("hash.verificacao.quantidade"), 1)
+		self.assertGreater(metricas.obter("hash.verificacao.microssegundos"), 0)
+
+	def test_conta_bloqueada_apos_rajada_de_tentativas(self):
+		for _ in range(5):
+			self.assertEqual(self._entrar("errada").status_code, 200)
+
+		resposta = self._entrar("segredo123")
+		self.assertEqual(resposta.status_code, 429)
+		self.assertNotIn("usuario_id", self.client.session)
+		self.assertEqual(metricas.obter("hash.verificacao.quantidade"), 5)
+		self.assertEqual(metricas.obter("login:conta.bloqueios"), 1)
+
+	@override_settings(NOBANKO_LOGIN={"IP_CAPACIDADE": 2, "CONTA_CAPACIDADE": 100})
+	def test_ip_bloqueado_independente_da_conta(self):
+		self._entrar("errada")
+		self.client.post(self.url, {"username": "outra@example.com", "password": "x"})
+
+		resposta = self.client.post(self.url, {"username": "terceira@example.com", "password": "x"})
+		self.assertEqual(resposta.status_code, 429)
+		self.assertEqual(self._entrar("segredo123", REMOTE_ADDR="10.0.0.2").status_code, 302)
+
+	def test_tentativas_simultaneas_nao_gastam_o_mesmo_token(self):
+		import asyncio
+
+		from asgiref.sync import async_to_sync
+
+		from .autenticacao import BaldeTokens
+
+		balde = BaldeTokens("login:conta", 2, 1)
+		inicio = 1000 * balde.janela
+
+		async def disputar():
+			return await asyncio.gather(*(balde.consumir("alvo@example.com") for _ in range(3)))
+
+		with mock.patch("nobanko_app.autenticacao.time.time", return_value=inicio):
+			self.assertEqual(sorted(async_to_sync(disputar)()), [False, True, True])
+
+		# Logo no começo da janela seguinte a anterior ainda pesa quase inteira.
+		with mock.patch("nobanko_app.autenticacao.time.time", return_value=inicio + 1.1 * balde.janela):
+			self.assertFalse(async_to_sync(balde.consumir)("alvo@example.com"))
+		with mock.patch("nobanko_app.autenticacao.time.time", return_value=inicio + 2.5 * balde.janela):
+			self.assertTrue(async_to_sync(balde.consumir)("alvo@example.com"))
+
+	def test_fila_de_hash_cheia_recusa_sem_esperar(self):
+		from .autenticacao import HashIndisponivel
+
+		with mock.patch("nobanko_app.views.verificar_senha", side_effect=HashIndisponivel):
+			resposta = self._entrar("segredo123")
+
+		self.assertEqual(resposta.status_code, 503)
+
+	def test_cadastro_gera_hash_fora_da_thread_da_requisicao(self):
+		resposta = self.client.post(
+			reverse("nobanko_app:cadastro"),
+			{
+				"full_name": "Nova Cliente",
+				"email": "nova@example.com",
+				"password": "senhaforte1",
+				"password_confirmation": "senhaforte1",
+			},
+		)
+
+		self.assertEqual(resposta.status_code, 302)
+		usuario = Usuario.objects.get(email="nova@example.com")
+		self.assertTrue(check_password("senhaforte1", usuario.senha))
+		self.assertTrue(Cliente.objects.filter(usuario=usuario).exists())
+		self.assertEqual(metricas.obter("hash.geracao.quantidade"), 1)
+
+	def test_login_por_cpf_ou_conta_consulta_um_unico_indice(self):
+		Usuario.objects.filter(pk=self.usuario.pk).update(cpf="52998224725")
+
+		for identificador in ("529.982.247-25", "81000000", "LOGIN@Example.com"):
+			self.client.logout()
+			with CaptureQueriesContext(connection) as consultas:
+				resposta = self.client.post(self.url, {"username": identificador, "password": "segredo123"})
+			self.assertEqual(resposta.status_code, 302, identificador)
+			busca = [c["sql"] for c in consultas if 'FROM "nobanko_app_usuario"' in c["sql"]][0]
+			self.assertNotIn(" OR ", busca)
+			self.assertNotIn("LIKE", busca.upper())
+
+	def test_cadastro_guarda_cpf_e_email_normalizados(self):
+		dados = {
+			"full_name": "Cliente CPF",
+			"cpf": "529.982.247-25",
+			"email": "  CPF@Example.com ",
+			"password": "senhaforte1",
+			"password_confirmation": "senhaforte1",
+		}
+		self.assertEqual(self.client.post(reverse("nobanko_app:cadastro"), dados).status_code, 302)
+		usuario = Usuario.objects.get(cpf="52998224725")
+		self.assertEqual(usuario.email, "cpf@example.com")
+
+		dados["email"] = "outro@example.com"
+		resposta = self.client.post(reverse("nobanko_app:cadastro"), dados)
+		self.assertContains(resposta, "Já existe uma conta criada com este CPF")
+
+		dados["cpf"] = "111.111.111-11"
+		resposta = self.client.post(reverse("nobanko_app:cadastro"), dados)
+		self.assertContains(resposta, "CPF inválido")
+
+	def test_migracao_de_emails_para_em_duplicados_por_caixa(self):
+		from importlib import import_module
+
+		from django.apps import apps
+
+		migracao = import_module("nobanko_app.migrations.0014_usuario_cpf_email_normalizado")
+		outro = Usuario.objects.create(nome="Outro", email="x@example.com", senha="x", conta="81000001", agencia="0001")
+		Usuario.objects.filter(pk=outro.pk).update(email="Login@Example.com")
+
+		with self.assertRaisesMessage(RuntimeError, f"login@example.com: usuários {self.usuario.pk}, {outro.pk}"):
+			migracao.normalizar_emails(apps, None)
+
+		Usuario.objects.filter(pk=outro.pk).update(email=" Outro@Example.com")
+		migracao.normalizar_emails(apps, None)
+		self.assertEqual(Usuario.objects.get(pk=outro.pk).email, "outro@example.com")
+
+	def test_classificacao_do_identificador(self):
+		self.assertEqual(Usuario.filtro_identificador(" Ana@X.com "), {"email": "ana@x.com"})
+		self.assertEqual(Usuario.filtro_identificador("529.982.247-25"), {"cpf": "52998224725"})
+		self.assertEqual(Usuario.filtro_identificador("81000000"), {"conta": "81000000"})
+		self.assertIsNone(Usuario.filtro_identificador("81.000-000"))
+		self.assertIsNone(Usuario.filtro_identificador("ana"))
+
+
+class AlocadorContasTestCase(TestCase):
+	def test_numeros_sequenciais_com_digito_verificador(self):
+		from .contas import AlocadorContas, conta_valida
+
+		alocador = AlocadorContas()
+		contas = [alocador.alocar("0001") for _ in range(3)]
+
+		self.assertEqual([conta[:4] for conta in contas], ["0001"] * 3)
+		self.assertEqual([int(conta[4:11]) for conta in contas], [1, 2, 3])
+		self.assertTrue(all(conta_valida(conta) for conta in contas))
+		self.assertFalse(conta_valida(contas[0][:-1] + str((int(contas[0][-1]) + 1) % 10)))
+		self.assertEqual(alocador.alocar("0002")[:11], "00020000001")
+
+	def test_lote_reserva_intervalo_unico(self):
+		from .contas import AlocadorContas
+
+		alocador = AlocadorContas()
+		alocador.alocar("0001")
+		with self.assertNumQueries(4):
+			lote = alocador.alocar_lote("0001", 100)
+
+		self.assertEqual(len(set(lote)), 100)
+		self.assertEqual(int(lote[0][4:11]), 2)
+		self.assertEqual(int(alocador.alocar("0001")[4:11]), 102)
+
+	def test_fora_de_transacao_consome_bloco_em_memoria(self):
+		from .contas import AlocadorContas
+		from .models import SequenciaConta
+
+		alocador = AlocadorContas(bloco=10)
+		with mock.patch.object(alocador, "_em_transacao", return_value=False):
+			primeira = alocador.alocar("0001")
+		with self.assertNumQueries(0):
+			segunda = alocador.alocar("0001")
+
+		self.assertEqual(int(segunda[4:11]), int(primeira[4:11]) + 1)
+		self.assertEqual(SequenciaConta.objects.get(agencia="0001").proximo, 11)
+
+
+class CartoesTestCase(TestCase):
+	def setUp(self):
+		from .cartoes import alocador_cartoes
+
+		alocador_cartoes.descartar_reservas()
+		gerente_usuario = Usuario.objects.create(
+			nome="Gerente", email="gerente@example.com", senha="x", conta="90000001", agencia="0001"
+		)
+		self.gerente = Gerente.objects.create(usuario=gerente_usuario, codigo_gerente="G001")
+		self.modelo = ModeloCartao.objects.create(
+			nome="Ouro", limite_minimo=Decimal("1000.00"), limite_maximo=Decimal("5000.00")
+		)
+		self.clientes = [
+			Cliente.objects.create(
+				usuario=Usuario.objects.create(
+					nome=f"Cliente {indice}",
+					email=f"cliente{indice}@example.com",
+					senha="x",
+					conta=f"1000{indice:04d}",
+					agencia="0001",
+				),
+				gerente=self.gerente,
+			)
+			for indice in range(3)
+		]
+
+
+class EmissaoCartoesTestCase(CartoesTestCase):
+	def test_luhn(self):
+		from .cartoes import cartao_valido, digito_luhn
+
+		self.assertEqual(digito_luhn("7992739871"), "3")
+		self.assertTrue(cartao_valido("4111111111111111"))
+		self.assertFalse(cartao_valido("4111111111111112"))
+
+	def test_bin_por_modelo(self):
+		outro = ModeloCartao.objects.create(nome="Platina", limite_minimo=Decimal("0.00"), bin="512-345")
+
+		self.assertEqual(self.modelo.bin, ModeloCartao.bin_padrao(self.modelo.pk))
+		self.assertEqual(ModeloCartao.objects.get(pk=self.modelo.pk).bin, self.modelo.bin)
+		self.assertEqual(outro.bin, "512345")
+		with self.assertRaises(ValidationError):
+			ModeloCartao.objects.create(nome="Curto", limite_minimo=Decimal("0.00"), bin="1234")
+
+	def test_aprovar_pedido_emite_cartao_valido(self):
+		from .cartoes import cartao_valido
+
+		pedido = self.clientes[0].solicitar_cartao(self.modelo)
+		cartao = pedido.aprovar(self.gerente)
+
+		self.assertTrue(cartao.numero.startswith(self.modelo.bin))
+		self.assertTrue(cartao_valido(cartao.numero))
+		self.assertEqual(cartao.limite, Decimal("2000.00"))
+		self.assertEqual(PedidoCartao.objects.get(pk=pedido.pk).cartao_emitido_id, cartao.pk)
+
+	def test_emissao_em_lote(self):
+		from .cartoes import cartao_valido, emitir_cartoes
+
+		platina = ModeloCartao.objects.create(nome="Platina", limite_minimo=Decimal("0.00"))
+		itens = [(cliente, self.modelo, Decimal("1000.00")) for cliente in self.clientes] * 100
+		itens.append((self.clientes[0], platina, Decimal("500.00")))
+
+		with self.assertNumQueries(15):
+			cartoes = emitir_cartoes(itens)
+
+		self.assertEqual(len(cartoes), 301)
+		self.assertEqual(Cartao.objects.count(), 301)
+		self.assertEqual(len({cartao.numero for cartao in cartoes}), 301)
+		self.assertTrue(all(cartao_valido(cartao.numero) for cartao in cartoes))
+		self.assertEqual(cartoes[-1].numero[:6], platina.bin)
+		self.assertEqual(SequenciaCartao.objects.get(bin=self.modelo.bin).proximo, 301)
+
+
+class FilaGerenteTestCase(CartoesTestCase):
+	def setUp(self):
+		super().setUp()
+		outro_usuario = Usuario.objects.create(
+			nome="Outro Gerente", email="outro@example.com", senha="x", conta="90000002", agencia="0001"
+		)
+		self.outro_gerente = Gerente.objects.create(usuario=outro_usuario, codigo_gerente="G002")
+		self.pedidos = [cliente.solicitar_cartao(self.modelo) for cliente in self.clientes]
+		self.creditos = [
+			cliente.solicitar_credito(Decimal("500.00"), "Reforma") for cliente in self.clientes
+		]
+
+	def test_pendentes_paginados_do_mais_antigo(self):
+		from .fila_gerente import pendentes
+
+		pagina, proximo = pendentes(self.gerente, "cartao", limite=2)
+		self.assertEqual([pedido.pk for pedido in pagina], [pedido.pk for pedido in self.pedidos[:2]])
+		with self.assertNumQueries(1):
+			pagina, proximo = pendentes(self.gerente, "cartao", apos=proximo, limite=2)
+			self.assertEqual(pagina[0].cliente.usuario.nome, "Cliente 2")
+		self.assertEqual([pedido.pk for pedido in pagina], [self.pedidos[2].pk])
+		self.assertIsNone(proximo)
+		self.assertEqual(pendentes(self.outro_gerente, "credito"), ([], None))
+
+	def test_aprovar_pedidos_em_lote_emite_cartoes(self):
+		from .cartoes import cartao_valido
+		from .fila_gerente import aprovar_em_lote
+
+		self.pedidos[0].negar(self.gerente)
+		pks = [pedido.pk for pedido in self.pedidos]
+		aprovados = aprovar_em_lote(self.gerente, "cartao", pks, " ok ")
+
+		self.assertEqual(len(aprovados), 2)
+		self.assertEqual(Cartao.objects.count(), 2)
+		for pedido in PedidoCartao.objects.filter(pk__in=pks[1:]).select_related("cartao_emitido"):
+			self.assertEqual(pedido.status, PedidoCartao.Status.APROVADO)
+			self.assertEqual(pedido.observacao, "ok")
+			self.assertEqual(pedido.cartao_emitido.cliente_id, pedido.cliente_id)
+			self.assertTrue(cartao_valido(pedido.cartao_emitido.numero))
+		self.assertEqual(aprovar_em_lote(self.gerente, "cartao", pks), [])
+
+	def test_negar_em_lote_ignora_outro_gerente(self):
+		from .fila_gerente import negar_em_lote
+
+		pks = [credito.pk for credito in self.creditos]
+		self.assertEqual(negar_em_lote(self.outro_gerente, "credito", pks), [])
+
+		with self.assertNumQueries(4):
+			negados = negar_em_lote(self.gerente, "credito", pks, "Renda insuficiente")
+
+		self.assertEqual(len(negados), 3)
+		self.assertEqual(
+			set(SolicitacaoCredito.objects.values_list("status", "resposta")),
+			{(SolicitacaoCredito.Status.NEGADO, "Renda insuficiente")},
+		)
+		with self.assertRaises(ValidationError):
+			negar_em_lote(self.gerente, "boleto", pks)
+
+	def test_view_restrita_a_gerentes(self):
+		url = reverse("nobanko_app:fila_gerente")
+		sessao = self.client.session
+		sessao["usuario_id"] = self.clientes[0].usuario_id
+		sessao.save()
+		self.assertEqual(self.client.get(url).status_code, 403)
+
+		sessao["usuario_id"] = self.gerente.usuario_id
+		sessao.save()
+		resposta = self.client.get(url, {"tipo": "credito"})
+		self.assertEqual(resposta.status_code, 200)
+		self.assertEqual(len(resposta.context["queue_items"]), 3)
+
+		resposta = self.client.post(
+			url, {"tipo": "credito", "acao": "aprovar", "ids": [self.creditos[0].pk, self.creditos[1].pk]}
+		)
+		self.assertEqual(resposta.context["queue_form"]["success"], "2 itens aprovados.")
+		self.assertEqual(len(resposta.context["queue_items"]), 1)
+
+
+class ScoreCreditoTestCase(CartoesTestCase):
+	def test_historico_melhor_pontua_mais(self):
+		from .score_credito import pontuar_pendentes
+
+		bom, ruim, novo = self.clientes
+		bom.depositar(Decimal("5000.00"))
+		bom.transferir_para(ruim, Decimal("100.00"))
+		ruim.depositar(Decimal("100.00"))
+		ruim.transferir_para(bom, Decimal("190.00"))
+		Usuario.objects.filter(pk=bom.usuario_id).update(data_criacao=timezone.now() - timedelta(days=3 * 365))
+		solicitacoes = [
+			bom.solicitar_credito(Decimal("500.00")),
+			ruim.solicitar_credito(Decimal("1800.00")),
+			novo.solicitar_credito(Decimal("1000.00")),
+		]
+		solicitacoes[2].negar(self.gerente)
+
+		with self.assertNumQueries(3):
+			self.assertEqual(pontuar_pendentes(lote=10), 2)
+
+		scores = dict(SolicitacaoCredito.objects.values_list("cliente_id", "score"))
+		self.assertGreater(scores[bom.pk], scores[ruim.pk])
+		self.assertTrue(0 <= scores[ruim.pk] <= 1000)
+		self.assertIsNone(scores[novo.pk])
+
+	def test_calculo_sem_solicitacoes(self):
+		from .score_credito import SCORE_PADRAO, calcular_scores, pontuar_pendentes
+
+		self.assertEqual(calcular_scores({"valor": []}, SCORE_PADRAO["PESOS"]), [])
+		self.assertEqual(pontuar_pendentes(), 0)
+
+
+	def _colunas_de_teste(self):
+		# Valores comuns e extremos (saldo negativo, limite zero, contas sem movimento).
+		return {
+			"valor": [500, 1800, 1000, 0.01, 250000],
+			"limite": [2000, 0, 1000, 1, 500],
+			"dias_conta": [1095, 10, 0, 30, 7300],
+			"entradas": [5100, 100, 0, 0, 1e9],
+			"saidas": [100, 190, 0, 0, 1e9],
+			"saldo_medio": [4800, -90, 0, -1e6, 1e7],
+			"volatilidade": [120.5, 60, 0, 1e6, 0],
+			"contrapartes": [1, 1, 0, 0, 5000],
+		}
+
+	def test_calculo_sem_numpy(self):
+		from . import score_credito
+
+		with mock.patch.object(score_credito, "np", None):
+			scores = score_credito.calcular_scores(self._colunas_de_teste(), score_credito.SCORE_PADRAO["PESOS"])
+
+		self.assertEqual(len(scores), 5)
+		self.assertTrue(all(isinstance(score, int) and 0 <= score <= 1000 for score in scores))
+
+	@unittest.skipUnless(importlib.util.find_spec("numpy"), "numpy não instalado")
+	def test_numpy_e_python_dao_o_mesmo_score(self):
+		from . import score_credito
+
+		colunas = self._colunas_de_teste()
+		pesos = score_credito.SCORE_PADRAO["PESOS"]
+		with mock.patch.object(score_credito, "np", importlib.import_module("numpy")):
+			vetorizado = score_credito.calcular_scores(colunas, pesos)
+		with mock.patch.object(score_credito, "np", None):
+			linha_a_linha = score_credito.calcular_scores(colunas, pesos)
+
+		self.assertEqual(vetorizado, linha_a_linha)
+
+class ElegibilidadeCartaoTestCase(CartoesTestCase):
+	def setUp(self):
+		super().setUp()
+		from .elegibilidade import invalidar_catalogo
+
+		invalidar_catalogo()
+		self.basico = ModeloCartao.objects.create(
+			nome="Básico", limite_minimo=Decimal("0.00"), limite_maximo=Decimal("1000.00")
+		)
+		self.infinite = ModeloCartao.objects.create(nome="Infinite", limite_minimo=Decimal("5000.00"))
+		ModeloCartao.objects.create(nome="Antigo", limite_minimo=Decimal("0.00"), ativo=False)
+
+	def test_modelos_por_limite_concordam_com_pode_solicitar(self):
+		from .elegibilidade import modelos_elegiveis
+
+		modelos = list(ModeloCartao.objects.all())
+		cliente = self.clientes[0]
+		with self.assertNumQueries(1):
+			modelos_elegiveis(Decimal("0"))
+		for limite in ("0", "999.99", "1000.00", "1000.01", "2000", "5000.00", "5000.01", "99999"):
+			cliente.limite_credito = Decimal(limite)
+			esperado = [modelo.nome for modelo in modelos if cliente.pode_solicitar_cartao(modelo)]
+			with self.assertNumQueries(0):
+				obtido = [modelo.nome for modelo in modelos_elegiveis(cliente.limite_credito)]
+			self.assertEqual(obtido, esperado, limite)
+
+	def test_catalogo_recarrega_quando_modelo_muda(self):
+		from .elegibilidade import modelos_elegiveis
+
+		self.assertEqual([modelo.nome for modelo in modelos_elegiveis(Decimal("500"))], ["Básico"])
+		self.basico.ativo = False
+		self.basico.save()
+		self.assertEqual(modelos_elegiveis(Decimal("500")), ())
+
+	def test_clientes_elegiveis_e_campanha(self):
+		from .elegibilidade import clientes_elegiveis
+
+		Cliente.objects.filter(pk=self.clientes[2].pk).update(limite_credito=Decimal("800.00"))
+		self.assertEqual(
+			set(clientes_elegiveis(self.modelo).values_list("pk", flat=True)),
+			{self.clientes[0].pk, self.clientes[1].pk},
+		)
+		self.clientes[0].solicitar_cartao(self.modelo).aprovar(self.gerente)
+
+		saida = StringIO()
+		call_command("campanha_cartao", self.modelo.pk, stdout=saida)
+		self.assertIn("1 clientes elegíveis", saida.getvalue())
+		call_command("campanha_cartao", self.modelo.pk, "--emitir", stdout=saida)
+		self.assertIn("1 cartões Ouro emitidos.", saida.getvalue())
+		self.assertEqual(Cartao.objects.filter(modelo=self.modelo).count(), 2)
+		with self.assertRaises(CommandError):
+			call_command("campanha_cartao", ModeloCartao.objects.get(nome="Antigo").pk)
+
+
+class AmortizacaoTestCase(TestCase):
+	def test_price_tem_parcelas_fixas_e_zera_saldo(self):
+		from .amortizacao import PRICE, simular
+
+		simulacao = simular("10000", "1.5", 12, PRICE)
+		valores = {parcela.valor for parcela in simulacao.cronograma[:-1]}
+
+		self.assertEqual(valores, {Decimal("916.80")})
+		self.assertEqual(simulacao.cronograma[0].juros, Decimal("150.00"))
+		self.assertEqual(simulacao.cronograma[-1].saldo, Decimal("0.00"))
+		self.assertEqual(sum(parcela.amortizacao for parcela in simulacao.cronograma), Decimal("10000.00"))
+		self.assertEqual(simulacao.total_juros, simulacao.total_pago - Decimal("10000.00"))
+		self.assertIs(simular("10000.00", "1.50", "12"), simulacao)
+
+	def test_sac_tem_amortizacao_constante(self):
+		from .amortizacao import SAC, simular
+
+		simulacao = simular("1200", "2", 12, SAC)
+		self.assertEqual({parcela.amortizacao for parcela in simulacao.cronograma}, {Decimal("100.00")})
+		self.assertEqual(simulacao.cronograma[0].valor, Decimal("124.00"))
+		self.assertEqual(simulacao.cronograma[-1].valor, Decimal("102.00"))
+		self.assertEqual(simulacao.total_juros, Decimal("156.00"))
+
+	def test_limites_de_taxa_e_parcelas_nao_geram_componentes_negativos(self):
+		from .amortizacao import PARCELAS_MAXIMO, PRICE, SAC, TAXA_MAXIMA, cronograma
+
+		casos = [
+			("50000.00", "15", 360),
+			("50000.00", "10", 420),
+			("50000.00", "12", 360),
+			("1000000.00", TAXA_MAXIMA, PARCELAS_MAXIMO),
+			("100.00", TAXA_MAXIMA, PARCELAS_MAXIMO),
+			("100.00", "0.01", PARCELAS_MAXIMO),
+			("100.00", "0", 7),
+		]
+		for valor, taxa, parcelas in casos:
+			for sistema in (PRICE, SAC):
+				linhas = cronograma(Decimal(valor), Decimal(taxa), parcelas, sistema)
+				with self.subTest(valor=valor, taxa=taxa, parcelas=parcelas, sistema=sistema):
+					self.assertEqual(sum(linha.amortizacao for linha in linhas), Decimal(valor))
+					self.assertEqual(linhas[-1].saldo, Decimal("0.00"))
+					self.assertTrue(all(linha.juros >= 0 and linha.amortizacao >= 0 for linha in linhas))
+					self.assertTrue(all(linha.saldo >= 0 for linha in linhas))
+
+		# Em prazos e taxas usuais a última parcela da Price só absorve centavos de arredondamento.
+		linhas = cronograma(Decimal("50000.00"), Decimal("2"), 36, PRICE)
+		self.assertLess(abs(linhas[-1].valor - linhas[0].valor), Decimal("1.00"))
+
+	def test_parametros_invalidos(self):
+		from .amortizacao import simular
+
+		for argumentos in (("abc", "1", 12), ("10000", "1", 0), ("10", "1", 12), ("10000", "1", 12, "alemao")):
+			with self.assertRaises(ValidationError):
+				simular(*argumentos)
+
+	def test_endpoint_de_simulacao(self):
+		url = reverse("nobanko_app:simular_emprestimo")
+		resposta = self.client.get(url, {"valor": "15.000,00", "taxa": "1,39", "parcelas": "24", "sistema": "sac"})
+
+		self.assertEqual(resposta.status_code, 200)
+		dados = resposta.json()
+		self.assertEqual(dados["valor"], "15000.00")
+		self.assertEqual(len(dados["cronograma"]), 24)
+		self.assertEqual(dados["cronograma"][-1]["saldo"], "0.00")
+		self.assertIn("max-age", resposta["Cache-Control"])
+
+		resposta = self.client.get(url, {"valor": "15000", "taxa": "1.39", "parcelas": "999"})
+		self.assertEqual(resposta.status_code, 400)
+		self.assertIn("parcelas", resposta.json()["erro"])
+
+	def test_contratar_grava_cronograma_em_lote(self):
+		from datetime import date
+
+		from .models import Emprestimo
+
+		cliente = Cliente.objects.create(
+			usuario=Usuario.objects.create(
+				nome="Tomador", email="tomador@example.com", senha="x", conta="20000001", agencia="0001"
+			)
+		)
+		with self.assertNumQueries(4):
+			emprestimo = Emprestimo.contratar(
+				cliente, "3000", "1.99", 36, Emprestimo.Sistema.SAC, data_inicio=date(2026, 1, 31)
+			)
+
+		parcelas = list(emprestimo.cronograma.all())
+		self.assertEqual(len(parcelas), 36)
+		self.assertEqual(parcelas[0].vencimento, date(2026, 2, 28))
+		self.assertEqual(parcelas[-1].vencimento, date(2029, 1, 31))
+		self.assertEqual(parcelas[-1].saldo_devedor, Decimal("0.00"))
+		self.assertEqual(sum(parcela.amortizacao for parcela in parcelas), Decimal("3000.00"))
+
+
+class FechamentoFaturasTestCase(CartoesTestCase):
+	def setUp(self):
+		super().setUp()
+		from .cartoes import emitir_cartoes
+
+		self.fechamento = timezone.localdate() + timedelta(days=40)
+		self.cartoes = emitir_cartoes(
+			(cliente, self.modelo, Decimal("1000.00")) for cliente in self.clientes * 2
+		)
+		Cartao.objects.update(dia_fechamento=self.fechamento.day)
+		for indice, cartao in enumerate(self.cartoes[:5]):
+			cartao.registrar_compra(Decimal("10.00") * (indice + 1), "Mercado")
+			cartao.registrar_compra("5.50")
+		CompraCartao.objects.create(
+			cartao=self.cartoes[0], valor=Decimal("99.00"), data=timezone.now() + timedelta(days=41)
+		)
+
+	def test_fecha_ciclo_com_uma_agregacao_por_lote(self):
+		from .faturamento import fechar_ciclo
+
+		criadas, _duracao = fechar_ciclo(self.fechamento, lote=2)
+
+		self.assertEqual(criadas, 5)
+		faturas = dict(Fatura.objects.values_list("cartao_id", "valor_total"))
+		self.assertEqual(faturas[self.cartoes[0].pk], Decimal("15.50"))
+		self.assertEqual(faturas[self.cartoes[4].pk], Decimal("55.50"))
+		self.assertNotIn(self.cartoes[5].pk, faturas)
+		self.assertEqual(CompraCartao.objects.filter(fatura__isnull=True).count(), 1)
+		self.assertEqual(
+			set(Fatura.objects.values_list("vencimento", flat=True)), {self.fechamento + timedelta(days=7)}
+		)
+		self.assertEqual(fechar_ciclo(self.fechamento)[0], 0)
+
+	@override_settings(NOBANKO_FATURAMENTO={"FAIXAS": 1})
+	def test_retoma_do_checkpoint_sem_duplicar(self):
+		from . import faturamento
+
+		original = faturamento._fechar_lote
+		chamadas = []
+
+		def interromper(*args):
+			chamadas.append(args)
+			if len(chamadas) == 2:
+				raise OperationalError("conexão perdida")
+			return original(*args)
+
+		with mock.patch.object(faturamento, "_fechar_lote", interromper):
+			with self.assertRaises(OperationalError):
+				faturamento.fechar_ciclo(self.fechamento, lote=2)
+		self.assertEqual(Fatura.objects.count(), 2)
+
+		saida = StringIO()
+		call_command("fechar_faturas", "--data", self.fechamento.isoformat(), "--lote", "2", stdout=saida)
+		self.assertIn("3 faturas geradas", saida.getvalue())
+		self.assertEqual(Fatura.objects.count(), 5)
+		self.assertTrue(all(CheckpointFechamento.objects.values_list("concluido", flat=True)))
+
+	def test_sqlite_fecha_em_um_processo_e_repete_lote_bloqueado(self):
+		from . import faturamento
+
+		original = faturamento._fechar_lote
+		chamadas = []
+
+		def bloquear_uma_vez(*args):
+			chamadas.append(args)
+			if len(chamadas) == 1:
+				raise OperationalError("database is locked")
+			return original(*args)
+
+		with mock.patch.object(faturamento, "ProcessPoolExecutor") as executor, mock.patch.object(
+			faturamento, "_fechar_lote", bloquear_uma_vez
+		), mock.patch("nobanko_app.concorrencia.connections") as conexoes, mock.patch("time.sleep"):
+			# Fora da transação do teste, como no comando.
+			conexoes.__getitem__.return_value.in_atomic_block = False
+			criadas, _duracao = faturamento.fechar_ciclo(self.fechamento, processos=4)
+
+		executor.assert_not_called()
+		self.assertEqual(criadas, 5)
+		self.assertEqual(Fatura.objects.count(), 5)
+
+	@override_settings(NOBANKO_FATURAMENTO={"FAIXAS": 1})
+	def test_repeticao_no_meio_da_faixa_conta_lotes_ja_confirmados(self):
+		from . import faturamento
+
+		original = faturamento._fechar_lote
+		chamadas = []
+
+		def bloquear_segundo_lote(*args):
+			chamadas.append(args)
+			if len(chamadas) == 2:
+				raise OperationalError("database is locked")
+			return original(*args)
+
+		with mock.patch.object(faturamento, "_fechar_lote", bloquear_segundo_lote), mock.patch(
+			"nobanko_app.concorrencia.connections"
+		) as conexoes, mock.patch("time.sleep"):
+			conexoes.__getitem__.return_value.in_atomic_block = False
+			criadas, _duracao = faturamento.fechar_ciclo(self.fechamento, lote=2)
+
+		self.assertEqual(criadas, 5)
+		self.assertEqual(CheckpointFechamento.objects.get().faturas, 5)
+
+	def test_cartoes_criados_depois_das_faixas_entram_no_fechamento(self):
+		from .cartoes import emitir_cartoes
+		from .faturamento import fechar_ciclo
+
+		self.assertEqual(fechar_ciclo(self.fechamento)[0], 5)
+		[novo] = emitir_cartoes([(self.clientes[0], self.modelo, Decimal("500.00"))])
+		Cartao.objects.filter(pk=novo.pk).update(dia_fechamento=self.fechamento.day)
+		novo.registrar_compra("42.00")
+
+		self.assertEqual(fechar_ciclo(self.fechamento)[0], 1)
+		self.assertEqual(Fatura.objects.get(cartao=novo).valor_total, Decimal("42.00"))
+		self.assertEqual(fechar_ciclo(self.fechamento)[0], 0)
+
+	def test_ultimo_dia_do_mes_inclui_dias_seguintes(self):
+		from datetime import date
+
+		from .faturamento import cartoes_do_dia
+
+		Cartao.objects.update(dia_fechamento=10)
+		Cartao.objects.filter(pk=self.cartoes[0].pk).update(dia_fechamento=31)
+		Cartao.objects.filter(pk=self.cartoes[1].pk).update(dia_fechamento=28)
+
+		self.assertEqual(
+			set(cartoes_do_dia(date(2026, 2, 28)).values_list("pk", flat=True)),
+			{self.cartoes[0].pk, self.cartoes[1].pk},
+		)
+		self.assertEqual(
+			set(cartoes_do_dia(date(2026, 3, 28)).values_list("pk", flat=True)), {self.cartoes[1].pk}
+		)
+
+	def test_marca_atrasadas_por_lote_e_avisa_clientes(self):
+		from .faturamento import marcar_atrasadas
+
+		hoje = timezone.localdate()
+		vencidas = [
+			Fatura.objects.create(
+				cartao=cartao, valor_total=Decimal("50.00"), vencimento=hoje - timedelta(days=1), status="pendente"
+			)
+			for cartao in self.cartoes[:4]
+		]
+		em_dia = Fatura.objects.create(
+			cartao=self.cartoes[4], valor_total=Decimal("50.00"), vencimento=hoje, status="pendente"
+		)
+		paga = Fatura.objects.create(
+			cartao=self.cartoes[5], valor_total=Decimal("50.00"), vencimento=hoje - timedelta(days=3), status="pago"
+		)
+
+		with CaptureQueriesContext(connection) as consultas:
+			faturas, mensagens, _duracao = marcar_atrasadas(hoje, lote=3)
+
+		self.assertEqual(faturas, 4)
+		# Quatro faturas de três clientes: o primeiro, com duas, recebe um aviso só.
+		self.assertEqual(mensagens, 3)
+		# Dois lotes: leitura, UPDATE e INSERT em cada, sem carregar instâncias.
+		self.assertEqual(sum("SELECT" in c["sql"] and "fatura" in c["sql"] for c in consultas.captured_queries), 2)
+		self.assertEqual(
+			set(Fatura.objects.filter(status="atrasado").values_list("pk", flat=True)), {f.pk for f in vencidas}
+		)
+		em_dia.refresh_from_db()
+		paga.refresh_from_db()
+		self.assertEqual((em_dia.status, paga.status), ("pendente", "pago"))
+		self.assertEqual(Mensagem.objects.filter(remetente="sistema").count(), 3)
+		self.assertEqual(
+			Mensagem.objects.get(cliente=self.cartoes[0].cliente, remetente="sistema").conteudo,
+			"2 faturas suas venceram e ainda não foram pagas.",
+		)
+
+		saida = StringIO()
+		call_command("marcar_faturas_atrasadas", "--data", hoje.isoformat(), stdout=saida)
+		self.assertIn("0 faturas marcadas como atrasadas", saida.getvalue())
+
+	def test_cliente_com_mais_faturas_que_o_lote_recebe_um_aviso(self):
+		from .faturamento import marcar_atrasadas
+
+		hoje = timezone.localdate()
+		for dias in range(1, 4):
+			Fatura.objects.create(
+				cartao=self.cartoes[0], valor_total=Decimal("10.00"), vencimento=hoje - timedelta(days=dias),
+				status="pendente",
+			)
+
+		self.assertEqual(marcar_atrasadas(hoje, lote=2)[:2], (3, 1))
+
+	def test_marcacao_de_atraso_nao_roda_duas_vezes_ao_mesmo_tempo(self):
+		from .faturamento import CHAVE_TRAVA_ATRASO
+
+		cache.set(CHAVE_TRAVA_ATRASO, "outra execução")
+		try:
+			with self.assertRaisesMessage(CommandError, "em andamento"):
+				call_command("marcar_faturas_atrasadas", stdout=StringIO())
+		finally:
+			cache.delete(CHAVE_TRAVA_ATRASO)
+
+		call_command("marcar_faturas_atrasadas", stdout=StringIO())
+		self.assertIsNone(cache.get(CHAVE_TRAVA_ATRASO))
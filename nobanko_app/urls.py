@@ -12,10 +12,13 @@ urlpatterns = [
     path("cliente/", views.cliente_overview, name="cliente"),
     path("atendimento/", views.atendimento, name="atendimento"),
     path("transacoes/", views.transacoes, name="transacoes"),
+    path("transacoes/exportar/<str:formato>/", views.exportar_transacoes, name="exportar_transacoes"),
     path("cartoes/", views.cartoes, name="cartoes"),
     path("fatura/", views.fatura, name="fatura"),
     path("emprestimos/", views.emprestimos, name="emprestimos"),
+    path("emprestimos/simular/", views.simular_emprestimo, name="simular_emprestimo"),
     path("gerente/", views.gerente, name="gerente"),
+    path("gerente/fila/", views.fila_gerente, name="fila_gerente"),
     path("gerenciamento/", views.gerenciamento, name="gerenciamento"),
     path("solicitacoes/", views.solicitacoes, name="solicitacoes"),
     path("mensagens/", views.mensagens, name="mensagens"),
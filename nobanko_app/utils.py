@@ -0,0 +1,23 @@
+# Mantém cada UPDATE/INSERT em lote abaixo do limite de parâmetros do SQLite.
+TAMANHO_LOTE = 250
+
+
+def em_lotes(itens, tamanho=TAMANHO_LOTE):
+    itens = list(itens)
+    for inicio in range(0, len(itens), tamanho):
+        yield itens[inicio:inicio + tamanho]
+
+
+def somente_digitos(valor):
+    return "".join(caractere for caractere in str(valor or "") if caractere.isdigit())
+
+
+def cpf_valido(cpf):
+    """Confere tamanho e dígitos verificadores de um CPF já reduzido a dígitos."""
+    if len(cpf) != 11 or not cpf.isdigit() or cpf == cpf[0] * 11:
+        return False
+    for tamanho in (9, 10):
+        soma = sum(int(digito) * peso for digito, peso in zip(cpf[:tamanho], range(tamanho + 1, 1, -1)))
+        if int(cpf[tamanho]) != soma * 10 % 11 % 10:
+            return False
+    return True
@@ -1,42 +1,75 @@
-from datetime import date
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import date, datetime, time, timedelta
 from decimal import Decimal, InvalidOperation
+import binascii
 import secrets
 
-from django.contrib.auth.hashers import check_password, make_password
-from django.core.exceptions import ValidationError
+from asgiref.sync import sync_to_async
+from django.core.exceptions import PermissionDenied, ValidationError
 from django.db import IntegrityError, transaction
-from django.db.models import Q, Sum
+from django.db.models import Q
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import redirect, render
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import urlencode
+
+from . import amortizacao
+from .autenticacao import (
+	HashIndisponivel,
+	gerar_hash,
+	ip_cliente,
+	permitir_tentativa,
+	verificar_senha,
+)
+from .cache_paginas import cache_pagina_anonima, tempo_cache, versao_cache
+from .contas import alocador_contas
+from .extrato import gerar_csv, gerar_ofx, iterar_movimentos
+from .fila_gerente import TIPOS_FILA, aprovar_em_lote, contar_pendentes, negar_em_lote, pendentes
+from .middleware import sessao_cliente
+from .models import Cliente, FluxoCaixa, Transacao, Usuario
+from .utils import cpf_valido, somente_digitos
+
+
+NAV_LINKS = (
+	{"label": "Início", "view_name": "nobanko_app:home", "description": "Visão geral do NoBanko"},
+	{"label": "Cliente", "view_name": "nobanko_app:cliente", "description": "Central do cliente"},
+	{"label": "Transações", "view_name": "nobanko_app:transacoes", "description": "Movimentações e histórico"},
+	{"label": "Cartões", "view_name": "nobanko_app:cartoes", "description": "Controle dos seus cartões"},
+	{"label": "Atendimento", "view_name": "nobanko_app:atendimento", "description": "Fale com a gente"},
+	{"label": "Fatura", "view_name": "nobanko_app:fatura", "description": "Resumo da fatura"},
+	{"label": "Empréstimos", "view_name": "nobanko_app:emprestimos", "description": "Ofertas sob medida"},
+	{"label": "Gerente", "view_name": "nobanko_app:gerente", "description": "Seu gerente pessoal"},
+	{"label": "Gerenciamento", "view_name": "nobanko_app:gerenciamento", "description": "Ferramentas para gestores"},
+	{"label": "Solicitações", "view_name": "nobanko_app:solicitacoes", "description": "Acompanhe seus pedidos"},
+	{"label": "Mensagens", "view_name": "nobanko_app:mensagens", "description": "Comunicação segura"},
+	{"label": "Boletos", "view_name": "nobanko_app:boletos", "description": "Pague e emita boletos"},
+)
+
 
-from .models import Cliente, Transacao, Usuario
 def base_context(extra=None, request=None):
 	base = {
 		"bank_name": "NoBanko",
-		"nav_links": [
-			{"label": "Início", "view_name": "nobanko_app:home", "description": "Visão geral do NoBanko"},
-			{"label": "Cliente", "view_name": "nobanko_app:cliente", "description": "Central do cliente"},
-			{"label": "Transações", "view_name": "nobanko_app:transacoes", "description": "Movimentações e histórico"},
-			{"label": "Cartões", "view_name": "nobanko_app:cartoes", "description": "Controle dos seus cartões"},
-			{"label": "Atendimento", "view_name": "nobanko_app:atendimento", "description": "Fale com a gente"},
-			{"label": "Fatura", "view_name": "nobanko_app:fatura", "description": "Resumo da fatura"},
-			{"label": "Empréstimos", "view_name": "nobanko_app:emprestimos", "description": "Ofertas sob medida"},
-			{"label": "Gerente", "view_name": "nobanko_app:gerente", "description": "Seu gerente pessoal"},
-			{"label": "Gerenciamento", "view_name": "nobanko_app:gerenciamento", "description": "Ferramentas para gestores"},
-			{"label": "Solicitações", "view_name": "nobanko_app:solicitacoes", "description": "Acompanhe seus pedidos"},
-			{"label": "Mensagens", "view_name": "nobanko_app:mensagens", "description": "Comunicação segura"},
-			{"label": "Boletos", "view_name": "nobanko_app:boletos", "description": "Pague e emita boletos"},
-		],
+		"nav_links": NAV_LINKS,
 		"current_year": date.today().year,
+		"cache_versao": versao_cache(),
+		"cache_tempo": tempo_cache(),
 	}
 
 	if request:
-		usuario_id = request.session.get("usuario_id")
-		if usuario_id:
-			usuario = Usuario.objects.filter(id=usuario_id).only("nome").first()
-			if usuario:
-				primeiro_nome = usuario.nome.split(" ")[0] if usuario.nome else ""
-				base["usuario_logado"] = {"id": usuario.id, "nome": primeiro_nome or usuario.nome}
+		sessao = sessao_cliente(request)
+		if sessao.usuario_id:
+			# O nome gravado no login evita a consulta em páginas que não precisam do cliente.
+			if sessao.usuario_nome and not sessao.carregada:
+				usuario_logado = {"id": sessao.usuario_id, "nome": sessao.usuario_nome}
+			elif sessao.usuario:
+				usuario_logado = {"id": sessao.usuario.id, "nome": sessao.usuario.nome}
+			else:
+				usuario_logado = None
+			if usuario_logado:
+				nome = usuario_logado["nome"]
+				primeiro_nome = nome.split(" ")[0] if nome else ""
+				base["usuario_logado"] = {"id": usuario_logado["id"], "nome": primeiro_nome or nome}
 
 	if extra:
 		base.update(extra)
@@ -44,13 +77,6 @@ def base_context(extra=None, request=None):
 	return base
 
 
-def _gerar_conta_unica():
-	while True:
-		numero = f"{secrets.randbelow(10**8):08d}"
-		if not Usuario.objects.filter(conta=numero).exists():
-			return numero
-
-
 def _agencia_padrao():
 	return "0001"
 
@@ -65,10 +91,72 @@ def _set_field_values(fields, values, skip_types=None):
 			field["value"] = values.get(field.get("name"), "")
 
 
+MENSAGEM_MUITAS_TENTATIVAS = "Muitas tentativas em pouco tempo. Aguarde alguns instantes e tente novamente."
+MENSAGEM_SERVICO_OCUPADO = "Estamos com alta demanda agora. Tente novamente em instantes."
+
+
 def _format_currency(valor):
 	return f"R$ {valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
 
 
+TAMANHO_PAGINA_TRANSACOES = 50
+
+
+def _parse_data(valor):
+	try:
+		return date.fromisoformat((valor or "").strip())
+	except ValueError:
+		return None
+
+
+def _filtros_transacoes(params):
+	tipo = params.get("tipo") or ""
+	if tipo not in Transacao.Tipo.values:
+		tipo = ""
+	return {"tipo": tipo, "de": _parse_data(params.get("de")), "ate": _parse_data(params.get("ate"))}
+
+
+def _filtrar_transacoes(transacoes, filtros):
+	# Intervalos em datetime (e não data__date) para usar o índice (cliente, data, id).
+	fuso = timezone.get_current_timezone()
+	if filtros["tipo"]:
+		transacoes = transacoes.filter(tipo=filtros["tipo"])
+	if filtros["de"]:
+		transacoes = transacoes.filter(data__gte=datetime.combine(filtros["de"], time.min, tzinfo=fuso))
+	if filtros["ate"]:
+		transacoes = transacoes.filter(
+			data__lt=datetime.combine(filtros["ate"] + timedelta(days=1), time.min, tzinfo=fuso)
+		)
+	return transacoes.order_by("-data", "-id")
+
+
+def _codificar_cursor(momento, pk):
+	bruto = f"{momento.isoformat()}|{pk}".encode()
+	return urlsafe_b64encode(bruto).decode().rstrip("=")
+
+
+def _decodificar_cursor(cursor):
+	try:
+		bruto = urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+		data_iso, pk = bruto.split("|")
+		return datetime.fromisoformat(data_iso), int(pk)
+	except (binascii.Error, UnicodeDecodeError, ValueError):
+		return None
+
+
+def _paginar_transacoes(transacoes, cursor, limite=TAMANHO_PAGINA_TRANSACOES):
+	"""Página por keyset sobre (data, id): a página N custa o mesmo que a primeira."""
+	posicao = _decodificar_cursor(cursor) if cursor else None
+	if posicao:
+		data, pk = posicao
+		transacoes = transacoes.filter(Q(data__lt=data) | Q(data=data, id__lt=pk))
+
+	pagina = list(transacoes[:limite + 1])
+	proximo_cursor = _codificar_cursor(pagina[limite - 1].data, pagina[limite - 1].pk) if len(pagina) > limite else None
+	return pagina[:limite], proximo_cursor
+
+
+@cache_pagina_anonima
 def home(request):
 	context = base_context(
 		{
@@ -194,19 +282,18 @@ def cliente_overview(request):
 		request=request,
 	)
 
-	usuario_id = request.session.get("usuario_id")
-	if usuario_id:
-		cliente = Cliente.objects.select_related("usuario").filter(usuario_id=usuario_id).first()
-		if cliente:
-			context["account_snapshot"]["saldo"] = _format_currency(cliente.saldo)
-			context["account_snapshot"]["investido"] = _format_currency(0)
-			context["account_snapshot"]["limite"] = _format_currency(0)
-			context["account_snapshot"]["fatura_atual"] = _format_currency(0)
-			context["account_snapshot"]["agencia"] = cliente.usuario.agencia
-			context["account_snapshot"]["conta"] = cliente.usuario.conta
+	cliente = sessao_cliente(request).cliente
+	if cliente:
+		context["account_snapshot"]["saldo"] = _format_currency(cliente.saldo_total())
+		context["account_snapshot"]["investido"] = _format_currency(0)
+		context["account_snapshot"]["limite"] = _format_currency(0)
+		context["account_snapshot"]["fatura_atual"] = _format_currency(0)
+		context["account_snapshot"]["agencia"] = cliente.usuario.agencia
+		context["account_snapshot"]["conta"] = cliente.usuario.conta
 	return render(request, "cliente_overview.html", context)
 
 
+@cache_pagina_anonima
 def atendimento(request):
 	context = base_context(
 		{
@@ -249,15 +336,11 @@ def atendimento(request):
 
 
 def transacoes(request):
-	usuario_id = request.session.get("usuario_id")
-	if not usuario_id:
+	sessao = sessao_cliente(request)
+	if not sessao.usuario_id:
 		return redirect('nobanko_app:login')
 
-	cliente = (
-		Cliente.objects.select_related("usuario")
-		.filter(usuario_id=usuario_id)
-		.first()
-	)
+	cliente = sessao.cliente
 
 	if not cliente:
 		return redirect('nobanko_app:cadastro')
@@ -279,11 +362,6 @@ def transacoes(request):
 	context = base_context(
 		{
 			"page_title": "Transações em tempo real",
-			"transaction_filters": [
-				{"label": "Todos", "active": True},
-				{"label": "Entradas", "active": False},
-				{"label": "Saídas", "active": False},
-			],
 			"transfer_form": {
 				"values": {
 					"agencia_destino": "",
@@ -298,12 +376,18 @@ def transacoes(request):
 					"descricao": "",
 				}
 			},
+			"chave_idempotencia": secrets.token_urlsafe(24),
 		},
 		request=request,
 	)
 
 	if request.method == "POST":
 		operacao = request.POST.get("operation") or ""
+		chave_idempotencia = (request.POST.get("chave_idempotencia") or "").strip()
+		if chave_idempotencia:
+			# Os dois formulários da página recebem a mesma chave; a operação a separa.
+			escopo = "deposit" if operacao == "deposit" else "transfer"
+			chave_idempotencia = f"{escopo}:{chave_idempotencia}"
 
 		if operacao == "deposit":
 			descricao = (request.POST.get("descricao") or "").strip()
@@ -320,7 +404,7 @@ def transacoes(request):
 				context["deposit_form"]["error"] = str(exc)
 			else:
 				try:
-					cliente.depositar(valor, descricao)
+					cliente.depositar(valor, descricao, chave_idempotencia=chave_idempotencia)
 				except ValidationError as exc:
 					context["deposit_form"]["error"] = (
 						exc.messages[0] if getattr(exc, "messages", None) else str(exc)
@@ -367,7 +451,9 @@ def transacoes(request):
 					context["transfer_form"]["error"] = "Conta de destino não encontrada."
 				else:
 					try:
-						cliente.transferir_para(destino_cliente, valor, descricao)
+						cliente.transferir_para(
+							destino_cliente, valor, descricao, chave_idempotencia=chave_idempotencia
+						)
 					except ValidationError as exc:
 						context["transfer_form"]["error"] = (
 							exc.messages[0] if getattr(exc, "messages", None) else str(exc)
@@ -384,16 +470,16 @@ def transacoes(request):
 						)
 						cliente.refresh_from_db()
 
-	transacoes = (
-		cliente.transacoes
-		.select_related("contraparte__usuario")
-		.order_by("-data")
+	filtros = _filtros_transacoes(request.GET)
+	parametros_periodo = {
+		chave: filtros[chave].isoformat() for chave in ("de", "ate") if filtros[chave]
+	}
+	transacoes = _filtrar_transacoes(
+		cliente.transacoes.select_related("contraparte__usuario"), filtros
 	)
+	pagina, proximo_cursor = _paginar_transacoes(transacoes, request.GET.get("cursor"))
 
-	totais = transacoes.aggregate(
-		total_entradas=Sum('valor', filter=Q(tipo=Transacao.Tipo.ENTRADA)),
-		total_saidas=Sum('valor', filter=Q(tipo=Transacao.Tipo.SAIDA)),
-	)
+	totais = FluxoCaixa.totais(cliente.pk)
 
 	insights = []
 	total_entradas = totais.get('total_entradas') or Decimal('0')
@@ -416,7 +502,7 @@ def transacoes(request):
 
 	context.update(
 		{
-			"saldo_atual": _format_currency(cliente.saldo),
+			"saldo_atual": _format_currency(cliente.saldo_total()),
 			"transactions": [
 				{
 					"descricao": tx.descricao or tx.get_tipo_display(),
@@ -433,15 +519,98 @@ def transacoes(request):
 						else ""
 					),
 				}
-				for tx in transacoes[:50]
+				for tx in pagina
 			],
 			"insights": insights,
+			"transaction_filters": [
+				{
+					"label": rotulo,
+					"active": filtros["tipo"] == tipo,
+					"url": "?" + urlencode({**parametros_periodo, **({"tipo": tipo} if tipo else {})}),
+				}
+				for tipo, rotulo in (
+					("", "Todos"),
+					(Transacao.Tipo.ENTRADA, "Entradas"),
+					(Transacao.Tipo.SAIDA, "Saídas"),
+				)
+			],
+			"period_filter": {
+				"tipo": filtros["tipo"],
+				"de": parametros_periodo.get("de", ""),
+				"ate": parametros_periodo.get("ate", ""),
+			},
+			"export_links": [
+				{
+					"label": rotulo,
+					"url": reverse("nobanko_app:exportar_transacoes", args=[formato])
+					+ ("?" + urlencode(parametros_periodo) if parametros_periodo else ""),
+				}
+				for formato, rotulo in (("csv", "Exportar CSV"), ("ofx", "Exportar OFX"))
+			],
+			"next_page_url": (
+				"?" + urlencode({
+					**parametros_periodo,
+					**({"tipo": filtros["tipo"]} if filtros["tipo"] else {}),
+					"cursor": proximo_cursor,
+				})
+				if proximo_cursor
+				else ""
+			),
 		}
 	)
 
 	return render(request, "transacoes.html", context)
 
 
+FORMATOS_EXTRATO = {
+	"csv": "text/csv; charset=utf-8",
+	"ofx": "application/x-ofx; charset=utf-8",
+}
+
+
+def exportar_transacoes(request, formato):
+	if formato not in FORMATOS_EXTRATO:
+		raise Http404("Formato de extrato não suportado.")
+
+	sessao = sessao_cliente(request)
+	if not sessao.usuario_id:
+		return redirect('nobanko_app:login')
+
+	cliente = sessao.cliente
+
+	if not cliente:
+		return redirect('nobanko_app:cadastro')
+
+	filtros = _filtros_transacoes(request.GET)
+	transacoes = _filtrar_transacoes(cliente.transacoes.all(), filtros)
+	movimentos = iterar_movimentos(transacoes)
+
+	if formato == "csv":
+		conteudo = gerar_csv(movimentos)
+	else:
+		fuso = timezone.get_current_timezone()
+		if filtros["de"]:
+			inicio = datetime.combine(filtros["de"], time.min, tzinfo=fuso)
+		else:
+			inicio = transacoes.order_by("data", "id").values_list("data", flat=True).first() or timezone.now()
+		fim = (
+			datetime.combine(filtros["ate"], time.max, tzinfo=fuso)
+			if filtros["ate"]
+			else timezone.now()
+		)
+		conteudo = gerar_ofx(cliente, movimentos, inicio, fim, cliente.saldo_total())
+
+	periodo = "-".join(
+		filtros[chave].isoformat() for chave in ("de", "ate") if filtros[chave]
+	) or "completo"
+	resposta = StreamingHttpResponse(conteudo, content_type=FORMATOS_EXTRATO[formato])
+	resposta["Content-Disposition"] = (
+		f'attachment; filename="extrato-{cliente.usuario.agencia}-{cliente.usuario.conta}-{periodo}.{formato}"'
+	)
+	return resposta
+
+
+@cache_pagina_anonima
 def cartoes(request):
 	context = base_context(
 		{
@@ -467,6 +636,7 @@ def cartoes(request):
 	return render(request, "cartoes.html", context)
 
 
+@cache_pagina_anonima
 def fatura(request):
 	context = base_context(
 		{
@@ -493,6 +663,7 @@ def fatura(request):
 	return render(request, "fatura.html", context)
 
 
+@cache_pagina_anonima
 def emprestimos(request):
 	context = base_context(
 		{
@@ -517,7 +688,9 @@ def emprestimos(request):
 			"simulator": {
 				"valor_min": "R$ 1.000,00",
 				"valor_max": "R$ 80.000,00",
-				"parcelas": ["12x", "24x", "36x", "48x"],
+				"parcelas": [12, 24, 36, 48],
+				"taxa": "1.39",
+				"url": reverse("nobanko_app:simular_emprestimo"),
 			},
 			"tips": [
 				"Receba alertas quando a taxa ficar mais baixa.",
@@ -529,6 +702,48 @@ def emprestimos(request):
 	return render(request, "emprestimos.html", context)
 
 
+def _parcela_json(parcela):
+	return {
+		"numero": parcela.numero,
+		"valor": str(parcela.valor),
+		"juros": str(parcela.juros),
+		"amortizacao": str(parcela.amortizacao),
+		"saldo": str(parcela.saldo),
+	}
+
+
+def simular_emprestimo(request):
+	valor_raw = (request.GET.get("valor") or "").replace("R$", "").replace(" ", "")
+	if "," in valor_raw:
+		valor_raw = valor_raw.replace(".", "").replace(",", ".")
+	try:
+		simulacao = amortizacao.simular(
+			valor_raw,
+			(request.GET.get("taxa") or "").replace(",", "."),
+			request.GET.get("parcelas") or "",
+			request.GET.get("sistema") or amortizacao.PRICE,
+		)
+	except ValidationError as exc:
+		return JsonResponse({"erro": exc.messages[0]}, status=400)
+
+	resposta = JsonResponse(
+		{
+			"sistema": simulacao.sistema,
+			"valor": str(simulacao.valor),
+			"taxa_mensal": str(simulacao.taxa),
+			"parcelas": simulacao.parcelas,
+			"primeira_parcela": str(simulacao.cronograma[0].valor),
+			"total_pago": str(simulacao.total_pago),
+			"total_juros": str(simulacao.total_juros),
+			"cronograma": [_parcela_json(parcela) for parcela in simulacao.cronograma],
+		}
+	)
+	# O resultado depende só dos parâmetros da URL.
+	resposta["Cache-Control"] = "public, max-age=3600"
+	return resposta
+
+
+@cache_pagina_anonima
 def gerente(request):
 	context = base_context(
 		{
@@ -554,6 +769,104 @@ def gerente(request):
 	return render(request, "gerente.html", context)
 
 
+ROTULOS_FILA = {"credito": "Crédito", "cartao": "Cartões"}
+ACOES_FILA = {"aprovar": (aprovar_em_lote, "aprovados"), "negar": (negar_em_lote, "negados")}
+
+
+def _item_fila(tipo, item):
+	if tipo == "credito":
+		detalhe = _format_currency(item.valor)
+		if item.score is not None:
+			detalhe += f" · score {item.score}"
+		observacao = item.motivo
+	else:
+		detalhe = item.modelo.nome
+		observacao = item.justificativa
+	return {
+		"id": item.pk,
+		"cliente": item.cliente.usuario.nome,
+		"conta": f"{item.cliente.usuario.agencia} / {item.cliente.usuario.conta}",
+		"detalhe": detalhe,
+		"observacao": observacao,
+		"criado_em": item.criado_em,
+	}
+
+
+def fila_gerente(request):
+	sessao = sessao_cliente(request)
+	if not sessao.usuario_id:
+		return redirect('nobanko_app:login')
+
+	gerente = sessao.gerente
+	if not gerente:
+		raise PermissionDenied("Área exclusiva para gerentes.")
+
+	tipo = request.POST.get("tipo") or request.GET.get("tipo") or "credito"
+	if tipo not in TIPOS_FILA:
+		tipo = "credito"
+
+	context = base_context(
+		{
+			"page_title": "Fila de análise",
+			"queue_type": tipo,
+			"queue_form": {"values": {"texto": ""}},
+		},
+		request=request,
+	)
+
+	if request.method == "POST":
+		acao = ACOES_FILA.get(request.POST.get("acao") or "")
+		texto = (request.POST.get("texto") or "").strip()
+		try:
+			pks = {int(pk) for pk in request.POST.getlist("ids")}
+		except ValueError:
+			pks = set()
+
+		if acao is None or not pks:
+			context["queue_form"]["error"] = "Selecione ao menos um item e a ação desejada."
+		else:
+			funcao, rotulo = acao
+			try:
+				respondidos = funcao(gerente, tipo, pks, texto)
+			except ValidationError as exc:
+				context["queue_form"]["error"] = exc.messages[0]
+				context["queue_form"]["values"]["texto"] = texto
+			else:
+				mensagem = f"{len(respondidos)} {'item' if len(respondidos) == 1 else 'itens'} {rotulo}."
+				ignorados = len(pks) - len(respondidos)
+				if ignorados:
+					mensagem += f" {ignorados} já analisado(s) ou de outro gerente ficaram de fora."
+				context["queue_form"]["success"] = mensagem
+
+	# Depois de um POST a fila volta ao início: os itens respondidos saíram dela.
+	cursor = request.GET.get("cursor") if request.method == "GET" else None
+	itens, proximo = pendentes(gerente, tipo, _decodificar_cursor(cursor) if cursor else None)
+	contagens = contar_pendentes(gerente)
+	url_fila = reverse("nobanko_app:fila_gerente")
+
+	context.update(
+		{
+			"queue_tabs": [
+				{
+					"label": rotulo,
+					"count": contagens[chave],
+					"url": f"{url_fila}?{urlencode({'tipo': chave})}",
+					"active": chave == tipo,
+				}
+				for chave, rotulo in ROTULOS_FILA.items()
+			],
+			"queue_items": [_item_fila(tipo, item) for item in itens],
+			"next_page_url": (
+				f"{url_fila}?{urlencode({'tipo': tipo, 'cursor': _codificar_cursor(*proximo)})}"
+				if proximo
+				else None
+			),
+		}
+	)
+	return render(request, "fila_gerente.html", context)
+
+
+@cache_pagina_anonima
 def gerenciamento(request):
 	context = base_context(
 		{
@@ -582,6 +895,7 @@ def gerenciamento(request):
 	return render(request, "gerenciamento.html", context)
 
 
+@cache_pagina_anonima
 def solicitacoes(request):
 	context = base_context(
 		{
@@ -613,6 +927,7 @@ def solicitacoes(request):
 	return render(request, "solicitacoes.html", context)
 
 
+@cache_pagina_anonima
 def mensagens(request):
 	context = base_context(
 		{
@@ -647,6 +962,7 @@ def mensagens(request):
 	return render(request, "mensagens.html", context)
 
 
+@cache_pagina_anonima
 def boletos(request):
 	context = base_context(
 		{
@@ -681,7 +997,7 @@ def boletos(request):
 
 
 
-def cadastro(request):
+def _contexto_cadastro(request):
 	context = base_context(
 		{
 			"page_title": "Abra sua conta NoBanko",
@@ -766,6 +1082,28 @@ def cadastro(request):
 		for field in section.get("fields", [])
 	]
 	_set_field_values(cadastro_fields, context["form_values"], skip_types={"password"})
+	return context, cadastro_fields
+
+
+def _criar_conta(nome, email, cpf, senha_codificada):
+	agencia = _agencia_padrao()
+	# Fora da transação, para o número sair do bloco já reservado por este processo.
+	conta = alocador_contas.alocar(agencia)
+	with transaction.atomic():
+		usuario = Usuario.objects.create(
+			nome=nome,
+			email=email,
+			cpf=cpf or None,
+			senha=senha_codificada,
+			conta=conta,
+			agencia=agencia,
+		)
+		Cliente.objects.create(usuario=usuario)
+	return usuario
+
+
+async def cadastro(request):
+	context, cadastro_fields = await sync_to_async(_contexto_cadastro)(request)
 	if request.method == "GET":
 		return render(request, "cadastro.html", context)
 
@@ -773,7 +1111,7 @@ def cadastro(request):
 	cpf = (request.POST.get("cpf") or "").strip()
 	birth_date = (request.POST.get("birth_date") or "").strip()
 	phone = (request.POST.get("phone") or "").strip()
-	email = (request.POST.get("email") or "").strip().lower()
+	email = Usuario.normalizar_email(request.POST.get("email"))
 	password = request.POST.get("password") or ""
 	password_confirmation = request.POST.get("password_confirmation") or ""
 
@@ -794,27 +1132,35 @@ def cadastro(request):
 		context["form_error"] = "As senhas não conferem. Verifique e tente novamente."
 		return render(request, "cadastro.html", context)
 
+	cpf_digitos = somente_digitos(cpf)
+	if cpf and not cpf_valido(cpf_digitos):
+		context["form_error"] = "CPF inválido. Confira os números informados."
+		return render(request, "cadastro.html", context)
+
 	if len(password) < 8:
 		context["form_error"] = "A senha precisa ter pelo menos 8 caracteres."
 		return render(request, "cadastro.html", context)
 
-	if Usuario.objects.filter(email=email).exists():
+	if not await permitir_tentativa("cadastro", ip_cliente(request)):
+		context["form_error"] = MENSAGEM_MUITAS_TENTATIVAS
+		return render(request, "cadastro.html", context, status=429)
+
+	if await Usuario.objects.filter(email=email).aexists():
 		context["form_error"] = "Já existe uma conta criada com este e-mail. Faça login ou utilize outro endereço."
 		return render(request, "cadastro.html", context)
 
-	conta = _gerar_conta_unica()
-	agencia = _agencia_padrao()
+	if cpf_digitos and await Usuario.objects.filter(cpf=cpf_digitos).aexists():
+		context["form_error"] = "Já existe uma conta criada com este CPF. Faça login para continuar."
+		return render(request, "cadastro.html", context)
 
 	try:
-		with transaction.atomic():
-			usuario = Usuario.objects.create(
-				nome=nome,
-				email=email,
-				senha=make_password(password),
-				conta=conta,
-				agencia=agencia,
-			)
-			Cliente.objects.create(usuario=usuario)
+		senha_codificada = await gerar_hash(password)
+	except HashIndisponivel:
+		context["form_error"] = MENSAGEM_SERVICO_OCUPADO
+		return render(request, "cadastro.html", context, status=503)
+
+	try:
+		await sync_to_async(_criar_conta)(nome, email, cpf_digitos, senha_codificada)
 	except IntegrityError:
 		context["form_error"] = "Não foi possível criar sua conta agora. Tente novamente em instantes."
 		return render(request, "cadastro.html", context)
@@ -826,7 +1172,7 @@ def cadastro(request):
 
 
 
-def login_view(request):
+def _contexto_login(request):
 	context = base_context(
 		{
 			"page_title": "Entre na sua conta",
@@ -861,6 +1207,11 @@ def login_view(request):
 
 	if request.GET.get("created"):
 		context["form_success"] = "Conta criada com sucesso! Faça login para continuar."
+	return context, login_fields
+
+
+async def login_view(request):
+	context, login_fields = await sync_to_async(_contexto_login)(request)
 
 	if request.method == "GET":
 		return render(request, "login.html", context)
@@ -872,18 +1223,29 @@ def login_view(request):
 	_set_field_values(login_fields, context["form_values"], skip_types={"password"})
 
 	if not username or not password:
-		context["form_error"] = "Informe seu e-mail (ou número da conta) e a senha para continuar."
+		context["form_error"] = "Informe seu e-mail, CPF ou número da conta e a senha para continuar."
 		return render(request, "login.html", context)
 
-	usuario = Usuario.objects.filter(
-		Q(email__iexact=username) | Q(conta=username)
-	).first()
+	filtro = Usuario.filtro_identificador(username)
+	# O balde por conta usa o identificador normalizado: variar a formatação não gera tentativas novas.
+	conta_tentativa = next(iter(filtro.values())) if filtro else username
+	if not await permitir_tentativa("login", ip_cliente(request), conta_tentativa):
+		context["form_error"] = MENSAGEM_MUITAS_TENTATIVAS
+		return render(request, "login.html", context, status=429)
+
+	usuario = await Usuario.objects.filter(**filtro).afirst() if filtro else None
 
-	if usuario and check_password(password, usuario.senha):
-		request.session.flush()
-		request.session["usuario_id"] = usuario.id
-		request.session["usuario_nome"] = usuario.nome
-		request.session.set_expiry(0)
+	try:
+		senha_valida = usuario is not None and await verificar_senha(password, usuario.senha)
+	except HashIndisponivel:
+		context["form_error"] = MENSAGEM_SERVICO_OCUPADO
+		return render(request, "login.html", context, status=503)
+
+	if senha_valida:
+		await request.session.aflush()
+		await request.session.aset("usuario_id", usuario.id)
+		await request.session.aset("usuario_nome", usuario.nome)
+		await request.session.aset_expiry(0)
 		return redirect('nobanko_app:cliente')
 
 	context["form_error"] = "Credenciais inválidas. Verifique os dados informados e tente novamente."